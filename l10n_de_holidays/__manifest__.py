@@ -4,7 +4,7 @@
 
 {
     "name": 'Holidays for Germany',
-    "version": '11.0.1.0.0',
+    "version": '11.0.1.5.0',
     "license": "AGPL-3",
     "category": "Human Resources",
     "author": "Odoo Community Association (OCA)",
@@ -0,0 +1,3 @@
+from . import hr_holidays_public
+from . import hr_holidays_public_calendar
+from . import hr_holidays_public_line
@@ -0,0 +1,22 @@
+# Copyright 2018 elego Software Solutions GmbH - Yu Weng
+# Copyright 2018 initOS GmbH - Nikolina Todorova
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+
+class HrHolidaysPublic(models.Model):
+    _inherit = 'hr.holidays.public'
+
+    @api.multi
+    def write(self, values):
+        # the lines of the working days calendar depend on the country
+        if 'country_id' in values or 'year' in values:
+            self.env['hr.holidays.public.calendar']._invalidate()
+        return super(HrHolidaysPublic, self).write(values)
+
+    @api.multi
+    def unlink(self):
+        # the lines are deleted by the database, without their unlink
+        self.env['hr.holidays.public.calendar']._invalidate()
+        return super(HrHolidaysPublic, self).unlink()
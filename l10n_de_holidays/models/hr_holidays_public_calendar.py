@@ -0,0 +1,259 @@
+# Copyright 2018 elego Software Solutions GmbH - Yu Weng
+# Copyright 2018 initOS GmbH - Nikolina Todorova
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import calendar
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, timedelta
+
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import UserError
+
+# days of the week which are not working days (Saturday and Sunday)
+WEEKEND = (5, 6)
+
+# holidays of a year of a state: bit n of holidays is set if the n-th day
+# of the year (from 0) is a holiday, working[n] is the number of working
+# days among the n first days of the year
+YearCalendar = namedtuple('YearCalendar', ['year', 'holidays', 'working'])
+
+# modifications of the public holidays made by this process, seen before
+# their transaction is committed; those of the other processes are seen in
+# the tables
+_local_generation = [0]
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return fields.Date.from_string(value)
+    return value
+
+
+class HrHolidaysPublicCalendar(models.AbstractModel):
+    """ Working days calendar of the states of a country, built from its
+    public holidays and kept in memory per process: each year of each state
+    is read once, as a bitmap of its holidays and the cumulated counts of
+    its working days, so that checking a date is done in constant time,
+    counting the working days between two dates in constant time per year
+    and adding working days to a date in logarithmic time.
+
+    The years are cached by generation of the public holidays, which changes
+    with their modifications, in any process: the calendar is read again,
+    and the other caches of the registry are left untouched. The states
+    can be given as records, ids or codes; without state, only the holidays
+    of the whole country are taken into account. The country defaults to
+    Germany. A year without public holidays record for the country raises
+    an error rather than being taken as a year without holidays."""
+    _name = 'hr.holidays.public.calendar'
+    _description = 'Public Holidays Working Days Calendar'
+
+    @api.model
+    def _get_country_id(self, country=None):
+        if country is None:
+            return self.env.ref('base.de').id
+        return country if isinstance(country, int) else country.id
+
+    @api.model
+    def _get_state_id(self, state, country_id):
+        if not state:
+            return False
+        if isinstance(state, str):
+            return self._get_state_ids_by_code(country_id)[state]
+        return state if isinstance(state, int) else state.id
+
+    @api.model
+    @tools.ormcache('country_id')
+    def _get_state_ids_by_code(self, country_id):
+        states = self.env['res.country.state'].sudo().search([
+            ('country_id', '=', country_id)])
+        return {state.code: state.id for state in states}
+
+    @api.model
+    def _invalidate(self):
+        """ Marks the calendar as outdated, after modifying the public
+        holidays."""
+        _local_generation[0] += 1
+
+    @api.model
+    def _get_generation(self):
+        """ Returns a key changing with every creation, modification or
+        deletion of public holidays, their lines and states: those of this
+        process are counted by _invalidate(), those of the other ones change
+        the write_date or the count of the records."""
+        self.env.cr.execute("""
+            SELECT
+              (SELECT ROW(COUNT(*), MAX(write_date))
+               FROM hr_holidays_public)::text,
+              (SELECT ROW(COUNT(*), MAX(write_date))
+               FROM hr_holidays_public_line)::text
+        """)
+        return (_local_generation[0], ) + self.env.cr.fetchone()
+
+    @api.model
+    @tools.ormcache('country_id', 'state_id', 'year', 'generation')
+    def _get_year_calendar(self, country_id, state_id, year, generation):
+        self._check_year_exists(country_id, year)
+        field = self.env['hr.holidays.public.line']._fields['state_ids']
+        start = date(year, 1, 1)
+        self.env.cr.execute("""
+            SELECT DISTINCT line.date
+            FROM hr_holidays_public_line line
+            JOIN hr_holidays_public holidays ON holidays.id = line.year_id
+            WHERE
+              holidays.country_id = %s AND
+              line.date >= %s AND line.date <= %s AND (
+                NOT EXISTS (
+                  SELECT 1 FROM {relation} rel
+                  WHERE rel.{column1} = line.id
+                ) OR EXISTS (
+                  SELECT 1 FROM {relation} rel
+                  WHERE rel.{column1} = line.id AND rel.{column2} = %s
+                )
+              )
+        """.format(
+            relation=field.relation,
+            column1=field.column1,
+            column2=field.column2,
+        ), (country_id, start, date(year, 12, 31), state_id or None))
+        holidays = 0
+        for row in self.env.cr.fetchall():
+            holidays |= 1 << (_to_date(row[0]) - start).days
+        days = 366 if calendar.isleap(year) else 365
+        working = array('H', [0])
+        weekday = start.weekday()
+        for day in range(days):
+            is_working = (weekday + day) % 7 not in WEEKEND and \
+                not holidays >> day & 1
+            working.append(working[-1] + is_working)
+        return YearCalendar(year, holidays, working)
+
+    @api.model
+    def _check_year_exists(self, country_id, year):
+        self.env.cr.execute("""
+            SELECT 1 FROM hr_holidays_public
+            WHERE country_id = %s AND year = %s
+        """, (country_id, year))
+        if not self.env.cr.fetchone():
+            country = self.env['res.country'].sudo().browse(country_id)
+            raise UserError(
+                _('The public holidays of %(country)s in %(year)s are not '
+                  'defined.') % {'country': country.name, 'year': year}
+            )
+
+    @api.model
+    def _get_calendar(self, state=None, country=None):
+        """ Returns a function mapping a year to its YearCalendar, for the
+        state and country."""
+        country_id = self._get_country_id(country)
+        state_id = self._get_state_id(state, country_id)
+        generation = self._get_generation()
+        return lambda year: self._get_year_calendar(
+            country_id, state_id, year, generation)
+
+    @api.model
+    def is_holiday(self, day, state=None, country=None):
+        return self.are_holidays([day], state=state, country=country)[0]
+
+    @api.model
+    def are_holidays(self, days, state=None, country=None):
+        """ Returns, for each of the dates, whether it is a public holiday.
+        """
+        get_calendar = self._get_calendar(state=state, country=country)
+        result = []
+        for day in days:
+            day = _to_date(day)
+            holidays = get_calendar(day.year).holidays
+            result.append(
+                bool(holidays >> day.timetuple().tm_yday - 1 & 1))
+        return result
+
+    @api.model
+    def is_working_day(self, day, state=None, country=None):
+        return self.are_working_days(
+            [day], state=state, country=country)[0]
+
+    @api.model
+    def are_working_days(self, days, state=None, country=None):
+        """ Returns, for each of the dates, whether it is a working day: a
+        day of the week which is not a public holiday."""
+        get_calendar = self._get_calendar(state=state, country=country)
+        result = []
+        for day in days:
+            day = _to_date(day)
+            working = get_calendar(day.year).working
+            index = day.timetuple().tm_yday
+            result.append(working[index] > working[index - 1])
+        return result
+
+    @api.model
+    def count_working_days(self, date_from, date_to, state=None,
+                           country=None):
+        """ Returns the number of working days from date_from to date_to,
+        both included."""
+        get_calendar = self._get_calendar(state=state, country=country)
+        date_from, date_to = _to_date(date_from), _to_date(date_to)
+        if date_from > date_to:
+            return 0
+        count = 0
+        for year in range(date_from.year, date_to.year + 1):
+            working = get_calendar(year).working
+            first = date_from.timetuple().tm_yday - 1 \
+                if year == date_from.year else 0
+            last = date_to.timetuple().tm_yday \
+                if year == date_to.year else len(working) - 1
+            count += working[last] - working[first]
+        return count
+
+    @api.model
+    def count_working_days_batch(self, periods, state=None, country=None):
+        """ Returns the number of working days of each of the (date_from,
+        date_to) periods."""
+        return [
+            self.count_working_days(
+                date_from, date_to, state=state, country=country)
+            for date_from, date_to in periods
+        ]
+
+    @api.model
+    def add_working_days(self, day, days, state=None, country=None):
+        """ Returns the date of the days-th working day after the date, or
+        before it if days is negative."""
+        return self.add_working_days_batch(
+            [day], days, state=state, country=country)[0]
+
+    @api.model
+    def add_working_days_batch(self, days_list, days, state=None,
+                               country=None):
+        """ Adds the same number of working days to each of the dates."""
+        get_calendar = self._get_calendar(state=state, country=country)
+        return [
+            self._add_working_days(get_calendar, _to_date(day), days)
+            for day in days_list
+        ]
+
+    @api.model
+    def _add_working_days(self, get_calendar, day, days):
+        if not days:
+            return day
+        year = day.year
+        working = get_calendar(year).working
+        index = day.timetuple().tm_yday
+        if days > 0:
+            # working days to find from the end of the day
+            target = working[index] + days
+            while target > working[-1]:
+                target -= working[-1]
+                year += 1
+                working = get_calendar(year).working
+        else:
+            # working days to find before the start of the day
+            target = working[index - 1] + days + 1
+            while target < 1:
+                year -= 1
+                working = get_calendar(year).working
+                target += working[-1]
+        # the first day after which target working days are counted
+        return date(year, 1, 1) + timedelta(
+            days=bisect_left(working, target) - 1)
@@ -0,0 +1,232 @@
+# Copyright 2018 elego Software Solutions GmbH - Yu Weng
+# Copyright 2018 initOS GmbH - Nikolina Todorova
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import api, models
+
+# fields of the lines the working days calendar is built from
+CALENDAR_FIELDS = {'date', 'state_ids', 'year_id'}
+
+
+class HrHolidaysPublicLine(models.Model):
+    _inherit = 'hr.holidays.public.line'
+
+    @api.model
+    def create(self, values):
+        self.env['hr.holidays.public.calendar']._invalidate()
+        return super(HrHolidaysPublicLine, self).create(values)
+
+    @api.multi
+    def write(self, values):
+        if CALENDAR_FIELDS.intersection(values):
+            self.env['hr.holidays.public.calendar']._invalidate()
+        return super(HrHolidaysPublicLine, self).write(values)
+
+    @api.multi
+    def unlink(self):
+        self.env['hr.holidays.public.calendar']._invalidate()
+        return super(HrHolidaysPublicLine, self).unlink()
+
+    @api.model
+    def _create_lines_bulk(self, values_list):
+        """ Creates the lines from their values, dicts of name, date,
+        variable_date, year_id and the list of state_ids, in a few queries
+        whatever their number. The constraint on the dates and states of
+        the lines is checked once they are all created."""
+        if not values_list:
+            return self
+        self.env.cr.execute("""
+            SELECT nextval('hr_holidays_public_line_id_seq')
+            FROM generate_series(1, %s)
+        """, (len(values_list), ))
+        line_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.execute("""
+            INSERT INTO hr_holidays_public_line (
+              id, name, date, variable_date, year_id,
+              create_uid, create_date, write_uid, write_date)
+            SELECT
+              id, name, date, variable_date, year_id,
+              %s, (now() at time zone 'UTC'),
+              %s, (now() at time zone 'UTC')
+            FROM unnest(
+              %s::integer[], %s::varchar[], %s::date[], %s::boolean[],
+              %s::integer[]
+            ) AS line(id, name, date, variable_date, year_id)
+        """, (
+            self.env.uid, self.env.uid, line_ids,
+            [values['name'] for values in values_list],
+            [values['date'] for values in values_list],
+            [values['variable_date'] for values in values_list],
+            [values['year_id'] for values in values_list],
+        ))
+        self._insert_states_rel(line_ids, values_list)
+        self.env['hr.holidays.public'].invalidate_cache(['line_ids'])
+        self.env['hr.holidays.public.calendar']._invalidate()
+        lines = self.browse(line_ids)
+        lines._check_date_state()
+        return lines
+
+    @api.model
+    def _insert_states_rel(self, line_ids, values_list):
+        field = self._fields['state_ids']
+        rel_line_ids, rel_state_ids = [], []
+        for line_id, values in zip(line_ids, values_list):
+            for state_id in values.get('state_ids') or []:
+                rel_line_ids.append(line_id)
+                rel_state_ids.append(state_id)
+        if rel_line_ids:
+            self.env.cr.execute("""
+                INSERT INTO {relation} ({column1}, {column2})
+                SELECT line_id, state_id
+                FROM unnest(%s::integer[], %s::integer[])
+                  AS rel(line_id, state_id)
+            """.format(
+                relation=field.relation,
+                column1=field.column1,
+                column2=field.column2,
+            ), (rel_line_ids, rel_state_ids))
+
+    @api.model
+    def _update_lines_bulk(self, values_by_line_id):
+        """ Replaces the name, date, variable_date and states of the lines
+        by those of their values, given by line id, in a few queries
+        whatever their number. As for _create_lines_bulk, the constraint on
+        the dates and states of the lines is checked afterwards."""
+        if not values_by_line_id:
+            return self
+        line_ids = list(values_by_line_id)
+        values_list = [values_by_line_id[line_id] for line_id in line_ids]
+        self.env.cr.execute("""
+            UPDATE hr_holidays_public_line line
+            SET
+              name = new.name,
+              date = new.date,
+              variable_date = new.variable_date,
+              write_uid = %s,
+              write_date = (now() at time zone 'UTC')
+            FROM unnest(
+              %s::integer[], %s::varchar[], %s::date[], %s::boolean[]
+            ) AS new(id, name, date, variable_date)
+            WHERE line.id = new.id
+        """, (
+            self.env.uid, line_ids,
+            [values['name'] for values in values_list],
+            [values['date'] for values in values_list],
+            [values['variable_date'] for values in values_list],
+        ))
+        field = self._fields['state_ids']
+        self.env.cr.execute("""
+            DELETE FROM {relation} WHERE {column1} IN %s
+        """.format(
+            relation=field.relation,
+            column1=field.column1,
+        ), (tuple(line_ids), ))
+        self._insert_states_rel(line_ids, values_list)
+        lines = self.browse(line_ids)
+        lines.invalidate_cache(ids=line_ids)
+        self.env['hr.holidays.public.calendar']._invalidate()
+        lines._check_date_state()
+        return lines
+
+    @api.model
+    def _sync_lines(self, holiday_years, values_list):
+        """ Makes the lines of the holidays years those of the values, dicts
+        of name, date, variable_date, year_id and the list of state_ids,
+        from the differences with the existing lines: the lines with the
+        same date, name and states are kept, the others of the same date
+        and states, then of the same name, are updated, and the remaining
+        ones are created or deleted in batch. Returns the lines of the
+        values, in their order."""
+        if not holiday_years:
+            return self
+        field = self._fields['state_ids']
+        self.env.cr.execute("""
+            SELECT
+              line.id, line.year_id, line.name, line.date,
+              line.variable_date,
+              array_remove(array_agg(rel.{column2}), NULL)
+            FROM hr_holidays_public_line line
+            LEFT JOIN {relation} rel ON rel.{column1} = line.id
+            WHERE line.year_id IN %s
+            GROUP BY line.id
+            ORDER BY line.id
+        """.format(
+            relation=field.relation,
+            column1=field.column1,
+            column2=field.column2,
+        ), (tuple(holiday_years.ids), ))
+        existing = {}
+        for line_id, year_id, name, date, variable_date, state_ids in \
+                self.env.cr.fetchall():
+            key = (year_id, date, name, frozenset(state_ids))
+            existing.setdefault(key, []).append((line_id, variable_date))
+
+        line_ids = [False] * len(values_list)
+        updates = {}
+        unmatched = []
+        for index, values in enumerate(values_list):
+            key = (
+                values['year_id'], values['date'], values['name'],
+                frozenset(values['state_ids']))
+            if existing.get(key):
+                line_id, variable_date = existing[key].pop(0)
+                line_ids[index] = line_id
+                if variable_date != values['variable_date']:
+                    updates[line_id] = values
+            else:
+                unmatched.append(index)
+
+        # the remaining lines are updated with the values of the same date
+        # and states, e.g. named in another language or merged with a
+        # coinciding holiday, then with those of the same name
+        by_date = {}
+        by_name = {}
+        for (year_id, date, name, state_ids), rows in sorted(
+                existing.items(), key=lambda item: item[0][:3]):
+            for line_id, variable_date in rows:
+                by_date.setdefault(
+                    (year_id, date, state_ids), []).append(line_id)
+                by_name.setdefault((year_id, name), []).append(line_id)
+        matched_ids = set()
+
+        def match(candidates):
+            while candidates:
+                line_id = candidates.pop(0)
+                if line_id not in matched_ids:
+                    matched_ids.add(line_id)
+                    return line_id
+            return False
+
+        for index in list(unmatched):
+            values = values_list[index]
+            line_id = match(by_date.get((
+                values['year_id'], values['date'],
+                frozenset(values['state_ids']))))
+            if line_id:
+                line_ids[index] = line_id
+                updates[line_id] = values
+                unmatched.remove(index)
+        creates = []
+        for index in unmatched:
+            values = values_list[index]
+            line_id = match(by_name.get((values['year_id'], values['name'])))
+            if line_id:
+                line_ids[index] = line_id
+                updates[line_id] = values
+            else:
+                creates.append(index)
+
+        deleted_ids = [
+            line_id
+            for candidates in by_name.values()
+            for line_id in candidates
+            if line_id not in matched_ids
+        ]
+        if deleted_ids:
+            self.browse(deleted_ids).unlink()
+        self._update_lines_bulk(updates)
+        created = self._create_lines_bulk(
+            [values_list[index] for index in creates])
+        for index, line_id in zip(creates, created.ids):
+            line_ids[index] = line_id
+        return self.browse(line_ids)
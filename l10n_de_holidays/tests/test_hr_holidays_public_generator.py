@@ -2,6 +2,8 @@
 # Copyright 2018 initOS GmbH - Nikolina Todorova
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from datetime import date
+
 from . import common
 from odoo.exceptions import UserError
 
@@ -118,3 +120,191 @@ class TestHrHolidaysPublicGenerator(common.TestHolidaysGenerator):
 
         with self.assertRaises(UserError):
             hr_holidays_public_generator_copy.action_run()
+
+    def test_generate_de_holidays_range(self):
+        lines = self.HrHolidaysPublicGenerator.generate_de_holidays(
+            2000, 2010)
+        holiday_years = self.HrHolidaysPublic.search([
+            ('year', '>=', 2000),
+            ('year', '<=', 2010),
+            ('country_id', '=', self.CountryId),
+        ])
+        self.assertEqual(len(holiday_years), 11)
+        self.assertEqual(holiday_years.mapped('line_ids'), lines)
+        # Ascension Day and International Workers' Day coincide in 2008
+        self.assertEqual(len(lines), 11 * 16 - 1)
+        may_day = lines.filtered(lambda l: l.date == '2008-05-01')
+        self.assertEqual(
+            may_day.name, "International Workers' Day / Ascension Day")
+        self.assertTrue(may_day.variable_date)
+
+        good_friday = lines.filtered(
+            lambda l: l.date == '2008-03-21')
+        self.assertTrue(good_friday.variable_date)
+        self.assertFalse(good_friday.state_ids)
+        assumption_day = lines.filtered(lambda l: l.date == '2005-08-15')
+        self.assertEqual(
+            sorted(assumption_day.state_ids.mapped('code')), ['BY', 'SL'])
+        self.assertEqual(assumption_day.year_id.year, 2005)
+
+        # generating again replaces the lines, for a single state
+        berlin = self.env.ref('l10n_de_country_states.res_country_state_BE')
+        lines = self.HrHolidaysPublicGenerator.generate_de_holidays(
+            2000, 2010, state=berlin)
+        self.assertEqual(holiday_years.mapped('line_ids'), lines)
+        self.assertEqual(len(lines), 11 * 10 - 1)
+        self.assertFalse(lines.mapped('state_ids'))
+
+    def test_regenerate_de_holidays(self):
+        lines = self.HrHolidaysPublicGenerator.generate_de_holidays(
+            2018, 2019)
+        self.assertEqual(
+            self.HrHolidaysPublicGenerator.generate_de_holidays(
+                2018, 2019).ids, lines.ids)
+
+        christmas_day = lines.filtered(lambda l: l.date == '2018-12-25')
+        christmas_day.write({'date': '2018-12-24'})
+        new_years_day = lines.filtered(lambda l: l.date == '2019-01-01')
+        new_years_day.unlink()
+        extra_day = self.HrHolidaysPublicLine.create({
+            'name': 'Extra Day',
+            'date': '2018-06-01',
+            'year_id': christmas_day.year_id.id,
+        })
+        regenerated_lines = \
+            self.HrHolidaysPublicGenerator.generate_de_holidays(2018, 2019)
+        self.assertEqual(len(regenerated_lines), len(lines))
+        self.assertIn(christmas_day, regenerated_lines)
+        self.assertEqual(christmas_day.date, '2018-12-25')
+        self.assertFalse(extra_day.exists())
+        self.assertEqual(
+            regenerated_lines.filtered(
+                lambda l: l.date == '2019-01-01').name, "New Years's Day")
+        self.assertEqual(
+            (regenerated_lines - lines).mapped('date'), ['2019-01-01'])
+
+    def test_regenerate_de_holidays_other_language(self):
+        self.env['res.lang'].load_lang('de_DE')
+        self.env['ir.translation'].load_module_terms(
+            ['l10n_de_holidays'], ['de_DE'])
+        lines = self.HrHolidaysPublicGenerator.generate_de_holidays(
+            2018, 2019)
+        regenerated_lines = self.HrHolidaysPublicGenerator.with_context(
+            lang='de_DE').generate_de_holidays(2018, 2019)
+        self.assertEqual(regenerated_lines.ids, lines.ids)
+        self.assertEqual(
+            lines.filtered(lambda l: l.date == '2019-01-01').name,
+            'Neujahr')
+
+    def test_copy_de_holidays_range(self):
+        self.HrHolidaysPublicGenerator.generate_de_holidays(2018, 2018)
+        template = self.HrHolidaysPublic.search([
+            ('year', '=', 2018),
+            ('country_id', '=', self.CountryId),
+        ])
+        lines = self.HrHolidaysPublicGenerator.copy_de_holidays(
+            template, 2019, 2023)
+        self.assertEqual(len(lines), 5 * 16)
+        self.assertEqual(
+            lines.filtered(lambda l: l.name == 'Christmas Day').mapped(
+                'date'), [
+                '2019-12-25', '2020-12-25', '2021-12-25', '2022-12-25',
+                '2023-12-25',
+            ])
+        repentance_day = lines.filtered(
+            lambda l: l.name == 'Repentance Day' and l.year_id.year == 2022)
+        self.assertEqual(repentance_day.date, '2022-11-16')
+        self.assertTrue(repentance_day.variable_date)
+        self.assertEqual(
+            sorted(lines.mapped('year_id.year')),
+            [2019, 2020, 2021, 2022, 2023])
+        self.assertEqual(
+            self.HrHolidaysPublicGenerator.copy_de_holidays(
+                template, 2019, 2023).ids, lines.ids)
+
+        with self.assertRaises(UserError):
+            self.HrHolidaysPublicGenerator.copy_de_holidays(
+                template, 2017, 2019)
+
+        # Repentance Day of a template generated before the rules
+        template.line_ids.filtered(
+            lambda l: l.name == 'Repentance Day').write({
+                'date': '2018-11-23',
+                'variable_date': False,
+            })
+        lines = self.HrHolidaysPublicGenerator.copy_de_holidays(
+            template, 2019, 2019)
+        repentance_day = lines.filtered(lambda l: l.name == 'Repentance Day')
+        self.assertEqual(repentance_day.mapped('date'), ['2019-11-20'])
+
+    def test_holidays_rules(self):
+        lines = self.HrHolidaysPublicGenerator.generate_de_holidays(
+            2017, 2022)
+        repentance_days = lines.filtered(
+            lambda l: l.name == 'Repentance Day')
+        self.assertEqual(
+            repentance_days.mapped('date'), [
+                '2017-11-22', '2018-11-21', '2019-11-20', '2020-11-18',
+                '2021-11-17', '2022-11-16',
+            ])
+        self.assertTrue(all(repentance_days.mapped('variable_date')))
+        self.assertEqual(repentance_days.mapped('state_ids.code'), ['SN'])
+
+        reformation_days = lines.filtered(
+            lambda l: l.name == 'Day of Reformation')
+        self.assertEqual(len(reformation_days), 6)
+        self.assertFalse(reformation_days[0].state_ids)
+        self.assertIn(
+            'NI', reformation_days[1].state_ids.mapped('code'))
+        self.assertFalse(lines.filtered(
+            lambda l: l.date == '2018-03-08'))
+        womens_day = lines.filtered(lambda l: l.date == '2019-03-08')
+        self.assertEqual(womens_day.state_ids.mapped('code'), ['BE'])
+
+    def test_working_days_calendar(self):
+        self.HrHolidaysPublicGenerator.generate_de_holidays(2018, 2019)
+        calendar = self.env['hr.holidays.public.calendar']
+        self.assertTrue(calendar.is_holiday('2018-01-06', state='BY'))
+        self.assertFalse(calendar.is_holiday('2018-01-06', state='NW'))
+        self.assertFalse(calendar.is_holiday('2018-01-06'))
+        self.assertTrue(calendar.is_holiday(date(2018, 12, 25)))
+        self.assertEqual(
+            calendar.are_working_days(
+                ['2018-12-22', '2018-12-24', '2018-12-25'], state='NW'),
+            [False, True, False])
+        self.assertEqual(
+            calendar.count_working_days(
+                '2018-12-24', '2019-01-02', state='NW'), 5)
+        self.assertEqual(
+            calendar.count_working_days_batch([
+                ('2018-01-01', '2018-12-31'),
+                ('2019-01-02', '2019-01-01'),
+            ], state='NW'), [250, 0])
+        self.assertEqual(
+            calendar.add_working_days('2018-12-21', 3, state='NW'),
+            date(2018, 12, 28))
+        self.assertEqual(
+            calendar.add_working_days_batch(
+                ['2019-01-02', '2018-12-24'], -2, state='NW'),
+            [date(2018, 12, 28), date(2018, 12, 20)])
+
+        # the calendar follows the changes of the holidays
+        self.HrHolidaysPublicLine.search([
+            ('date', '=', '2018-12-25'),
+        ]).unlink()
+        self.assertFalse(calendar.is_holiday('2018-12-25'))
+        self.assertEqual(
+            calendar.count_working_days(
+                '2018-12-24', '2019-01-02', state='NW'), 6)
+        boxing_day = self.HrHolidaysPublicLine.search([
+            ('date', '=', '2018-12-26'),
+        ])
+        boxing_day.date = '2018-12-27'
+        self.assertFalse(calendar.is_holiday('2018-12-26'))
+        self.assertTrue(calendar.is_holiday('2018-12-27'))
+
+        # the years without public holidays are not taken as working years
+        with self.assertRaises(UserError):
+            calendar.is_holiday('2020-01-01')
+        with self.assertRaises(UserError):
+            calendar.add_working_days('2019-12-30', 3)
@@ -1,15 +1,25 @@
 # Copyright 2018 elego Software Solutions GmbH - Yu Weng
 # Copyright 2018 initOS GmbH - Nikolina Todorova
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
-from datetime import datetime, timedelta
+import calendar
+from collections import OrderedDict
+from datetime import timedelta
 from dateutil import easter
 
 from odoo import _, api, fields, models
 from odoo.addons.hr_holidays_public.wizards import hr_holidays_public_generator
 from odoo.exceptions import UserError
 
+from .hr_holidays_public_rules_de import get_holidays, get_rules
+
 hr_holidays_public_generator.COUNTRY_GENERATORS.append("DE")
 
+# codes of the German states, as in the xmlids of l10n_de_country_states
+DE_STATE_CODES = [
+    'BB', 'BE', 'BW', 'BY', 'HB', 'HE', 'HH', 'MV',
+    'NI', 'NW', 'RP', 'SH', 'SL', 'SN', 'ST', 'TH',
+]
+
 
 class HrHolidaysPublicGenerator(models.TransientModel):
     _inherit = 'hr.holidays.public.generator'
@@ -44,269 +54,217 @@ class HrHolidaysPublicGenerator(models.TransientModel):
         return fields.Date.to_string(corpus_christi)
 
     @api.model
-    def calculate_floating_holidays(self, existing_holidays):
-        public_holiday_line_obj = self.env['hr.holidays.public.line']
-        easter = self.calculate_easter_sunday(self.year)
+    def _get_de_state_ids(self):
+        """ Returns the ids of the German states by code, their xmlids being
+        resolved in a single query."""
+        prefix = 'res_country_state_'
+        data = self.env['ir.model.data'].sudo().search([
+            ('module', '=', 'l10n_de_country_states'),
+            ('name', 'in', [prefix + code for code in DE_STATE_CODES]),
+        ])
+        return {record.name[len(prefix):]: record.res_id for record in data}
 
-        public_holiday_line_obj.create({'name': _('Good Friday'),
-                                        'date':
-                                            self.calculate_new_good_friday(
-                                                easter),
-                                        'variable_date': True,
-                                        'year_id': existing_holidays.id})
-        public_holiday_line_obj.create({'name': _('Easter Sunday'),
-                                        'date': fields.Date.to_string(easter),
-                                        'variable_date': True,
-                                        'year_id': existing_holidays.id})
+    @api.model
+    def _compute_de_holidays(self, year, state_ids, state=None):
+        """ Returns the values of the holidays of the year, as dicts of name,
+        date, variable_date and state_ids, from the rules of the holidays,
+        the holidays of some states only being left out if state is not one
+        of them. state_ids maps the codes of the states to their ids."""
+        values_list = []
+        for holiday in get_holidays(year):
+            holiday_state_ids = [state_ids[code] for code in holiday.states]
+            if holiday_state_ids and state and \
+                    state.id not in holiday_state_ids:
+                continue
+            values_list.append({
+                'name': _(holiday.name),
+                'date': fields.Date.to_string(holiday.date),
+                'variable_date': holiday.variable_date,
+                'state_ids': holiday_state_ids,
+            })
+        return values_list
 
-        public_holiday_line_obj.create({'name': _('Easter Monday'),
-                                        'date':
-                                            self.calculate_easter_monday(
-                                                easter),
-                                        'variable_date': True,
-                                        'year_id': existing_holidays.id})
-        public_holiday_line_obj.create({'name': _('Ascension Day'),
-                                        'date':
-                                            self.calculate_ascension_day(
-                                                easter),
-                                        'variable_date': True,
-                                        'year_id': existing_holidays.id})
+    @api.model
+    def _get_de_variable_holiday_names(self):
+        """ Returns the names of the holidays whose date changes from year to
+        year, both untranslated and translated."""
+        names = set()
+        for rule in get_rules():
+            if rule.variable_date:
+                names.update([rule.name, _(rule.name)])
+        return names
 
-        public_holiday_line_obj.create({'name': _('Whit Monday'),
-                                        'date':
-                                            self.calculate_whit_monday(
-                                                easter),
-                                        'variable_date': True,
-                                        'year_id': existing_holidays.id})
+    @api.model
+    def _merge_coinciding_holidays(self, values_list):
+        """ Merges the holidays of a year falling on the same date for the
+        same states, e.g. Ascension Day and International Workers' Day in
+        2008, into a single line named after all of them: hr_holidays_public
+        does not allow several holidays on a date for a state."""
+        merged = OrderedDict()
+        for values in values_list:
+            key = (
+                values.get('year_id'), values['date'],
+                frozenset(values['state_ids']))
+            if key in merged:
+                holiday = merged[key]
+                holiday['name'] = '%s / %s' % (
+                    holiday['name'], values['name'])
+                holiday['variable_date'] = \
+                    holiday['variable_date'] or values['variable_date']
+            else:
+                merged[key] = dict(values)
+        return list(merged.values())
+
+    @api.model
+    def _create_de_holidays(self, existing_holidays, variable_date,
+                            with_states, state=None):
+        year = existing_holidays.year
+        values_list = [
+            dict(values, year_id=existing_holidays.id)
+            for values in self._compute_de_holidays(
+                year, self._get_de_state_ids(), state=state)
+            if values['variable_date'] == variable_date and
+            bool(values['state_ids']) == with_states
+        ]
+        return self.env['hr.holidays.public.line']._create_lines_bulk(
+            values_list)
+
+    @api.model
+    def calculate_floating_holidays(self, existing_holidays):
+        self._create_de_holidays(existing_holidays, True, False)
 
     @api.model
     def calculate_state_floating_holidays(self,
                                           existing_holidays,
                                           state=None):
-        public_holiday_line_obj = self.env['hr.holidays.public.line']
-        easter = self.calculate_easter_sunday(self.year)
-        # Baden-Württemberg, Bavaria, Hesse, North
-        # Rhine-Westphalia, Rhineland-Palatinate, Saarland
-        state_ids = [
-            self.env.ref('l10n_de_country_states.res_country_state_BW').id,
-            self.env.ref('l10n_de_country_states.res_country_state_BY').id,
-            self.env.ref('l10n_de_country_states.res_country_state_HE').id,
-            self.env.ref('l10n_de_country_states.res_country_state_NW').id,
-            self.env.ref('l10n_de_country_states.res_country_state_RP').id,
-            self.env.ref('l10n_de_country_states.res_country_state_SL').id
-        ]
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("Corpus Christi"),
-                'date': self.calculate_corpus_christi(easter),
-                'variable_date': True,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
+        self._create_de_holidays(existing_holidays, True, True, state=state)
 
     @api.model
     def calculate_fixed_holidays(self, existing_holidays):
-        public_holiday_line_obj = self.env['hr.holidays.public.line']
-
-        public_holiday_line_obj.create({
-            'name': _("New Years's Day"),
-            'date': "%s-01-01" % existing_holidays.year,
-            'variable_date': False,
-            'year_id': existing_holidays.id
-        })
-        public_holiday_line_obj.create({
-            'name': _("International Workers' Day"),
-            'date': "%s-05-01" % existing_holidays.year,
-            'variable_date': False,
-            'year_id': existing_holidays.id
-        })
-        public_holiday_line_obj.create({
-            'name': _("Day of German Unity"),
-            'date': "%s-10-03" % existing_holidays.year,
-            'variable_date': False,
-            'year_id': existing_holidays.id
-        })
-        public_holiday_line_obj.create({
-            'name': _("Christmas Day"),
-            'date': "%s-12-25" % existing_holidays.year,
-            'variable_date': False,
-            'year_id': existing_holidays.id
-        })
-        public_holiday_line_obj.create({
-            'name': _("Boxing Day"),
-            'date': "%s-12-26" % existing_holidays.year,
-            'variable_date': False,
-            'year_id': existing_holidays.id
-        })
+        self._create_de_holidays(existing_holidays, False, False)
 
     @api.model
     def calculate_state_fixed_holidays(self, existing_holidays, state=None):
-        public_holiday_line_obj = self.env['hr.holidays.public.line']
-        # Baden-Württemberg, Bavaria, Saxony-Anhalt
-        state_ids = [
-            self.env.ref('l10n_de_country_states.res_country_state_BW').id,
-            self.env.ref('l10n_de_country_states.res_country_state_BY').id,
-            self.env.ref('l10n_de_country_states.res_country_state_ST').id
-        ]
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("Three Kings Day"),
-                'date': "%s-01-06" % existing_holidays.year,
-                'variable_date': False,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
-        # Bavaria, Saarland
-        state_ids = [
-            self.env.ref('l10n_de_country_states.res_country_state_BY').id,
-            self.env.ref('l10n_de_country_states.res_country_state_SL').id
-        ]
+        self._create_de_holidays(existing_holidays, False, True, state=state)
 
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("Assumption Day"),
-                'date': "%s-08-15" % existing_holidays.year,
-                'variable_date': False,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
-        # BB, HB, HH, MVP, NDS, SH, SN, ST, TH
-        # (depends on
-        # https://www.timeanddate.com/holidays/germany/reformation-day)
-        state_ids = [
-            self.env.ref('l10n_de_country_states.res_country_state_BB').id,
-            self.env.ref('l10n_de_country_states.res_country_state_HB').id,
-            self.env.ref('l10n_de_country_states.res_country_state_HH').id,
-            self.env.ref('l10n_de_country_states.res_country_state_MV').id,
-            self.env.ref('l10n_de_country_states.res_country_state_NI').id,
-            self.env.ref('l10n_de_country_states.res_country_state_SH').id,
-            self.env.ref('l10n_de_country_states.res_country_state_SN').id,
-            self.env.ref('l10n_de_country_states.res_country_state_ST').id,
-            self.env.ref('l10n_de_country_states.res_country_state_TH').id]
+    @api.model
+    def _get_holiday_years(self, country, years):
+        """ Returns the holidays years of the country as a dict mapping the
+        years to their records, creating the missing ones."""
+        public_holiday_obj = self.env['hr.holidays.public']
+        holiday_years = {
+            holidays.year: holidays
+            for holidays in public_holiday_obj.search([
+                ('year', 'in', list(years)),
+                ('country_id', '=', country.id),
+            ])
+        }
+        for year in years:
+            if year not in holiday_years:
+                holiday_years[year] = public_holiday_obj.create({
+                    'year': year,
+                    'country_id': country.id,
+                })
+        return holiday_years
 
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("Day of Reformation"),
-                'date': "%s-10-31" % existing_holidays.year,
-                'variable_date': False,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
-        # Baden-Württemberg, Bavaria,
-        # North Rhine-Westphalia, Rhineland-Palatinate, Saarland
-        state_ids = [
-            self.env.ref('l10n_de_country_states.res_country_state_BW').id,
-            self.env.ref('l10n_de_country_states.res_country_state_BY').id,
-            self.env.ref('l10n_de_country_states.res_country_state_NW').id,
-            self.env.ref('l10n_de_country_states.res_country_state_RP').id,
-            self.env.ref('l10n_de_country_states.res_country_state_SL').id
-        ]
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("All Saints' Day"),
-                'date': "%s-11-01" % existing_holidays.year,
-                'variable_date': False,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
-        # Sachsen
-        state_ids = \
-            [self.env.ref('l10n_de_country_states.res_country_state_SN').id]
-        if not state or state.id in state_ids:
-            public_holiday_line_obj.create({
-                'name': _("Repentance Day"),
-                'date': "%s-11-23" % existing_holidays.year,
-                'variable_date': False,
-                'state_ids': [(6, 0, state_ids)],
-                'year_id': existing_holidays.id
-            })
+    @api.model
+    def generate_de_holidays(self, year_from, year_to, state=None,
+                             country=None):
+        """ Generates the German holidays of all the years from year_from to
+        year_to included, replacing the existing ones, for all the states
+        or only those of state. The states are resolved once, and only the
+        differences with the existing lines of all the years are applied,
+        in batch, e.g. to generate decades of calendars."""
+        country = country or self.env.ref('base.de')
+        years = range(year_from, year_to + 1)
+        state_ids = self._get_de_state_ids()
+        holiday_years = self._get_holiday_years(country, years)
+        values_list = []
+        for year in years:
+            for values in self._compute_de_holidays(
+                    year, state_ids, state=state):
+                values['year_id'] = holiday_years[year].id
+                values_list.append(values)
+        return self.env['hr.holidays.public.line']._sync_lines(
+            self.env['hr.holidays.public'].browse([
+                holidays.id for holidays in holiday_years.values()
+            ]), self._merge_coinciding_holidays(values_list))
 
     @api.multi
     def action_delete_holidays(self, existing_holidays):
         self.ensure_one()
-        if existing_holidays:
-            for holiday_line in existing_holidays.line_ids:
-                holiday_line.unlink()
+        existing_holidays.mapped('line_ids').unlink()
         return existing_holidays
 
     @api.multi
     def action_generate_de_holidays(self):
-        public_holiday_obj = self.env['hr.holidays.public']
-
         for wizard in self:
-            existing_holidays = \
-                public_holiday_obj.search(
-                    [('year', '=', self.year),
-                     ('country_id', '=', wizard.country_id.id)]
-                )
-            if not existing_holidays:
-                existing_holidays = \
-                    public_holiday_obj.create({
-                        'year': wizard.year,
-                        'country_id': wizard.country_id.id})
-            wizard.action_delete_holidays(existing_holidays)
-            wizard.calculate_floating_holidays(existing_holidays)
-            wizard.calculate_fixed_holidays(existing_holidays)
-            wizard.calculate_state_floating_holidays(
-                existing_holidays, state=wizard.state_id
-            )
-            wizard.calculate_state_fixed_holidays(
-                existing_holidays, state=wizard.state_id
-            )
+            wizard.generate_de_holidays(
+                wizard.year, wizard.year, state=wizard.state_id,
+                country=wizard.country_id)
 
         return {
             'type': 'ir.actions.act_window_close',
         }
 
+    @api.model
+    def copy_de_holidays(self, template, year_from, year_to, state=None,
+                         country=None):
+        """ Copies the holidays of the template year to all the years from
+        year_from to year_to included, replacing the existing ones: the fixed
+        holidays of the template are moved to each year, and the floating
+        ones are computed for it, for all the states or only those of state.
+        The template is read once, and only the differences with the
+        existing lines of all the years are applied, in batch, e.g. to plan
+        many years ahead."""
+        years = range(year_from, year_to + 1)
+        if template.year in years:
+            raise UserError(
+                _('You cannot copy the holidays to the same year.')
+            )
+        country = country or template.country_id
+        # the holidays the rules compute are left out even if the template
+        # stores them as fixed, e.g. Repentance Day as generated before it
+        # was computed from the rules
+        variable_names = self._get_de_variable_holiday_names()
+        fixed_holidays = [
+            (line['name'], line['date'][4:], line['state_ids'])
+            for line in template.line_ids.read(
+                ['name', 'date', 'variable_date', 'state_ids'])
+            if not line['variable_date'] and
+            line['name'] not in variable_names
+        ]
+        state_ids = self._get_de_state_ids()
+        holiday_years = self._get_holiday_years(country, years)
+        values_list = []
+        for year in years:
+            year_id = holiday_years[year].id
+            leap = calendar.isleap(year)
+            values_list += [{
+                'name': name,
+                'date': '%s%s' % (year, month_day),
+                'variable_date': False,
+                'state_ids': holiday_state_ids,
+                'year_id': year_id,
+            } for name, month_day, holiday_state_ids in fixed_holidays
+                if leap or month_day != '-02-29']
+            values_list += [
+                dict(values, year_id=year_id)
+                for values in self._compute_de_holidays(
+                    year, state_ids, state=state)
+                if values['variable_date']
+            ]
+        return self.env['hr.holidays.public.line']._sync_lines(
+            self.env['hr.holidays.public'].browse([
+                holidays.id for holidays in holiday_years.values()
+            ]), self._merge_coinciding_holidays(values_list))
+
     @api.multi
     def action_copy_de_holidays(self):
-        public_holiday_obj = self.env['hr.holidays.public']
-        public_holiday_line_obj = self.env['hr.holidays.public.line']
-
         for wizard in self:
-            if wizard.year == wizard.template_id.year:
-                raise UserError(
-                    _('You cannot copy the holidays to the same year.')
-                )
-
-            # unlink all currently existing holiday lines in target year
-            # before deleting target year
-            existing_holidays_year_to = \
-                public_holiday_obj.search([
-                    ('year', '=', wizard.year),
-                    ('country_id', '=', wizard.country_id.id)
-                ])
-            wizard.action_delete_holidays(existing_holidays_year_to)
-
-            # create new year for holidays
-            if not existing_holidays_year_to:
-                new_holiday_year = \
-                    public_holiday_obj.create({
-                        'year': wizard.year,
-                        'country_id': wizard.country_id.id
-                    })
-            else:
-                new_holiday_year = existing_holidays_year_to[0]
-            # copy fixed holidays from source year replacing the year
-            for holiday in wizard.template_id.line_ids:
-                if holiday.variable_date:
-                    continue
-                holiday_date = datetime.strptime(holiday.date, '%Y-%m-%d')
-                new_holiday_date = \
-                    "%s-%s-%s" % (wizard.year,
-                                  holiday_date.month, holiday_date.day)
-                public_holiday_line_obj.create({
-                    'name': holiday.name,
-                    'date': new_holiday_date,
-                    'variable_date': False,
-                    'state_ids': [(6, 0, [s.id for s in holiday.state_ids])],
-                    'year_id': new_holiday_year.id
-                })
-            wizard.calculate_floating_holidays(new_holiday_year)
-            wizard.calculate_state_floating_holidays(
-                new_holiday_year,
-                state=wizard.state_id
-            )
+            wizard.copy_de_holidays(
+                wizard.template_id, wizard.year, wizard.year,
+                state=wizard.state_id, country=wizard.country_id)
 
         return {
             'type': 'ir.actions.act_window_close',
@@ -0,0 +1,120 @@
+# Copyright 2018 elego Software Solutions GmbH - Yu Weng
+# Copyright 2018 initOS GmbH - Nikolina Todorova
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+"""Rules of the German public holidays.
+
+Each rule declares a holiday as (name, kind, parameters, states, first year,
+last year):
+
+- kind and parameters: how the date of the holiday is computed in a year,
+  'fixed' with (month, day), 'easter' with the offset in days from Easter
+  Sunday, or 'weekday_before' with (month, day, weekday) for the last such
+  day of the week strictly before the date, e.g. the Wednesday before the
+  23rd of November;
+- states: the codes of the states the holiday is limited to, separated by
+  spaces, empty for a holiday of the whole country;
+- first year and last year: the years the rule is valid, included, None
+  for an unlimited range.
+
+A holiday whose states or date rule changed over time is declared by several
+rules with consecutive ranges of years. The dates of the fixed holidays do
+not change from year to year, the others are variable.
+"""
+
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+from dateutil import easter
+
+
+def _(source):
+    # marks the names for the export of the translations: they are
+    # translated when creating the holidays lines
+    return source
+
+
+RULES = [
+    (_("New Years's Day"), 'fixed', (1, 1), '', None, None),
+    (_('Three Kings Day'), 'fixed', (1, 6), 'BW BY ST', None, None),
+    (_("International Women's Day"), 'fixed', (3, 8), 'BE', 2019, 2022),
+    (_("International Women's Day"), 'fixed', (3, 8), 'BE MV', 2023, None),
+    (_('Good Friday'), 'easter', -2, '', None, None),
+    (_('Easter Sunday'), 'easter', 0, '', None, None),
+    (_('Easter Monday'), 'easter', 1, '', None, None),
+    (_("International Workers' Day"), 'fixed', (5, 1), '', None, None),
+    (_('Ascension Day'), 'easter', 39, '', None, None),
+    (_('Whit Monday'), 'easter', 50, '', None, None),
+    (_('Corpus Christi'), 'easter', 60, 'BW BY HE NW RP SL', None, None),
+    (_('Assumption Day'), 'fixed', (8, 15), 'BY SL', None, None),
+    (_("World Children's Day"), 'fixed', (9, 20), 'TH', 2019, None),
+    (_('Day of German Unity'), 'fixed', (10, 3), '', 1990, None),
+    (_('Day of Reformation'), 'fixed', (10, 31), 'BB MV SN ST TH',
+     1990, 2016),
+    # 500th anniversary of the Reformation
+    (_('Day of Reformation'), 'fixed', (10, 31), '', 2017, 2017),
+    (_('Day of Reformation'), 'fixed', (10, 31),
+     'BB HB HH MV NI SH SN ST TH', 2018, None),
+    (_("All Saints' Day"), 'fixed', (11, 1), 'BW BY NW RP SL', None, None),
+    (_('Repentance Day'), 'weekday_before', (11, 23, 2), '', None, 1994),
+    (_('Repentance Day'), 'weekday_before', (11, 23, 2), 'SN', 1995, None),
+    (_('Christmas Day'), 'fixed', (12, 25), '', None, None),
+    (_('Boxing Day'), 'fixed', (12, 26), '', None, None),
+]
+
+HolidayRule = namedtuple('HolidayRule', [
+    'name', 'kind', 'parameters', 'variable_date', 'states', 'year_from',
+    'year_to'])
+
+Holiday = namedtuple('Holiday', ['name', 'date', 'variable_date', 'states'])
+
+KINDS = ('fixed', 'easter', 'weekday_before')
+
+
+@lru_cache()
+def get_rules():
+    """ Returns the compiled rules, checked and computed once per process,
+    the states being tuples of codes."""
+    rules = []
+    for name, kind, parameters, states, year_from, year_to in RULES:
+        if kind not in KINDS:
+            raise ValueError(
+                'Unknown kind %s of the holiday %s.' % (kind, name))
+        if year_from and year_to and year_from > year_to:
+            raise ValueError(
+                'Empty range of years of the holiday %s.' % name)
+        rules.append(HolidayRule(
+            name=name,
+            kind=kind,
+            parameters=parameters,
+            variable_date=kind != 'fixed',
+            states=tuple(states.split()),
+            year_from=year_from or 0,
+            year_to=year_to or date.max.year,
+        ))
+    return tuple(rules)
+
+
+@lru_cache(maxsize=512)
+def get_holidays(year):
+    """ Returns the holidays of the year, evaluating all the rules at once,
+    sorted by date."""
+    easter_sunday = easter.easter(year)
+    holidays = []
+    for rule in get_rules():
+        if not rule.year_from <= year <= rule.year_to:
+            continue
+        if rule.kind == 'fixed':
+            holiday_date = date(year, *rule.parameters)
+        elif rule.kind == 'easter':
+            holiday_date = easter_sunday + timedelta(days=rule.parameters)
+        else:
+            month, day, weekday = rule.parameters
+            holiday_date = date(year, month, day)
+            holiday_date -= timedelta(
+                days=(holiday_date.weekday() - weekday - 1) % 7 + 1)
+        holidays.append(Holiday(
+            rule.name, holiday_date, rule.variable_date, rule.states))
+    holidays.sort(key=lambda holiday: holiday.date)
+    return tuple(holidays)
@@ -2,5 +2,6 @@
 # Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from . import controllers
 from . import models
 from . import wizard
@@ -4,7 +4,7 @@
 
 {
     'name': 'German VAT Statement',
-    'version': '11.0.1.1.1',
+    'version': '11.0.1.9.0',
     'category': 'Localization',
     'license': 'AGPL-3',
     'author': 'OpenBIG.org, Onestein, Odoo Community Association (OCA)',
@@ -12,16 +12,19 @@
     'depends': [
         'account_invoicing',
         'account_tax_balance',
+        'mail',
     ],
     'data': [
         'security/ir.model.access.csv',
         'security/tax_statement_security_rule.xml',
         'data/paperformat.xml',
+        'data/ir_cron.xml',
         'templates/assets.xml',
         'views/l10n_de_tax_statement_view.xml',
         'views/report_tax_statement.xml',
         'report/report_tax_statement.xml',
         'wizard/l10n_de_tax_statement_config_wizard.xml',
+        'wizard/l10n_de_tax_statement_batch_wizard.xml',
     ],
     'installable': True,
 }
@@ -0,0 +1,23 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+
+class VatStatementController(http.Controller):
+
+    @http.route(
+        '/l10n_de_tax_statement/elster/<int:statement_id>',
+        type='http', auth='user')
+    def elster(self, statement_id, **kwargs):
+        statement = request.env['l10n.de.tax.statement'].browse(statement_id)
+        statement.check_access_rights('read')
+        statement.check_access_rule('read')
+        content = statement._render_elster_xml()
+        return request.make_response(content, headers=[
+            ('Content-Type', 'application/xml'),
+            ('Content-Disposition', content_disposition(
+                statement._get_elster_filename())),
+        ])
@@ -0,0 +1,27 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo.addons.l10n_de_tax_statement.models.l10n_de_tax_statement_line \
+    import _get_line_layout
+
+
+def migrate(cr, version):
+    # the display flags of the existing lines are now stored
+    cr.execute('SELECT DISTINCT version FROM l10n_de_tax_statement')
+    for statement_version, in cr.fetchall():
+        for code, flags in _get_line_layout(statement_version).items():
+            cr.execute("""
+                UPDATE l10n_de_tax_statement_line line
+                SET
+                  display_base = %s,
+                  display_tax = %s,
+                  is_group = %s,
+                  is_total = %s,
+                  is_editable = %s
+                FROM l10n_de_tax_statement statement
+                WHERE
+                  statement.id = line.statement_id AND
+                  statement.version = %s AND
+                  line.code = %s
+            """, tuple(flags) + (statement_version, code))
@@ -5,6 +5,9 @@
 from . import l10n_de_tax_statement
 from . import l10n_de_tax_statement_line
 from . import l10n_de_tax_statement_config
+from . import l10n_de_tax_statement_contribution
+from . import l10n_de_tax_statement_provenance
+from . import l10n_de_tax_statement_job
 from . import account_move
 from . import account_move_line
 from . import account_tax
@@ -2,7 +2,8 @@
 # Copyright 2019 Onestein (<http://www.onestein.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import fields, models
+from odoo import api, fields, models
+from odoo.tools import sql
 
 
 class AccountMove(models.Model):
@@ -10,12 +11,23 @@ class AccountMove(models.Model):
 
     l10n_de_tax_statement_id = fields.Many2one(
         'l10n.de.tax.statement',
-        'Statement'
+        'Statement',
+        index=True,
     )
     l10n_de_tax_statement_include = fields.Boolean(
         'Include in VAT Statement'
     )
 
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(AccountMove, self)._auto_init()
+        # used to select the moves changed since the previous update of a
+        # statement
+        sql.create_index(
+            self.env.cr, 'account_move_l10n_de_tax_statement_write_date_index',
+            self._table, ['company_id', 'write_date'])
+        return res
+
     def add_move_in_statement(self):
         for move in self:
             move.l10n_de_tax_statement_include = True
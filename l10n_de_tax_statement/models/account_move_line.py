@@ -2,7 +2,28 @@
 # Copyright 2019 Onestein (<http://www.onestein.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import fields, models
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+# Indexes used by the domains selecting the move lines not yet declared in
+# a statement: the unreported moves, the partial domain of the unreported
+# taxes and the moves linked when posting a statement, and by the selection
+# of the move lines changed since the previous update of a statement.
+STATEMENT_INDEXES = [
+    ('account_move_line_l10n_de_tax_statement_undeclared_index',
+     '(company_id, date)',
+     'l10n_de_tax_statement_id IS NULL'),
+    ('account_move_line_l10n_de_tax_statement_included_index',
+     '(company_id, date)',
+     'l10n_de_tax_statement_id IS NULL AND l10n_de_tax_statement_include'),
+    ('account_move_line_l10n_de_tax_statement_write_date_index',
+     '(company_id, write_date)',
+     None),
+]
 
 
 class AccountMoveLine(models.Model):
@@ -12,6 +33,7 @@ class AccountMoveLine(models.Model):
         related='move_id.l10n_de_tax_statement_id',
         store=True,
         readonly=True,
+        index=True,
         string='Related Move Statement'
     )
     l10n_de_tax_statement_include = fields.Boolean(
@@ -19,3 +41,25 @@ class AccountMoveLine(models.Model):
         store=True,
         readonly=True
     )
+    l10n_de_tax_statement_provenance_ids = fields.One2many(
+        'l10n.de.tax.statement.provenance',
+        'move_line_id',
+        string='Statement Provenance',
+        readonly=True,
+        auto_join=True,
+    )
+
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(AccountMoveLine, self)._auto_init()
+        for index_name, columns, where in STATEMENT_INDEXES:
+            if not sql.index_exists(self.env.cr, index_name):
+                _logger.info('Creating index %s', index_name)
+                self.env.cr.execute(
+                    'CREATE INDEX {name} ON account_move_line {columns} '
+                    '{where}'.format(
+                        name=index_name,
+                        columns=columns,
+                        where='WHERE %s' % where if where else '',
+                    ))
+        return res
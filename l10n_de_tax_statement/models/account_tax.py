@@ -43,6 +43,84 @@ class AccountTax(models.Model):
             ]
         return res
 
+    def _get_tag_balances_domain(self):
+        """ Returns the domain of the move lines taken into account by
+        _get_tag_amounts_query(), without the tax specific criteria: these
+        are replaced by the joins on the tax relations."""
+        from_date, to_date, company_id, target_move = \
+            self.get_context_values()
+        state_list = self.get_target_state_list(target_move)
+        type_list = self.get_target_type_list('regular') + \
+            self.get_target_type_list('refund')
+        domain = self.get_move_line_partial_domain(
+            from_date,
+            to_date,
+            company_id
+        )
+        return expression.AND([domain, [
+            ('move_id.state', 'in', state_list),
+            ('move_id.move_type', 'in', type_list),
+            ('tax_exigible', '=', True),
+        ]])
+
+    def _get_tag_amounts_query(self, base_tag_ids, tax_tag_ids,
+                               move_line_ids=None):
+        """ Returns the query, and its parameters, selecting the move_line_id,
+        tag_id, amount_type ('base' or 'tax') and amount of every move line
+        related to the taxes in self through one of the given tags.
+        The amounts have the same sign as the balance fields of account.tax.
+        The move lines can be restricted to the ids in move_line_ids."""
+        AccountMoveLine = self.env['account.move.line']
+        domain = self._get_tag_balances_domain()
+        if move_line_ids is not None:
+            domain = expression.AND([
+                domain, [('id', 'in', list(move_line_ids))]])
+        query = AccountMoveLine._where_calc(domain)
+        AccountMoveLine._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        req = """
+            WITH aml AS (
+                SELECT
+                  account_move_line.id,
+                  account_move_line.tax_line_id,
+                  account_move_line.balance
+                FROM {from_clause}
+                WHERE {where_clause}
+            )
+            SELECT
+              aml.id AS move_line_id,
+              tag_rel.account_account_tag_id AS tag_id,
+              'base'::varchar AS amount_type,
+              -aml.balance AS amount
+            FROM aml
+            JOIN account_move_line_account_tax_rel tax_rel
+              ON tax_rel.account_move_line_id = aml.id
+            JOIN account_tax_account_tag tag_rel
+              ON tag_rel.account_tax_id = tax_rel.account_tax_id
+            WHERE
+              tax_rel.account_tax_id IN %s AND
+              tag_rel.account_account_tag_id IN %s
+            UNION ALL
+            SELECT
+              aml.id AS move_line_id,
+              tag_rel.account_account_tag_id AS tag_id,
+              'tax'::varchar AS amount_type,
+              -aml.balance AS amount
+            FROM aml
+            JOIN account_tax_account_tag tag_rel
+              ON tag_rel.account_tax_id = aml.tax_line_id
+            WHERE
+              aml.tax_line_id IN %s AND
+              tag_rel.account_account_tag_id IN %s
+        """.format(
+            from_clause=from_clause, where_clause=where_clause or 'TRUE')
+        tax_ids = tuple(self.ids) or (None, )
+        params = list(where_params) + [
+            tax_ids, tuple(base_tag_ids) or (None, ),
+            tax_ids, tuple(tax_tag_ids) or (None, ),
+        ]
+        return req, params
+
     def get_balance_domain(self, state_list, type_list):
         res = super().get_balance_domain(state_list, type_list)
         tax_ids = self.env.context.get('l10n_de_statement_tax_ids')
@@ -2,34 +2,46 @@
 # Copyright 2019 Onestein (<https://www.onestein.eu>)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from lxml import etree
 
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import UserError
+from odoo.osv import expression
 from odoo.tools import DEFAULT_SERVER_DATE_FORMAT as DF
-from odoo.tools.misc import formatLang
+from odoo.tools import float_round
+from odoo.tools.misc import formatLang, split_every
 
-from .l10n_de_tax_statement_2018 import \
-    _tax_statement_dict_2018, _finalize_lines_2018, \
-    _get_tags_map_2018, _totals_2018
-from .l10n_de_tax_statement_2019 import \
-    _tax_statement_dict_2019, _finalize_lines_2019, \
-    _get_tags_map_2019, _totals_2019
+from .l10n_de_tax_statement_layout import \
+    finalize_lines, get_layout, get_versions
+
+_logger = logging.getLogger(__name__)
+
+ELSTER_NAMESPACE = 'http://www.elster.de/elsterxml/schema/v11'
 
 
 class VatStatement(models.Model):
     _name = 'l10n.de.tax.statement'
+    _inherit = ['mail.thread']
     _description = 'German Vat Statement'
 
     name = fields.Char(
         string='Tax Statement',
         required=True,
     )
-    version = fields.Selection([
-        ('2018', '2018'),
-        ('2019', '2019'),
-    ], required=True, default='2018')
+    version = fields.Selection(
+        '_get_version_selection',
+        required=True,
+        default='2018',
+    )
     state = fields.Selection([
         ('draft', 'Draft'),
         ('posted', 'Posted'),
@@ -72,6 +84,30 @@ class VatStatement(models.Model):
     )
     date_posted = fields.Datetime(readonly=True)
     date_update = fields.Datetime(readonly=True)
+    update_high_water_mark = fields.Datetime(readonly=True, copy=False)
+    update_fingerprint = fields.Char(readonly=True, copy=False)
+    update_totals = fields.Text(readonly=True, copy=False)
+    last_run_profile = fields.Text(readonly=True, copy=False)
+    elster_snapshot = fields.Text(readonly=True, copy=False)
+    report_checksum = fields.Char(
+        compute='_compute_report_checksum',
+        string='PDF Checksum',
+        help='SHA1 checksum of the PDF report of the posted statement, '
+             'rendered at its first print and served from then on.'
+    )
+    job_ids = fields.One2many(
+        'l10n.de.tax.statement.job',
+        'statement_id',
+        string='Background Jobs',
+        readonly=True,
+    )
+    job_id = fields.Many2one(
+        'l10n.de.tax.statement.job',
+        compute='_compute_job_id',
+        string='Background Job',
+    )
+    job_state = fields.Selection(related='job_id.state', readonly=True)
+    job_progress = fields.Integer(related='job_id.progress', readonly=True)
 
     tax_total = fields.Monetary(
         compute='_compute_tax_total',
@@ -87,13 +123,49 @@ class VatStatement(models.Model):
         readonly=True,
     )
 
+    @api.depends('job_ids.state')
+    def _compute_job_id(self):
+        for statement in self:
+            statement.job_id = statement.job_ids.filtered(
+                lambda j: j.state in ['queued', 'running'])[:1]
+
     @api.multi
     def _compute_unreported_move_ids(self):
         for statement in self:
-            domain = statement._get_unreported_move_domain()
-            move_lines = self.env['account.move.line'].search(domain)
-            moves = move_lines.mapped('move_id').sorted('date')
-            statement.unreported_move_ids = moves
+            move_ids = statement._get_unreported_move_ids()
+            statement.unreported_move_ids = \
+                self.env['account.move'].browse(move_ids)
+
+    @api.multi
+    def _get_unreported_move_query(self):
+        """ Returns the query, and its parameters, selecting the move_id of
+        the move lines matching the unreported move domain."""
+        self.ensure_one()
+        AccountMoveLine = self.env['account.move.line']
+        query = AccountMoveLine._where_calc(
+            self._get_unreported_move_domain())
+        AccountMoveLine._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        req = """
+            SELECT account_move_line.move_id
+            FROM {from_clause}
+            WHERE {where_clause}
+        """.format(
+            from_clause=from_clause, where_clause=where_clause or 'TRUE')
+        return req, where_params
+
+    @api.multi
+    def _get_unreported_move_ids(self):
+        """ Returns the ids of the unreported moves, sorted by date."""
+        self.ensure_one()
+        query, params = self._get_unreported_move_query()
+        self.env.cr.execute("""
+            SELECT am.id
+            FROM account_move am
+            WHERE am.id IN ({query})
+            ORDER BY am.date, am.id
+        """.format(query=query), params)
+        return [row[0] for row in self.env.cr.fetchall()]
 
     @api.multi
     def _get_unreported_move_domain(self):
@@ -124,6 +196,16 @@ class VatStatement(models.Model):
             tax = formatLang(self.env, statement.tax_total, monetary=True)
             statement.format_tax_total = tax
 
+    @api.multi
+    def _compute_report_checksum(self):
+        attachments = self._get_report_attachments()
+        checksums = {
+            attachment.res_id: attachment.checksum
+            for attachment in attachments
+        }
+        for statement in self:
+            statement.report_checksum = checksums.get(statement.id)
+
     @api.model
     def default_get(self, fields_list):
         defaults = super(VatStatement, self).default_get(fields_list)
@@ -168,114 +250,442 @@ class VatStatement(models.Model):
     def _get_taxes_domain(self):
         return [('has_moves', '=', True)]
 
+    @api.model
+    def _get_version_selection(self):
+        return [(version, version) for version in get_versions()]
+
     @api.model
     def _prepare_lines(self):
         self.ensure_one()
-
-        if self.version == '2019':
-            lines = _tax_statement_dict_2019()
-        else:
-            lines = _tax_statement_dict_2018()
-
+        lines = {}
+        for code, name, columns in get_layout(self.version).lines:
+            line = {'code': code, 'name': _(name)}
+            line.update((column, 0.0) for column in columns)
+            lines[code] = line
         return lines
 
     def _finalize_lines(self, lines):
         self.ensure_one()
-        if self.version == '2019':
-            lines = _finalize_lines_2019(lines)
-        else:
-            lines = _finalize_lines_2018(lines)
-
+        with self._profile_phase('_finalize_lines') as phase:
+            phase['rows'] = len(lines)
+            finalize_lines(get_layout(self.version), lines)
         return lines
 
     def _get_tags_map(self):
         self.ensure_one()
+        return dict(self._get_tags_map_cached(
+            self.company_id.id, self.version))
+
+    @api.model
+    @tools.ormcache('company_id', 'version')
+    def _get_tags_map_cached(self, company_id, version):
         config = self.env['l10n.de.tax.statement.config'].search([
-            ('company_id', '=', self.company_id.id)], limit=1
+            ('company_id', '=', company_id)], limit=1
         )
         if not config:
             raise UserError(
                 _('Tags mapping not configured for this Company! '
                   'Check the DE Tags Configuration.'))
 
-        if self.version == '2019':
-            config_map = _get_tags_map_2019(config)
-        else:
-            config_map = _get_tags_map_2018(config)
+        return {
+            config[field].id: (code, column)
+            for field, code, column in get_layout(version).tags
+        }
+
+    @api.model
+    @tools.ormcache('company_id', 'version')
+    def _get_code_tags_map_cached(self, company_id, version):
+        """ Reverse index of the tags map: code -> column -> tag ids"""
+        code_tags_map = {}
+        tags_map = self._get_tags_map_cached(company_id, version)
+        for tag_id, (code, column) in tags_map.items():
+            if tag_id:
+                columns = code_tags_map.setdefault(code, {})
+                columns[column] = columns.get(column, ()) + (tag_id, )
+        return code_tags_map
 
-        return config_map
+    def _get_code_tag_ids(self, code, column=None):
+        """ Returns the ids of the tags mapped to the code of the statement,
+        for the given column or for both columns."""
+        self.ensure_one()
+        code_tags_map = self._get_code_tags_map_cached(
+            self.company_id.id, self.version)
+        columns = code_tags_map.get(code, {})
+        if column:
+            return list(columns.get(column, ()))
+        return [tag_id for tag_ids in columns.values() for tag_id in tag_ids]
 
     @api.multi
-    def statement_update(self):
+    def statement_update(self, force=False):
         self.ensure_one()
 
         if self.state in ['posted', 'final']:
             raise UserError(
                 _('You cannot modify a posted statement!'))
+        self._check_no_active_job()
+
+        with self._profile_operation('statement_update') as statement:
+            statement._update_lines(force=force)
+
+    def _update_lines(self, force=False):
+        self.ensure_one()
 
         # clean old lines
-        self.line_ids.unlink()
+        with self._profile_phase('unlink_lines') as phase:
+            phase['rows'] = len(self.line_ids)
+            self.line_ids.unlink()
 
         # calculate lines
         lines = self._prepare_lines()
-        taxes = self._compute_taxes()
-        self._set_statement_lines(lines, taxes)
-        taxes = self._compute_past_invoices_taxes()
-        self._set_statement_lines(lines, taxes)
+        totals, values = self._compute_statement_totals(force=force)
+        for code, amounts in totals.items():
+            for column, amount in amounts.items():
+                lines[code][column] += amount
         self._finalize_lines(lines)
 
         # create lines
-        self.write({
-            'line_ids': [(0, 0, line) for line in lines.values()],
-            'date_update': fields.Datetime.now(),
-        })
+        with self._profile_phase('create_lines') as phase:
+            phase['rows'] = len(lines)
+            self.env['l10n.de.tax.statement.line']._create_lines(
+                self, lines.values())
+        values['date_update'] = fields.Datetime.now()
+        self.write(values)
 
-    def _compute_past_invoices_taxes(self):
+    @api.multi
+    def statement_full_update(self):
+        self.ensure_one()
+        self.statement_update(force=True)
+
+    @api.multi
+    def statement_update_job(self):
+        self.ensure_one()
+        self.env['l10n.de.tax.statement.job']._enqueue(self, 'update')
+
+    @api.multi
+    def statement_full_update_job(self):
+        self.ensure_one()
+        self.env['l10n.de.tax.statement.job']._enqueue(self, 'full_update')
+
+    @api.multi
+    def post_job(self):
+        self.ensure_one()
+        self.env['l10n.de.tax.statement.job']._enqueue(self, 'post')
+
+    @api.multi
+    def cancel_job(self):
+        self.mapped('job_id').cancel()
+
+    @api.multi
+    def _check_no_active_job(self):
+        """ Prevents modifying the statements while a background job is
+        queued or running on them, except from the job itself."""
+        Job = self.env['l10n.de.tax.statement.job']
+        if self.env.context.get('l10n_de_tax_statement_job_id') or \
+                not Job._has_active_jobs():
+            return
+        active_jobs = Job.search_count([
+            ('statement_id', 'in', self.ids),
+            ('state', 'in', ['queued', 'running']),
+        ])
+        if active_jobs:
+            raise UserError(
+                _('A background job is queued or running on the statement! '
+                  'Wait for it to finish.'))
+
+    @api.model
+    def _batch_update(self, company_ids, from_date, to_date, version='2019',
+                      workers=0):
+        """ Updates the statements of the companies for the period, creating
+        them if needed. With workers, the companies are processed in as many
+        threads, each with its own cursor and committing its own transaction;
+        otherwise one by one in the current transaction. Returns a status
+        dict per company, see _batch_update_company()."""
+        args = (from_date, to_date, version)
+        if not workers:
+            return [
+                self._batch_update_savepoint(company_id, *args)
+                for company_id in company_ids
+            ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                lambda company_id: self._batch_update_cursor(
+                    company_id, *args),
+                company_ids))
+
+    @api.model
+    def _batch_update_savepoint(self, company_id, *args):
+        start = time.time()
+        try:
+            with self.env.cr.savepoint():
+                return self._batch_update_company(company_id, *args)
+        except Exception as e:
+            return self._batch_update_failure(company_id, e, start)
+
+    @api.model
+    def _batch_update_cursor(self, company_id, *args):
+        start = time.time()
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            statement_model = self.with_env(self.env(cr=cr))
+            try:
+                result = statement_model._batch_update_company(
+                    company_id, *args)
+                cr.commit()
+            except Exception as e:
+                cr.rollback()
+                result = self._batch_update_failure(company_id, e, start)
+        return result
+
+    @api.model
+    def _batch_update_failure(self, company_id, error, start):
+        _logger.exception(
+            'Batch update of the statement of company %s failed.',
+            company_id)
+        return {
+            'company_id': company_id,
+            'statement_id': False,
+            'statement_name': False,
+            'status': 'failed',
+            'tax_total': 0.0,
+            'seconds': time.time() - start,
+            'error': getattr(error, 'name', False) or '%s' % (error, ),
+        }
+
+    @api.model
+    def _batch_update_company(self, company_id, from_date, to_date, version):
+        """ Updates the draft statement of the company for the period,
+        after creating it if needed. Returns the status of the company:
+        created, updated, skipped if its statement is already posted, or
+        mismatch if its statement is of another version."""
+        start = time.time()
+        company = self.env['res.company'].browse(company_id)
+        statement = self.search([
+            ('company_id', '=', company_id),
+            ('from_date', '=', from_date),
+            ('to_date', '=', to_date),
+        ], limit=1)
+        if not statement:
+            statement = self.create(self._prepare_batch_statement(
+                company, from_date, to_date, version))
+            status = 'created'
+        elif statement.state != 'draft':
+            status = 'skipped'
+        elif statement.version != version:
+            status = 'mismatch'
+        else:
+            status = 'updated'
+        if status in ('created', 'updated'):
+            statement.statement_update()
+        _logger.info(
+            'Batch update of company %s: statement %s %s.',
+            company_id, statement.id, status)
+        return {
+            'company_id': company_id,
+            'statement_id': statement.id,
+            'statement_name': statement.name,
+            'status': status,
+            'tax_total': statement.tax_total,
+            'seconds': time.time() - start,
+            'error': False,
+        }
+
+    @api.model
+    def _prepare_batch_statement(self, company, from_date, to_date, version):
+        # the values set by the onchange methods of the form
+        d_from = fields.Date.from_string(from_date)
+        unreported_move_from_date = d_from + relativedelta(months=-3, day=1)
+        return {
+            'name': company.name + ': ' + ' '.join([from_date, to_date]),
+            'company_id': company.id,
+            'version': version,
+            'from_date': from_date,
+            'to_date': to_date,
+            'unreported_move_from_date': fields.Date.to_string(
+                unreported_move_from_date),
+        }
+
+    def _compute_statement_totals(self, force=False):
+        """ Returns the amounts of the move lines grouped by code and column,
+        as {code: {column: amount}}, together with the values to write on the
+        statement to keep track of this update. Unless force is set or the
+        parameters of the statement changed, only the move lines created,
+        modified or deleted since the previous update are processed."""
+        self.ensure_one()
+        Contribution = self.env['l10n.de.tax.statement.contribution']
+        tags_map = self._get_tags_map()
+        tax_sets = [
+            self._compute_taxes(),
+            self._compute_past_invoices_taxes(),
+        ]
+        fingerprint = self._get_update_fingerprint(tags_map, tax_sets)
+        high_water_mark = self._get_update_high_water_mark()
+
+        if force or not self.update_totals or \
+                fingerprint != self.update_fingerprint:
+            Contribution._delete_contributions(self)
+            totals = {}
+            move_line_ids = None
+        else:
+            totals = json.loads(self.update_totals)
+            with self._profile_phase('changed_move_lines') as phase:
+                move_line_ids = Contribution._get_changed_move_line_ids(
+                    self, self.update_high_water_mark)
+                phase['rows'] = len(move_line_ids)
+            removed = Contribution._delete_contributions(self, move_line_ids)
+            for (code, column), amount in removed.items():
+                amounts = totals.setdefault(code, {})
+                amounts[column] = amounts.get(column, 0.0) - amount
+
+        if move_line_ids is None or move_line_ids:
+            for taxes in tax_sets:
+                added = Contribution._insert_contributions(
+                    self, tags_map, taxes, move_line_ids=move_line_ids)
+                for (code, column), amount in added.items():
+                    amounts = totals.setdefault(code, {})
+                    amounts[column] = amounts.get(column, 0.0) + amount
+
+        return totals, {
+            'update_high_water_mark': high_water_mark,
+            'update_fingerprint': fingerprint,
+            'update_totals': json.dumps(totals),
+        }
+
+    def _get_code_amounts_query(self, tags_map, taxes, move_line_ids=None):
+        """ Returns the query, and its parameters, selecting the move_line_id,
+        code, amount_type ('base' or 'tax') and amount of the move lines
+        related to the taxes: the amount each move line contributes to each
+        line of the statement."""
+        self.ensure_one()
+        tag_ids, codes, amount_types = [], [], []
+        for tag_id, (code, amount_type) in tags_map.items():
+            if tag_id:
+                tag_ids.append(tag_id)
+                codes.append(code)
+                amount_types.append(amount_type)
+        base_tag_ids = [
+            tag_id for tag_id, amount_type in zip(tag_ids, amount_types)
+            if amount_type == 'base']
+        tax_tag_ids = [
+            tag_id for tag_id, amount_type in zip(tag_ids, amount_types)
+            if amount_type == 'tax']
+        query, params = taxes._get_tag_amounts_query(
+            base_tag_ids, tax_tag_ids, move_line_ids=move_line_ids)
+        req = """
+            SELECT
+              tag_amounts.move_line_id,
+              tags_map.code,
+              tags_map.amount_type,
+              SUM(tag_amounts.amount) AS amount
+            FROM ({query}) AS tag_amounts
+            JOIN unnest(%s::integer[], %s::varchar[], %s::varchar[])
+              AS tags_map(tag_id, code, amount_type)
+              ON tags_map.tag_id = tag_amounts.tag_id AND
+                 tags_map.amount_type = tag_amounts.amount_type
+            GROUP BY
+              tag_amounts.move_line_id,
+              tags_map.code,
+              tags_map.amount_type
+        """.format(query=query)
+        return req, params + [tag_ids, codes, amount_types]
+
+    def _get_update_fingerprint(self, tags_map, tax_sets):
+        """ Identifies the parameters a statement update depends on, other
+        than the move lines: when it changes, the statement is rebuilt."""
+        self.ensure_one()
+        taxes = self.env['account.tax'].browse(
+            [tax_id for tax_set in tax_sets for tax_id in tax_set.ids])
+        parameters = (
+            self.company_id.id,
+            self.version,
+            self.from_date,
+            self.to_date,
+            self.unreported_move_from_date,
+            self.target_move,
+            sorted(tags_map.items()),
+            [sorted(tax_set.ids) for tax_set in tax_sets],
+            max(taxes.mapped('write_date') or [False]),
+        )
+        return hashlib.sha1(repr(parameters).encode('utf-8')).hexdigest()
+
+    @api.model
+    def _get_update_high_water_mark(self):
+        # Odoo sets the write_date of the records to the start of the
+        # transaction writing them: the move lines written by transactions
+        # not yet committed when the statement is updated are dated at least
+        # from the start of the oldest open transaction which wrote, which
+        # makes sure the next update processes them. The transactions
+        # without transaction id, idle or only reading, are left out so that
+        # they do not hold the mark back; the move lines they would write
+        # later are caught by the full update.
+        self.env.cr.execute("""
+            SELECT to_char(
+              LEAST(now(), MIN(xact_start)) at time zone 'UTC',
+              'YYYY-MM-DD HH24:MI:SS')
+            FROM pg_stat_activity
+            WHERE
+              datname = current_database() AND
+              backend_xid IS NOT NULL
+        """)
+        return self.env.cr.fetchone()[0]
+
+    def _get_taxes_context(self):
         self.ensure_one()
-        ctx = {
+        return {
             'from_date': self.from_date,
             'to_date': self.to_date,
             'target_move': self.target_move,
             'company_id': self.company_id.id,
+        }
+
+    def _get_past_invoices_taxes_context(self):
+        self.ensure_one()
+        ctx = self._get_taxes_context()
+        ctx.update({
             'skip_invoice_basis_domain': True,
             'unreported_move': True,
             'unreported_move_from_date': self.unreported_move_from_date
-        }
-        taxes = self.env['account.tax'].with_context(ctx)
-        for move in self.unreported_move_ids:
-            for move_line in move.line_ids:
-                if move_line.tax_exigible:
-                    if move_line.tax_line_id:
-                        taxes |= move_line.tax_line_id
-                if move_line.tax_ids:
-                    taxes |= move_line.tax_ids
+        })
+        return ctx
+
+    def _compute_past_invoices_taxes(self):
+        self.ensure_one()
+        with self._profile_phase('_compute_past_invoices_taxes') as phase:
+            taxes = self._get_past_invoices_taxes()
+            phase['rows'] = len(taxes)
         return taxes
 
+    def _get_past_invoices_taxes(self):
+        self.ensure_one()
+        ctx = self._get_past_invoices_taxes_context()
+        query, params = self._get_unreported_move_query()
+        self.env.cr.execute("""
+            WITH unreported_move AS (
+                {query}
+            )
+            SELECT aml.tax_line_id
+            FROM account_move_line aml
+            WHERE
+              aml.move_id IN (SELECT move_id FROM unreported_move) AND
+              aml.tax_exigible AND
+              aml.tax_line_id IS NOT NULL
+            UNION
+            SELECT tax_rel.account_tax_id
+            FROM account_move_line aml
+            JOIN account_move_line_account_tax_rel tax_rel
+              ON tax_rel.account_move_line_id = aml.id
+            WHERE aml.move_id IN (SELECT move_id FROM unreported_move)
+        """.format(query=query), params)
+        tax_ids = [row[0] for row in self.env.cr.fetchall()]
+        return self.env['account.tax'].with_context(ctx).browse(tax_ids)
+
     def _compute_taxes(self):
         self.ensure_one()
-        ctx = {
-            'from_date': self.from_date,
-            'to_date': self.to_date,
-            'target_move': self.target_move,
-            'company_id': self.company_id.id,
-        }
+        ctx = self._get_taxes_context()
         domain = self._get_taxes_domain()
-        taxes = self.env['account.tax'].with_context(ctx).search(domain)
+        with self._profile_phase('_compute_taxes') as phase:
+            taxes = self.env['account.tax'].with_context(ctx).search(domain)
+            phase['rows'] = len(taxes)
         return taxes
 
-    def _set_statement_lines(self, lines, taxes):
-        self.ensure_one()
-        tags_map = self._get_tags_map()
-        for tax in taxes:
-            for tag in tax.tag_ids:
-                tag_map = tags_map.get(tag.id)
-                if tag_map:
-                    code, column = tag_map
-                    if column == 'base':
-                        lines[code][column] += tax.base_balance
-                    else:
-                        lines[code][column] += tax.balance
-
     @api.multi
     def finalize(self):
         self.ensure_one()
@@ -297,42 +707,207 @@ class VatStatement(models.Model):
                 _('You cannot post a statement if all the previous '
                   'statements are not yet posted! '
                   'Please Post all the other statements first.'))
+        self._check_no_active_job()
+
+        with self._profile_operation('post') as statement:
+            statement._post()
 
+    def _post(self):
+        self.ensure_one()
         self.write({
             'state': 'posted',
-            'date_posted': fields.Datetime.now()
+            'date_posted': fields.Datetime.now(),
+            'elster_snapshot': json.dumps(self._prepare_elster_snapshot()),
+            'update_high_water_mark': False,
+            'update_fingerprint': False,
+            'update_totals': False,
         })
-        self.unreported_move_ids.filtered(
-            lambda m: m.l10n_de_tax_statement_include
-        ).write({
-            'l10n_de_tax_statement_id': self.id,
-        })
-        domain = [
-            ('company_id', '=', self.company_id.id),
-            ('l10n_de_tax_statement_id', '=', False),
-            ('date', '<=', self.to_date),
-            ('date', '>=', self.from_date),
+        self.env['l10n.de.tax.statement.contribution']._delete_contributions(
+            self)
+        self.env['l10n.de.tax.statement.provenance']._record_provenance(
+            self, self._get_tags_map(), [
+                self._compute_taxes(),
+                self._compute_past_invoices_taxes(),
+            ])
+        move_ids = self._get_move_ids_to_post()
+        move_count, line_count = self._set_moves_statement(move_ids, self.id)
+        _logger.info(
+            'Statement %s posted: %s journal entries and %s journal items '
+            'linked.', self.id, move_count, line_count)
+
+    def _get_move_ids_to_post(self):
+        """ Returns the ids of the moves to link to the statement when posting
+        it: the included unreported moves and the not yet declared moves of
+        the period."""
+        self.ensure_one()
+        with self._profile_phase('_get_move_ids_to_post') as phase:
+            move_ids = self._get_moves_to_post()
+            phase['rows'] = len(move_ids)
+        return move_ids
+
+    def _get_moves_to_post(self):
+        self.ensure_one()
+        AccountMoveLine = self.env['account.move.line']
+        domains = [
+            expression.AND([
+                self._get_unreported_move_domain(),
+                [('l10n_de_tax_statement_include', '=', True)],
+            ]),
+            [
+                ('company_id', '=', self.company_id.id),
+                ('l10n_de_tax_statement_id', '=', False),
+                ('date', '<=', self.to_date),
+                ('date', '>=', self.from_date),
+            ],
         ]
-        move_line_ids = self.env['account.move.line'].search(domain)
-        updated_move_ids = move_line_ids.mapped('move_id')
-        updated_move_ids.write({
-            'l10n_de_tax_statement_id': self.id,
-        })
+        move_ids = set()
+        for domain in domains:
+            query = AccountMoveLine._where_calc(domain)
+            AccountMoveLine._apply_ir_rules(query, 'read')
+            from_clause, where_clause, where_params = query.get_sql()
+            self.env.cr.execute("""
+                SELECT DISTINCT account_move_line.move_id
+                FROM {from_clause}
+                WHERE {where_clause}
+            """.format(
+                from_clause=from_clause,
+                where_clause=where_clause or 'TRUE',
+            ), where_params)
+            move_ids.update(row[0] for row in self.env.cr.fetchall())
+        return sorted(move_ids)
+
+    @api.model
+    def _set_moves_statement(self, move_ids, statement_id, chunk_size=10000):
+        """ Links the moves, and their lines, to the statement (or unlinks
+        them if statement_id is False) with set-based updates, chunk by chunk,
+        instead of cascading the write through the stored related fields of
+        the move lines. Returns the number of moves and move lines updated.
+        """
+        with self._profile_phase('_set_moves_statement') as phase:
+            move_count, line_count = self._update_moves_statement(
+                move_ids, statement_id, chunk_size)
+            phase['rows'] = line_count
+        return move_count, line_count
+
+    @api.model
+    def _update_moves_statement(self, move_ids, statement_id, chunk_size):
+        # flush the pending recomputations before bypassing the ORM
+        self.recompute()
+        move_count = line_count = 0
+        for chunk in split_every(chunk_size, move_ids):
+            self.env.cr.execute("""
+                UPDATE account_move
+                SET
+                  l10n_de_tax_statement_id = %s,
+                  write_uid = %s,
+                  write_date = (now() at time zone 'UTC')
+                WHERE id IN %s
+            """, (statement_id or None, self.env.uid, chunk))
+            move_count += self.env.cr.rowcount
+            self.env.cr.execute("""
+                UPDATE account_move_line
+                SET
+                  l10n_de_tax_statement_id = %s,
+                  write_uid = %s,
+                  write_date = (now() at time zone 'UTC')
+                WHERE move_id IN %s
+            """, (statement_id or None, self.env.uid, chunk))
+            line_count += self.env.cr.rowcount
+        self.env['account.move'].invalidate_cache(
+            ['l10n_de_tax_statement_id', 'write_uid', 'write_date'],
+            list(move_ids))
+        self.env['account.move.line'].invalidate_cache(
+            ['l10n_de_tax_statement_id', 'write_uid', 'write_date'])
+        self.invalidate_cache(['move_line_ids'])
+        return move_count, line_count
 
     @api.multi
     def reset(self):
+        self._check_no_active_job()
         self.write({
             'state': 'draft',
-            'date_posted': None
+            'date_posted': None,
+            'elster_snapshot': False,
         })
-        req = """
-            UPDATE account_move_line
-            SET l10n_de_tax_statement_id = NULL
-            WHERE
-              l10n_de_tax_statement_id = %s
-        """
-        self.env.cr.execute(
-            req, (self.id, ))
+        # the report of the statement will change
+        self._get_report_attachments().sudo().unlink()
+        for statement in self:
+            with statement._profile_operation('reset') as profiled:
+                self.env.cr.execute("""
+                    SELECT id
+                    FROM account_move
+                    WHERE l10n_de_tax_statement_id = %s
+                    UNION
+                    SELECT move_id
+                    FROM account_move_line
+                    WHERE l10n_de_tax_statement_id = %s
+                """, (statement.id, statement.id))
+                move_ids = [row[0] for row in self.env.cr.fetchall()]
+                profiled._set_moves_statement(move_ids, False)
+
+    @contextmanager
+    def _profile_operation(self, operation):
+        """ Profiles the operation run on the yielded statement: its phases
+        are stored on the statement as the last run profile, and logged if
+        enabled in the configuration of the company."""
+        self.ensure_one()
+        profile = {'depth': 0, 'phases': []}
+        statement = self.with_context(l10n_de_tax_statement_profile=profile)
+        with statement._profile_phase(operation):
+            yield statement
+        report = self._format_profile(profile['phases'])
+        # bypass write(): the profile is also stored on posted statements
+        self.env.cr.execute("""
+            UPDATE l10n_de_tax_statement
+            SET last_run_profile = %s
+            WHERE id = %s
+        """, (report, self.id))
+        self.invalidate_cache(['last_run_profile'], self.ids)
+        config = self.env['l10n.de.tax.statement.config'].search([
+            ('company_id', '=', self.company_id.id)
+        ], limit=1)
+        if config.profile_statements:
+            _logger.info('Statement %s profile:\n%s', self.id, report)
+
+    @contextmanager
+    def _profile_phase(self, phase):
+        """ Measures the wall time and the SQL queries of a phase of the
+        profiled operation in progress, if any, and reports the phase to the
+        background job running the operation. The phase can store the number
+        of rows it processed in the 'rows' key of the yielded dict."""
+        progress = self.env.context.get('l10n_de_tax_statement_job_progress')
+        if progress:
+            progress(phase)
+        profile = self.env.context.get('l10n_de_tax_statement_profile')
+        if profile is None:
+            yield {}
+            return
+        stats = {'phase': phase, 'depth': profile['depth'], 'rows': None}
+        profile['phases'].append(stats)
+        profile['depth'] += 1
+        queries = self.env.cr.sql_log_count
+        start = time.time()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = time.time() - start
+            stats['queries'] = self.env.cr.sql_log_count - queries
+            profile['depth'] -= 1
+
+    @api.model
+    def _format_profile(self, phases):
+        lines = [
+            fields.Datetime.now(),
+            '%-44s %10s %8s %10s' % ('Phase', 'Seconds', 'Queries', 'Rows'),
+        ]
+        for stats in phases:
+            lines.append('%-44s %10.3f %8d %10s' % (
+                '  ' * stats['depth'] + stats['phase'],
+                stats['seconds'],
+                stats['queries'],
+                '' if stats['rows'] is None else stats['rows'],
+            ))
+        return '\n'.join(lines)
 
     @api.model
     def _modifiable_values_when_posted(self):
@@ -340,6 +915,10 @@ class VatStatement(models.Model):
 
     @api.multi
     def write(self, values):
+        if values and all(name.startswith('message_') for name in values):
+            # followers and messages, e.g. the notifications of the jobs
+            return super(VatStatement, self).write(values)
+        self._check_no_active_job()
         for statement in self:
             if statement.state == 'final':
                 raise UserError(
@@ -351,10 +930,14 @@ class VatStatement(models.Model):
                             raise UserError(
                                 _('You cannot modify a posted statement! '
                                   'Reset the statement to draft first.'))
-        return super(VatStatement, self).write(values)
+        res = super(VatStatement, self).write(values)
+        if 'version' in values:
+            self.mapped('line_ids')._set_layout_flags()
+        return res
 
     @api.multi
     def unlink(self):
+        self._check_no_active_job()
         for statement in self:
             if statement.state == 'posted':
                 raise UserError(
@@ -369,11 +952,202 @@ class VatStatement(models.Model):
     def _compute_tax_total(self):
         for statement in self:
             lines = statement.line_ids
+            list_totals = get_layout(statement.version).totals
+            total_lines = lines.filtered(lambda l: l.code in list_totals)
+            statement.tax_total = sum(line.tax for line in total_lines)
 
-            if statement.version == '2019':
-                list_totals = _totals_2019()
+    @api.multi
+    def export_elster(self):
+        self.ensure_one()
+        self._check_elster_export()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/l10n_de_tax_statement/elster/%s' % self.id,
+            'target': 'self',
+        }
+
+    @api.multi
+    def _check_elster_export(self):
+        for statement in self:
+            if statement.state == 'draft':
+                raise UserError(
+                    _('Post the statement before exporting it!'))
+            statement._get_elster_period()
+
+    def _get_elster_period(self):
+        """ Returns the year and the ELSTER code of the period of the
+        statement: the month (01 to 12) or the quarter (41 to 44)."""
+        self.ensure_one()
+        from_date = datetime.strptime(self.from_date, DF)
+        to_date = datetime.strptime(self.to_date, DF)
+        months = (to_date.year - from_date.year) * 12 + (
+            to_date.month - from_date.month) + 1
+        if from_date.day == 1 and \
+                to_date + relativedelta(days=1) == \
+                from_date + relativedelta(months=months):
+            if months == 1:
+                return from_date.year, '%02d' % from_date.month
+            if months == 3 and from_date.month % 3 == 1:
+                return from_date.year, '%s' % (
+                    41 + from_date.month // 3)
+        raise UserError(
+            _('The ELSTER export requires a statement of a month or a '
+              'quarter.'))
+
+    def _prepare_elster_snapshot(self):
+        """ Returns the amounts of the Kennzahlen of the statement, as
+        exported to ELSTER: the base amounts in whole euros, the tax amounts
+        in euros and cents. Taken when posting the statement, so that
+        exporting it does not depend on its lines anymore."""
+        self.ensure_one()
+        lines = {
+            line.code: {'base': line.base, 'tax': line.tax}
+            for line in self.line_ids
+        }
+        kennzahlen = []
+        for kennzahl, terms in get_layout(self.version).elster:
+            amount = sum(
+                coefficient * lines.get(code, {}).get(column, 0.0)
+                for coefficient, code, column in terms)
+            if all(column == 'base' for __, __, column in terms):
+                value = '%d' % (
+                    float_round(amount, precision_digits=0) or 0.0)
             else:
-                list_totals = _totals_2018()
+                value = '%.2f' % (
+                    float_round(amount, precision_digits=2) or 0.0)
+            if kennzahl == '83' or float(value):
+                kennzahlen.append((kennzahl, value))
+        kennzahlen.sort(key=lambda kennzahl: int(kennzahl[0]))
+        return {
+            'version': self.version,
+            'from_date': self.from_date,
+            'to_date': self.to_date,
+            'kennzahlen': kennzahlen,
+        }
 
-            total_lines = lines.filtered(lambda l: l.code in list_totals)
-            statement.tax_total = sum(line.tax for line in total_lines)
+    def _get_elster_snapshot(self):
+        self.ensure_one()
+        if self.elster_snapshot:
+            return json.loads(self.elster_snapshot)
+        # statements posted before the snapshots were taken
+        return self._prepare_elster_snapshot()
+
+    def _get_elster_filename(self):
+        self.ensure_one()
+        year, period = self._get_elster_period()
+        return 'UStVA_%s_%s_%s_%s.xml' % (
+            self.company_id.vat or self.company_id.id, year, period, self.id)
+
+    def _render_elster_xml(self):
+        """ Renders the Umsatzsteuer-Voranmeldung of the statement as an
+        ELSTER XML document, from the snapshot taken when posting it."""
+        self.ensure_one()
+        self._check_elster_export()
+        config = self.env['l10n.de.tax.statement.config'].search([
+            ('company_id', '=', self.company_id.id)], limit=1)
+        tax_number = (config.elster_tax_number or '').replace(' ', '')
+        if len(tax_number) != 13 or not tax_number.isdigit():
+            raise UserError(
+                _('The 13 digits ELSTER tax number of the company is not '
+                  'configured! Check the DE Tags Configuration.'))
+        vendor_id = config.elster_vendor_id or ''
+        company = self.company_id
+        snapshot = self._get_elster_snapshot()
+        year, period = self._get_elster_period()
+
+        def element(parent, tag, text=None, **attributes):
+            node = etree.SubElement(
+                parent, '{%s}%s' % (ELSTER_NAMESPACE, tag), **attributes)
+            if text is not None:
+                node.text = '%s' % text
+            return node
+
+        root = etree.Element(
+            '{%s}Elster' % ELSTER_NAMESPACE, nsmap={None: ELSTER_NAMESPACE})
+        header = element(root, 'TransferHeader', version='11')
+        element(header, 'Verfahren', 'ElsterAnmeldung')
+        element(header, 'DatenArt', 'UStVA')
+        element(header, 'Vorgang', 'send-Auth')
+        element(header, 'HerstellerID', vendor_id)
+        element(header, 'DatenLieferant', company.name)
+        data_block = element(
+            element(root, 'DatenTeil'), 'Nutzdatenblock')
+        data_header = element(data_block, 'NutzdatenHeader', version='11')
+        element(data_header, 'NutzdatenTicket', self.id)
+        element(data_header, 'Empfaenger', tax_number[:4], id='F')
+        manufacturer = element(data_header, 'Hersteller')
+        element(manufacturer, 'ProduktName', 'Odoo l10n_de_tax_statement')
+        element(manufacturer, 'ProduktVersion', '11.0')
+        declaration = element(
+            element(data_block, 'Nutzdaten'), 'Anmeldungssteuern',
+            art='UStVA', version='%s01' % year)
+        supplier = element(declaration, 'DatenLieferant')
+        element(supplier, 'Name', company.name)
+        element(supplier, 'Strasse', company.street or '')
+        element(supplier, 'PLZ', company.zip or '')
+        element(supplier, 'Ort', company.city or '')
+        element(
+            declaration, 'Erstellungsdatum',
+            (self.date_posted or fields.Datetime.now())[:10].replace('-', ''))
+        statement = element(
+            element(declaration, 'Steuerfall'), 'Umsatzsteuervoranmeldung')
+        element(statement, 'Jahr', year)
+        element(statement, 'Zeitraum', period)
+        element(statement, 'Steuernummer', tax_number)
+        element(statement, 'Kz09', '%s*%s' % (vendor_id, company.name))
+        for kennzahl, value in snapshot['kennzahlen']:
+            element(statement, 'Kz%s' % kennzahl, value)
+        return etree.tostring(
+            root, xml_declaration=True, encoding='UTF-8', pretty_print=True)
+
+    @api.multi
+    def _export_elster(self, directory):
+        """ Writes the ELSTER XML files of the statements in the directory,
+        and returns their paths."""
+        paths = []
+        for statement in self:
+            path = os.path.join(directory, statement._get_elster_filename())
+            with open(path, 'wb') as output:
+                output.write(statement._render_elster_xml())
+            paths.append(path)
+        return paths
+
+    @api.model
+    def _export_elster_files(self, directory, company_ids=None):
+        """ Writes the ELSTER XML files of the posted and final statements,
+        optionally of the given companies, in the directory. Meant to be
+        called from a scheduled action or a shell, e.g. to export the
+        statements of many companies in one run: the statements which cannot
+        be exported, e.g. yearly ones, are logged and skipped."""
+        domain = [('state', 'in', ['posted', 'final'])]
+        if company_ids:
+            domain.append(('company_id', 'in', company_ids))
+        paths = []
+        for statement in self.search(domain):
+            try:
+                paths += statement._export_elster(directory)
+            except UserError as e:
+                _logger.warning(
+                    'Statement %s not exported to ELSTER: %s',
+                    statement.display_name, e.name)
+        return paths
+
+    @api.multi
+    def _get_report_attachment_name(self):
+        """ Name of the attachment the PDF report of the statement is stored
+        in once posted, see the attachment of action_report_tax_statement."""
+        self.ensure_one()
+        return 'UstVA %s (%s).pdf' % (self.name.replace('/', '_'), self.id)
+
+    @api.multi
+    def _get_report_attachments(self):
+        if not self.ids:
+            return self.env['ir.attachment']
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('datas_fname', 'in', [
+                statement._get_report_attachment_name()
+                for statement in self
+            ]),
+        ])
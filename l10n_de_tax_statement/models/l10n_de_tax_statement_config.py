@@ -2,7 +2,7 @@
 # Copyright 2019 Onestein (<https://www.onestein.eu>)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
-from odoo import fields, models
+from odoo import api, fields, models
 
 
 class VatStatementConfig(models.Model):
@@ -62,3 +62,37 @@ class VatStatementConfig(models.Model):
     tag_95_base = fields.Many2one('account.account.tag')
     tag_96_tax = fields.Many2one('account.account.tag')
     tag_98_tax = fields.Many2one('account.account.tag')
+
+    elster_tax_number = fields.Char(
+        'ELSTER Tax Number',
+        help='Tax number (Steuernummer) of the company in the 13 digits '
+             'format of ELSTER, the first 4 digits identifying the tax '
+             'office.'
+    )
+    elster_vendor_id = fields.Char(
+        'ELSTER Vendor ID',
+        help='Vendor ID (HerstellerID) under which the XML files of the '
+             'statements are transmitted to ELSTER.'
+    )
+
+    profile_statements = fields.Boolean(
+        'Log Statement Profiles',
+        help='Log the wall time, SQL queries and rows of each phase of the '
+             'updates, postings and resets of the statements of the company.'
+    )
+
+    @api.model
+    def create(self, vals):
+        # clear the cached tags maps of the statements
+        self.clear_caches()
+        return super(VatStatementConfig, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        self.clear_caches()
+        return super(VatStatementConfig, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.clear_caches()
+        return super(VatStatementConfig, self).unlink()
@@ -0,0 +1,145 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+
+class VatStatementContribution(models.Model):
+    """ Journal of the amounts each move line contributes to the lines of a
+    draft statement. It allows the statement update to only process the move
+    lines created, modified or deleted since the previous update."""
+    _name = 'l10n.de.tax.statement.contribution'
+    _description = 'German Vat Statement Move Line Contribution'
+    _log_access = False
+
+    statement_id = fields.Many2one(
+        'l10n.de.tax.statement',
+        'Statement',
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    move_line_id = fields.Many2one(
+        'account.move.line',
+        'Journal Item',
+        index=True,
+        ondelete='set null',
+    )
+    code = fields.Char(required=True)
+    amount_type = fields.Selection([
+        ('base', 'Base'),
+        ('tax', 'Tax')],
+        required=True,
+    )
+    amount = fields.Float()
+
+    @api.model
+    def _insert_contributions(self, statement, tags_map, taxes,
+                              move_line_ids=None):
+        """ Stores the contributions of the move lines related to the taxes,
+        optionally restricted to move_line_ids. Returns the inserted amounts
+        as a dict mapping (code, amount_type) to the amount."""
+        if not taxes or not any(tags_map):
+            return {}
+        query, params = statement._get_code_amounts_query(
+            tags_map, taxes, move_line_ids=move_line_ids)
+        req = """
+            WITH inserted AS (
+                INSERT INTO l10n_de_tax_statement_contribution
+                  (statement_id, move_line_id, code, amount_type, amount)
+                SELECT %s, move_line_id, code, amount_type, amount
+                FROM ({query}) AS code_amounts
+                RETURNING code, amount_type, amount
+            )
+            SELECT code, amount_type, SUM(amount), COUNT(*)
+            FROM inserted
+            GROUP BY code, amount_type
+        """.format(query=query)
+        with statement._profile_phase('_insert_contributions') as phase:
+            self.env.cr.execute(req, [statement.id] + params)
+            rows = self.env.cr.fetchall()
+            phase['rows'] = sum(row[3] for row in rows)
+        return {
+            (code, amount_type): amount or 0.0
+            for code, amount_type, amount, count in rows
+        }
+
+    @api.model
+    def _delete_contributions(self, statement, move_line_ids=None):
+        """ Removes the contributions of the statement: all of them, or only
+        those of move_line_ids and of the deleted move lines. Returns the
+        removed amounts as a dict mapping (code, amount_type) to the amount.
+        """
+        with statement._profile_phase('_delete_contributions') as phase:
+            if move_line_ids is None:
+                self.env.cr.execute("""
+                    DELETE FROM l10n_de_tax_statement_contribution
+                    WHERE statement_id = %s
+                """, (statement.id, ))
+                phase['rows'] = self.env.cr.rowcount
+                return {}
+            self.env.cr.execute("""
+                WITH deleted AS (
+                    DELETE FROM l10n_de_tax_statement_contribution
+                    WHERE
+                      statement_id = %s AND
+                      (move_line_id IS NULL OR move_line_id IN %s)
+                    RETURNING code, amount_type, amount
+                )
+                SELECT code, amount_type, SUM(amount), COUNT(*)
+                FROM deleted
+                GROUP BY code, amount_type
+            """, (statement.id, tuple(move_line_ids) or (None, )))
+            rows = self.env.cr.fetchall()
+            phase['rows'] = sum(row[3] for row in rows)
+        return {
+            (code, amount_type): amount or 0.0
+            for code, amount_type, amount, count in rows
+        }
+
+    @api.model
+    def _get_changed_move_line_ids(self, statement, since):
+        """ Returns the ids of the move lines of the company of the statement
+        written, or belonging to a move written, since the given date: those
+        dated in the range of the statement and of its unreported moves, and
+        those contributing to it, whose date may have left this range."""
+        date_clause = 'AND {alias}.date >= %(date_from)s' \
+            if statement.unreported_move_from_date else ''
+        params = {
+            'statement_id': statement.id,
+            'company_id': statement.company_id.id,
+            'since': since,
+            'date_from': min(
+                statement.from_date,
+                statement.unreported_move_from_date or statement.from_date),
+            'date_to': statement.to_date,
+        }
+        self.env.cr.execute("""
+            SELECT aml.id
+            FROM account_move_line aml
+            WHERE
+              aml.company_id = %(company_id)s AND
+              aml.write_date >= %(since)s AND
+              aml.date <= %(date_to)s {aml_date_clause}
+            UNION
+            SELECT aml.id
+            FROM account_move am
+            JOIN account_move_line aml ON aml.move_id = am.id
+            WHERE
+              am.company_id = %(company_id)s AND
+              am.write_date >= %(since)s AND
+              am.date <= %(date_to)s {am_date_clause}
+            UNION
+            SELECT aml.id
+            FROM l10n_de_tax_statement_contribution contribution
+            JOIN account_move_line aml ON aml.id = contribution.move_line_id
+            JOIN account_move am ON am.id = aml.move_id
+            WHERE
+              contribution.statement_id = %(statement_id)s AND
+              (aml.write_date >= %(since)s OR am.write_date >= %(since)s)
+        """.format(
+            aml_date_clause=date_clause.format(alias='aml'),
+            am_date_clause=date_clause.format(alias='am'),
+        ), params)
+        return [row[0] for row in self.env.cr.fetchall()]
@@ -0,0 +1,230 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# key of the advisory locks held by the transactions running the jobs
+ADVISORY_LOCK_KEY = 476351
+
+# attempts after which an interrupted job is not retried anymore
+MAX_ATTEMPTS = 3
+
+# progress of the operations, in percent, when entering their phases
+PHASE_PROGRESS = {
+    '_compute_taxes': 10,
+    '_compute_past_invoices_taxes': 20,
+    '_delete_contributions': 30,
+    '_insert_contributions': 40,
+    '_finalize_lines': 80,
+    'create_lines': 90,
+    '_record_provenance': 40,
+    '_get_move_ids_to_post': 60,
+    '_set_moves_statement': 70,
+}
+
+
+class VatStatementJob(models.Model):
+    """ Statement update or posting run in the background by a cron, out of
+    the requests of the users. While a job is queued or running, its
+    statement cannot be modified.
+
+    The cron workers are subject to the real time limit of the server
+    (limit_time_real, or limit_time_real_cron if set), which has to allow
+    the duration of the jobs: a job killed by it is retried, up to
+    MAX_ATTEMPTS times, then fails."""
+    _name = 'l10n.de.tax.statement.job'
+    _description = 'German Vat Statement Background Job'
+    _order = 'id desc'
+
+    statement_id = fields.Many2one(
+        'l10n.de.tax.statement',
+        'Statement',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+    operation = fields.Selection([
+        ('update', 'Update'),
+        ('full_update', 'Full Update'),
+        ('post', 'Post')],
+        required=True,
+        readonly=True,
+    )
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled')],
+        required=True,
+        readonly=True,
+        index=True,
+        default='queued',
+    )
+    progress = fields.Integer(readonly=True)
+    phase = fields.Char(readonly=True)
+    user_id = fields.Many2one(
+        'res.users',
+        'Requested by',
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.user,
+    )
+    attempts = fields.Integer(readonly=True)
+    date_started = fields.Datetime(readonly=True)
+    date_done = fields.Datetime(readonly=True)
+    error = fields.Text(readonly=True)
+
+    @api.model
+    def _has_active_jobs(self):
+        """ Whether any job is queued or running, checked first on the index
+        of the state so that modifying the statements is cheap when there is
+        none."""
+        self.env.cr.execute("""
+            SELECT 1 FROM l10n_de_tax_statement_job
+            WHERE state IN ('queued', 'running')
+            LIMIT 1
+        """)
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _enqueue(self, statement, operation):
+        statement.ensure_one()
+        if statement.state != 'draft':
+            raise UserError(
+                _('You cannot modify a posted statement!'))
+        statement._check_no_active_job()
+        return self.create({
+            'statement_id': statement.id,
+            'operation': operation,
+        })
+
+    @api.multi
+    def cancel(self):
+        for job in self:
+            if job.state != 'queued':
+                raise UserError(
+                    _('Only the queued jobs can be cancelled.'))
+        self.write({'state': 'cancelled'})
+
+    @api.model
+    def _run_queued_jobs(self):
+        """ Runs the queued jobs, and retries the running jobs interrupted
+        e.g. by the death of their worker. Called by the cron, the status
+        of the jobs is committed as they run."""
+        jobs = self.search([('state', 'in', ['queued', 'running'])])
+        for job in jobs.sorted('id'):
+            job._run()
+
+    @api.multi
+    def _run(self):
+        self.ensure_one()
+        with api.Environment.manage(), self.pool.cursor() as job_cr:
+            # the transaction running a job holds its lock: a running job
+            # whose lock is free was interrupted
+            job_cr.execute(
+                'SELECT pg_try_advisory_xact_lock(%s, %s)',
+                (ADVISORY_LOCK_KEY, self.id))
+            if not job_cr.fetchone()[0]:
+                return
+            job_cr.execute(
+                'SELECT state, attempts FROM l10n_de_tax_statement_job '
+                'WHERE id = %s', (self.id, ))
+            state, attempts = job_cr.fetchone()
+            if state not in ('queued', 'running'):
+                return
+            if attempts >= MAX_ATTEMPTS:
+                self._set_status({
+                    'state': 'failed',
+                    'error': _('The job was interrupted %s times.') % (
+                        attempts, ),
+                })
+                self._notify()
+                return
+            self._set_status({
+                'state': 'running',
+                'attempts': attempts + 1,
+                'date_started': fields.Datetime.now(),
+                'progress': 0,
+                'phase': False,
+                'error': False,
+            })
+            job = self.with_env(self.env(cr=job_cr, user=self.user_id.id))
+            try:
+                job._execute(progress=self._report_progress)
+                job_cr.commit()
+            except Exception as e:
+                job_cr.rollback()
+                _logger.exception(
+                    'Background job %s of statement %s failed.',
+                    self.id, self.statement_id.id)
+                self._set_status({
+                    'state': 'failed',
+                    'error': getattr(e, 'name', False) or '%s' % (e, ),
+                })
+                self._notify()
+                return
+        self._set_status({
+            'state': 'done',
+            'progress': 100,
+            'date_done': fields.Datetime.now(),
+        })
+        self._notify()
+
+    @api.multi
+    def _execute(self, progress=None):
+        """ Runs the operation of the job on its statement. Running it again
+        after an interrupted attempt is safe: an update computes the
+        statement again and a posted statement is not posted again."""
+        self.ensure_one()
+        statement = self.statement_id.with_context(
+            l10n_de_tax_statement_job_id=self.id,
+            l10n_de_tax_statement_job_progress=progress,
+        )
+        if statement.state != 'draft':
+            return
+        if self.operation == 'post':
+            statement.post()
+        else:
+            statement.statement_update(
+                force=self.operation == 'full_update')
+
+    @api.multi
+    def _report_progress(self, phase):
+        self.ensure_one()
+        progress = PHASE_PROGRESS.get(phase)
+        if progress and progress > self.progress:
+            self._set_status({'progress': progress, 'phase': phase})
+
+    @api.multi
+    def _set_status(self, values):
+        # committed right away, to be seen while the job runs
+        self.write(values)
+        self.env.cr.commit()
+
+    @api.multi
+    def _notify(self):
+        self.ensure_one()
+        operation = dict(
+            self._fields['operation'].selection)[self.operation]
+        if self.state == 'done':
+            body = _('%s of the statement %s done.') % (
+                operation, self.statement_id.display_name)
+        else:
+            body = _('%s of the statement %s failed: %s') % (
+                operation, self.statement_id.display_name, self.error)
+        self.statement_id.sudo().with_context(
+            mail_create_nosubscribe=True,
+        ).message_post(
+            body=body,
+            partner_ids=[self.user_id.partner_id.id],
+            subtype='mail.mt_comment',
+        )
+        self.env.cr.commit()
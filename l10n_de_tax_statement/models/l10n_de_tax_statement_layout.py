@@ -0,0 +1,684 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""Layouts of the versions of the German VAT statement form.
+
+Each version declares:
+
+- lines: the lines of the form, as (code, name, amount columns, displayed
+  columns, flags), the flags being group, total and editable;
+- tags: the fields of the configuration mapping the tax tags to the amounts
+  of the lines, as (field, code, column);
+- formulas: the amounts computed when finalizing the lines, as (code,
+  column, coefficient, terms): the amount of the line is multiplied by the
+  coefficient, then the (coefficient, code, column) terms, taken from the
+  finalized lines, are added to it;
+- totals: the codes of the lines summed in the tax total of the statement;
+- elster: the Kennzahlen of the ELSTER export, as (Kennzahl, terms), the
+  (coefficient, code, column) terms being summed; the Kennzahlen of base
+  amounts are declared in whole euros.
+
+Adding a version of the form only requires declaring its layout here.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+
+def _(source):
+    # marks the names for the export of the translations: they are
+    # translated when preparing the lines of a statement
+    return source
+
+
+LAYOUTS = {
+    '2018': {
+        'lines': [
+            ('17', _('Anmeldung der Umsatzsteuer Vorauszahlung'),
+             '', '', 'group'),
+            ('18', _('Lief. u. sonst. Leistg. einschl. unentg. Wertabg.'),
+             '', '', 'group'),
+            ('19', _('Steuerfr. Umsätze mit Vorsteuerabz. innerg. '
+                     'Lieferungen (§4 Nr. 1b) ...'),
+             '', '', 'group'),
+            ('20', _('... an Abnehmer mit USt-ID (41)'),
+             'base', 'base', 'editable'),
+            ('21', _('... neue Fahrzeuge an Abnehmer ohne UST-ID (44)'),
+             'base', 'base', 'editable'),
+            ('22', _('... neuer Fahrzeuge außerh. eines Unternehmens § 2a '
+                     'UStG (49)'),
+             'base', 'base', 'editable'),
+            ('23', _('Weitere steuerfr. Umsätze mit Vorsteuerabzug, z.B. '
+                     'Ausfuhrlief., Umsätze n. § 4 Nr. 2-7 UStG (43)'),
+             'base', 'base', 'editable'),
+            ('24', _('Steuerfreie Umsätze ohne Vorsteuerabzug Umsätze n. § '
+                     '4 Nr. 8 bis 28 UStG (48)'),
+             'base', 'base', 'editable'),
+            ('25', _('Steuerpflichtige Umsätze (Lief. u. sonst. Leistg. '
+                     'einschl. unentg. Wertabg.)'),
+             '', '', 'group'),
+            ('26', _('... zum Steuersatz von 19 % (81)'),
+             'base tax', 'base tax', 'editable'),
+            ('27', _('... zum Steuersatz von 7% (86)'),
+             'base tax', 'base tax', 'editable'),
+            ('28', _('... zu anderen Steuersätzen (35 / 36)'),
+             'base tax', 'base tax', 'editable'),
+            ('29', _('Lieferungen land- u. forstw. Betriebe nach § 24 UStG '
+                     'an Abnehmer mit Ust-ID (77)'),
+             'base', 'base', 'editable'),
+            ('30', _('Umsätze nach § 24 UStG, z.B. Sägewerke, Getränke u. '
+                     'alk. Flüssigk. (76 / 80)'),
+             'base tax', 'base tax', 'editable'),
+            ('31', _('Innergemeinschaftliche Erwerbe Steuerfreie '
+                     'innergemeinschaftliche Erwerbe'),
+             '', '', 'group'),
+            ('32', _('Erwerbe nach §§ 4b u. 25c UStG (91)'),
+             'base', 'base', 'editable'),
+            ('33', _('Steuerpflichtige innergemeinschaftliche Erwerbe ... '
+                     'zum Steuersatz v. 19 % (89)'),
+             'base tax', 'base tax', 'editable'),
+            ('34', _('... zum Steuersatz v. 7% (93)'),
+             'base tax', 'base tax', 'editable'),
+            ('35', _('... zu anderen Steuersätzen (95 / 98)'),
+             'base tax', 'base tax', 'editable'),
+            ('36', _('... neuer Fahrzeuge gem. § 1b Abs. 2 u. 3 UStG von '
+                     'Lieferern o. Ust-ID z. allg. Steuersatz (94 / 96)'),
+             'base tax', 'base tax', 'editable'),
+            ('37', _('Ergänzende Angaben zu Umsätzen'),
+             'base tax', '', 'group'),
+            ('38', _('Lieferungen des ersten Abnehmers bei innergem. '
+                     'Dreiecksgeschäften gem. § 25b Abs. 2 UStG (42)'),
+             'base', 'base', 'editable'),
+            ('39', _('Steuerpfl. Ums. f.d.d. Leistungsempf. die Steuer '
+                     'schuldet g. § 13b A. 5 S. 1 i.V.m. Abs. 2 Nr. 10 UStG '
+                     '(68)'),
+             'base', 'base', 'editable'),
+            ('40', _('Übrige steuerpfl. Umsätze f.d.d. Lstg.empf. d. Steuer '
+                     'n. § 13b Abs. 5 UStG schuldet (60)'),
+             'base', 'base', 'editable'),
+            ('41', _('Nicht steuerb. sonst. Leist. gem. § 18b S. 1 Nr. 2 '
+                     '(21)'),
+             'base', 'base', 'editable'),
+            ('42', _('Übrige n. steuerb. Umsätze, Leistungsort ist nicht im '
+                     'Inland (45)'),
+             'base', 'base', 'editable'),
+            ('47', _('Leistungsempfänger als Steuerschuldner (§ 13b UStG)'),
+             '', '', 'group'),
+            ('48', _('Steuerpfl. sonst. Leist. e. i. übr. Gemeinschaftsgeb. '
+                     'ans. Untern. gem. § 13b Abs. 1 UStG (46 / 47)'),
+             'base tax', 'base tax', 'editable'),
+            ('49', _('Andere Leistung eines im Ausland ansässigen Untern. '
+                     'gem. § 13b Abs. 2 Nr. 1 u. 5 Buchst. a UStG (52 / 53)'),
+             'base tax', 'base tax', 'editable'),
+            ('50', _('Lieferungen sicherungsübereign. Gegenst. u. Umsätze '
+                     'd. u. d.  GrEStG fallen g. § 13b Abs. 2 Nr. 2 u. 3 '
+                     '(73 / 74)'),
+             'base tax', 'base tax', 'editable'),
+            ('51', _('Lieferungen v. Mobilfunkger., Tablet-Comp., '
+                     'Spielekons. u. int. Schaltkr. g. §13b A. 2 Nr. 10 '
+                     'UStG (78 / 79)'),
+             'base tax', 'base tax', 'editable'),
+            ('52', _('Andere Leistungen gem. § 13b Abs. 2 Nr. 4, 5 Bst. b, '
+                     'Nr. 6 b. 9 u. 11 UStG (84 / 85)'),
+             'base tax', 'base tax', 'editable'),
+            ('53', _('Umsatzsteuer'),
+             'tax', 'tax', 'total'),
+            ('54', _('Abziehbare Vorsteuerbeträge'),
+             '', '', 'group'),
+            ('55', _('Vorsteuerbeträge aus Rechn. v.a. Unternehmen g. § 15 '
+                     'Abs. S. 1 Nr. 1 UStG a. Leistungen i.S.d. § 13a Abs. '
+                     '1 Nr. 6 UStG u. § 15 Abs. 1 S. 1 Nr. 5 UStG u. a. '
+                     'innerg. Dreiecksgesch. g. § 25b A. 5 UStG (66)'),
+             'tax', 'tax', ''),
+            ('56', _('Vorsteuerbeträge a. d. innerg. Erwerb v. Gegenständen '
+                     'gem. § 15 Abs. 1 Satz 1 Nr. 3 UStG (61)'),
+             'tax', 'tax', ''),
+            ('57', _('Entst. Einfuhrumsatzst. g. § 15 Abs. 1 S. 1 Nr. 2 '
+                     'UStG (62)'),
+             'tax', 'tax', ''),
+            ('58', _('Vorsteuerbeträge aus Leistungen i. S. des § 13b '
+                     'UStGi.V.m § 15 Abs. 1 Satz 1 Nr. 4 UStG (67)'),
+             'tax', 'tax', ''),
+            ('59', _('Vorsteuerbeträge d. n. allg. Durchschnittssätzen '
+                     'berechnet sind gem. §§ 23 und 23a UStG (63)'),
+             'tax', 'tax', ''),
+            ('60', _('Berichtigung des Vorsteuerabzugs g. § 15 a UStG (64)'),
+             'tax', 'tax', ''),
+            ('61', _('Vorsteuerabzug f. innergem. Lief. neuer Fahrzeuge '
+                     'außerh. e. Untern. g. §2a UStG sow. v. Kleinunt. i.S. '
+                     'd. § 19 Abs. 1 i.V.m. § 15a Abs. 4a UStG (59)'),
+             'tax', 'tax', ''),
+            ('62', _('Verbleibender Betrag'),
+             'tax', 'tax', 'total'),
+            ('63', _('Andere Steuerbeträge'),
+             '', '', 'group'),
+            ('64', _('Steuer inf. Wechsels d. Besteuerungsf. sow. Nachst. '
+                     'a. verst. Anzahlungen u.a. wg. Steuersatzänd. (65)'),
+             'tax', 'tax', 'editable'),
+            ('65', _('In Rechnungen unrichtig oder unberechtigt '
+                     'ausgewiesene Steuerbeträge gem. § 14c UstG) sowie '
+                     'Steuerbetr. d. n. § 6a Abs. 4 S. 2, § 17 Abs. 1 S. 6, '
+                     '§ 25 b Abs. 2 UStG o. v. e. Auslagerer o. Lagerh. n. '
+                     '§ 13a Abs. 1 Nr. 6 UStG geschuldet werden (69)'),
+             'tax', 'tax', 'editable'),
+            ('66', _('Umsatzsteuer-Vorauszahlung'),
+             'tax', 'tax', ''),
+            ('67', _('Abzug der festges. Sondervorauszahl. f. '
+                     'Dauerfristverlängerung, nur auszuf. i. d. letzten '
+                     'Voranmeldung d. Besteuerungszeitr., i.d.R. Dez. (39)'),
+             'tax', 'tax', 'editable'),
+        ],
+        'tags': [
+            ('tag_41_base', '20', 'base'),
+            ('tag_44_base', '21', 'base'),
+            ('tag_49_base', '22', 'base'),
+            ('tag_43_base', '23', 'base'),
+            ('tag_48_base', '24', 'base'),
+            ('tag_81_base', '26', 'base'),
+            ('tag_81_tax', '26', 'tax'),
+            ('tag_86_base', '27', 'base'),
+            ('tag_86_tax', '27', 'tax'),
+            ('tag_35_base', '28', 'base'),
+            ('tag_36_tax', '28', 'tax'),
+            ('tag_77_base', '29', 'base'),
+            ('tag_76_base', '30', 'base'),
+            ('tag_80_tax', '30', 'tax'),
+            ('tag_91_base', '32', 'base'),
+            ('tag_89_base', '33', 'base'),
+            ('tag_93_base', '34', 'base'),
+            ('tag_95_base', '35', 'base'),
+            ('tag_98_tax', '35', 'tax'),
+            ('tag_94_base', '36', 'base'),
+            ('tag_96_tax', '36', 'tax'),
+            ('tag_42_base', '38', 'base'),
+            ('tag_68_base', '39', 'base'),
+            ('tag_60_base', '40', 'base'),
+            ('tag_21_base', '41', 'base'),
+            ('tag_45_base', '42', 'base'),
+            ('tag_46_base', '48', 'base'),
+            ('tag_47_tax', '48', 'tax'),
+            ('tag_52_base', '49', 'base'),
+            ('tag_53_tax', '49', 'tax'),
+            ('tag_73_base', '50', 'base'),
+            ('tag_74_tax', '50', 'tax'),
+            ('tag_78_base', '51', 'base'),
+            ('tag_79_tax', '51', 'tax'),
+            ('tag_84_base', '52', 'base'),
+            ('tag_85_tax', '52', 'tax'),
+            ('tag_66_tax', '55', 'tax'),
+            ('tag_61_tax', '56', 'tax'),
+            ('tag_62_tax', '57', 'tax'),
+            ('tag_67_tax', '58', 'tax'),
+            ('tag_63_tax', '59', 'tax'),
+            ('tag_64_tax', '60', 'tax'),
+            ('tag_59_tax', '61', 'tax'),
+            ('tag_65_tax', '64', 'tax'),
+            ('tag_69_tax', '65', 'tax'),
+        ],
+        'formulas': [
+            ('26', 'tax', 0, [(0.19, '26', 'base')]),
+            ('27', 'tax', 0, [(0.07, '27', 'base')]),
+            ('30', 'tax', 0, [(0.19, '30', 'base')]),
+            ('33', 'tax', 0, [(0.19, '33', 'base')]),
+            ('34', 'tax', 0, [(0.07, '34', 'base')]),
+            ('32', 'base', -1, []),
+            ('33', 'base', -1, []),
+            ('34', 'base', -1, []),
+            ('35', 'base', -1, []),
+            ('36', 'base', -1, []),
+            ('48', 'base', -1, []),
+            ('49', 'base', -1, []),
+            ('50', 'base', -1, []),
+            ('51', 'base', -1, []),
+            ('52', 'base', -1, []),
+            ('55', 'tax', -1, []),
+            ('56', 'tax', -1, []),
+            ('57', 'tax', -1, []),
+            ('58', 'tax', -1, []),
+            ('59', 'tax', -1, []),
+            ('60', 'tax', -1, []),
+            ('61', 'tax', -1, []),
+            ('53', 'tax', 1, [
+                (1, '26', 'tax'),
+                (1, '27', 'tax'),
+                (1, '28', 'tax'),
+                (1, '30', 'tax'),
+                (1, '33', 'tax'),
+                (1, '34', 'tax'),
+                (1, '35', 'tax'),
+                (1, '36', 'tax'),
+                (1, '48', 'tax'),
+                (1, '49', 'tax'),
+                (1, '50', 'tax'),
+                (1, '51', 'tax'),
+                (1, '52', 'tax'),
+            ]),
+            ('62', 'tax', 1, [
+                (1, '53', 'tax'),
+                (-1, '55', 'tax'),
+                (-1, '56', 'tax'),
+                (-1, '57', 'tax'),
+                (-1, '58', 'tax'),
+                (-1, '59', 'tax'),
+                (-1, '60', 'tax'),
+                (-1, '61', 'tax'),
+            ]),
+            ('66', 'tax', 1, [
+                (1, '62', 'tax'),
+                (1, '64', 'tax'),
+                (1, '65', 'tax'),
+            ]),
+        ],
+        'totals': ('66', '67'),
+        'elster': [
+            ('41', [(1, '20', 'base')]),
+            ('44', [(1, '21', 'base')]),
+            ('49', [(1, '22', 'base')]),
+            ('43', [(1, '23', 'base')]),
+            ('48', [(1, '24', 'base')]),
+            ('81', [(1, '26', 'base')]),
+            ('86', [(1, '27', 'base')]),
+            ('35', [(1, '28', 'base')]),
+            ('36', [(1, '28', 'tax')]),
+            ('77', [(1, '29', 'base')]),
+            ('76', [(1, '30', 'base')]),
+            ('80', [(1, '30', 'tax')]),
+            ('91', [(1, '32', 'base')]),
+            ('89', [(1, '33', 'base')]),
+            ('93', [(1, '34', 'base')]),
+            ('95', [(1, '35', 'base')]),
+            ('98', [(1, '35', 'tax')]),
+            ('94', [(1, '36', 'base')]),
+            ('96', [(1, '36', 'tax')]),
+            ('42', [(1, '38', 'base')]),
+            ('68', [(1, '39', 'base')]),
+            ('60', [(1, '40', 'base')]),
+            ('21', [(1, '41', 'base')]),
+            ('45', [(1, '42', 'base')]),
+            ('46', [(1, '48', 'base')]),
+            ('47', [(1, '48', 'tax')]),
+            ('52', [(1, '49', 'base')]),
+            ('53', [(1, '49', 'tax')]),
+            ('73', [(1, '50', 'base')]),
+            ('74', [(1, '50', 'tax')]),
+            ('78', [(1, '51', 'base')]),
+            ('79', [(1, '51', 'tax')]),
+            ('84', [(1, '52', 'base')]),
+            ('85', [(1, '52', 'tax')]),
+            ('66', [(1, '55', 'tax')]),
+            ('61', [(1, '56', 'tax')]),
+            ('62', [(1, '57', 'tax')]),
+            ('67', [(1, '58', 'tax')]),
+            ('63', [(1, '59', 'tax')]),
+            ('64', [(1, '60', 'tax')]),
+            ('59', [(1, '61', 'tax')]),
+            ('65', [(1, '64', 'tax')]),
+            ('69', [(1, '65', 'tax')]),
+            ('39', [(-1, '67', 'tax')]),
+            ('83', [(1, '66', 'tax'), (1, '67', 'tax')]),
+        ],
+    },
+    '2019': {
+        'lines': [
+            ('17', _('Anmeldung der Umsatzsteuer Vorauszahlung'),
+             '', '', 'group'),
+            ('18', _('Lief. u. sonst. Leistg. einschl. unentg. Wertabg.'),
+             '', '', 'group'),
+            ('19', _('Steuerfr. Umsätze mit Vorsteuerabz. innerg. '
+                     'Lieferungen (§4 Nr. 1b) ...'),
+             '', '', 'group'),
+            ('20', _('... an Abnehmer mit USt-ID (41)'),
+             'base', 'base', 'editable'),
+            ('21', _('... neuer Fahrzeuge an Abnehmer ohne UST-ID (44)'),
+             'base', 'base', 'editable'),
+            ('22', _('... neuer Fahrzeuge außerh. eines Unternehmens § 2a '
+                     'UStG (49)'),
+             'base', 'base', 'editable'),
+            ('23', _('Weitere steuerfr. Umsätze mit Vorsteuerabzug, z.B. '
+                     'Ausfuhrlief., Umsätze n. § 4 Nr. 2-7 UStG (43)'),
+             'base', 'base', 'editable'),
+            ('24', _('Steuerfreie Umsätze ohne Vorsteuerabzug Umsätze n. § '
+                     '4 Nr. 8 bis 28 UStG (48)'),
+             'base', 'base', 'editable'),
+            ('25', _('Steuerpflichtige Umsätze (Lief. u. sonst. Leistg. '
+                     'einschl. unentg. Wertabg.)'),
+             '', '', 'group'),
+            ('26', _('... zum Steuersatz von 19 % (81)'),
+             'base tax', 'base tax', 'editable'),
+            ('27', _('... zum Steuersatz von 7% (86)'),
+             'base tax', 'base tax', 'editable'),
+            ('28', _('... zu anderen Steuersätzen (35 / 36)'),
+             'base tax', 'base tax', 'editable'),
+            ('29', _('Lieferungen land- u. forstw. Betriebe nach § 24 UStG '
+                     'an Abnehmer mit Ust-ID (77)'),
+             'base', 'base', 'editable'),
+            ('30', _('Umsätze nach § 24 UStG, z.B. Sägewerke, Getränke u. '
+                     'alk. Flüssigk. (76 / 80)'),
+             'base tax', 'base tax', 'editable'),
+            ('31', _('Innergemeinschaftliche Erwerbe Steuerfreie '
+                     'innergemeinschaftliche Erwerbe'),
+             '', '', 'group'),
+            ('32', _('Erwerbe nach §§ 4b u. 25c UStG (91)'),
+             'base', 'base', 'editable'),
+            ('33', _('Steuerpflichtige innergemeinschaftliche Erwerbe ... '
+                     'zum Steuersatz v. 19 % (89)'),
+             'base tax', 'base tax', 'editable'),
+            ('34', _('... zum Steuersatz v. 7% (93)'),
+             'base tax', 'base tax', 'editable'),
+            ('35', _('... zu anderen Steuersätzen (95 / 98)'),
+             'base tax', 'base tax', 'editable'),
+            ('36', _('... neuer Fahrzeuge gem. § 1b Abs. 2 u. 3 UStG von '
+                     'Lieferern o. Ust-ID z. allg. Steuersatz (94 / 96)'),
+             'base tax', 'base tax', 'editable'),
+            ('37', _('Ergänzende Angaben zu Umsätzen'),
+             '', '', 'group'),
+            ('38', _('Lieferungen des ersten Abnehmers bei innergem. '
+                     'Dreiecksgeschäften gem. § 25b Abs. 2 UStG (42)'),
+             'base', 'base', 'editable'),
+            ('39', _('Übrige steuerpfl. Umsätze f.d.d. Lstg.empf. d. Steuer '
+                     'n. § 13b Abs. 5 UStG schuldet (60)'),
+             'base', 'base', 'editable'),
+            ('40', _('Nicht steuerb. sonst. Leist. gem. § 18b S. 1 Nr. 2 '
+                     '(21)'),
+             'base', 'base', 'editable'),
+            ('41', _('Übrige n. steuerb. Umsätze, Leistungsort ist nicht im '
+                     'Inland (45)'),
+             'base', 'base', 'editable'),
+            ('47', _('Leistungsempfänger als Steuerschuldner (§ 13b UStG)'),
+             '', '', 'group'),
+            ('48', _('Steuerpfl. sonst. Leist. e. i. übr. Gemeinschaftsgeb. '
+                     'ans. Untern. gem. § 13b Abs. 1 UStG (46 / 47)'),
+             'base tax', 'base tax', 'editable'),
+            ('49', _('Lieferungen sicherungsübereign. Gegenst. u. Umsätze '
+                     'd. u. d.  GrEStG fallen g. § 13b Abs. 2 Nr. 3 (73 / '
+                     '74)'),
+             'base tax', 'base tax', 'editable'),
+            ('50', _('Andere Leistungen gem. § 13b Abs. 2 Nr. 1, 2,4 b. 11 '
+                     'UStG (84 / 85)'),
+             'base tax', 'base tax', 'editable'),
+            ('51', _('Umsatzsteuer'),
+             'tax', 'tax', 'total'),
+            ('52', _('Abziehbare Vorsteuerbeträge'),
+             '', '', 'group'),
+            ('53', _('Vorsteuerbeträge aus Rechn. v.a. Unternehmen g. § 15 '
+                     'Abs. S. 1 Nr. 1 UStG a. Leistungen i.S.d. § 13a Abs. '
+                     '1 Nr. 6 UStG u. § 15 Abs. 1 S. 1 Nr. 5 UStG u. a. '
+                     'innerg. Dreiecksgesch. g. § 25b A. 5 UStG (66)'),
+             'tax', 'tax', ''),
+            ('54', _('Vorsteuerbeträge a. d. innerg. Erwerb v. Gegenständen '
+                     'gem. § 15 Abs. 1 Satz 1 Nr. 3 UStG (61)'),
+             'tax', 'tax', ''),
+            ('55', _('Entst. Einfuhrumsatzst. g. § 15 Abs. 1 S. 1 Nr. 2 '
+                     'UStG (62)'),
+             'tax', 'tax', ''),
+            ('56', _('Vorsteuerbeträge aus Leistungen i. S. des § 13b '
+                     'UStGi.V.m § 15 Abs. 1 Satz 1 Nr. 4 UStG (67)'),
+             'tax', 'tax', ''),
+            ('57', _('Vorsteuerbeträge d. n. allg. Durchschnittssätzen '
+                     'berechnet sind gem. §§ 23 und 23a UStG (63)'),
+             'tax', 'tax', ''),
+            ('58', _('Berichtigung des Vorsteuerabzugs g. § 15 a UStG (64)'),
+             'tax', 'tax', ''),
+            ('59', _('Vorsteuerabzug f. innergem. Lief. neuer Fahrzeuge '
+                     'außerh. e. Untern. g. §2a UStG sow. v. Kleinunt. i.S. '
+                     'd. § 19 Abs. 1 i.V.m. § 15a Abs. 4a UStG (59)'),
+             'tax', 'tax', ''),
+            ('60', _('Verbleibender Betrag'),
+             'tax', 'tax', 'total'),
+            ('61', _('Andere Steuerbeträge'),
+             '', '', 'group'),
+            ('62', _('Steuer inf. Wechsels d. Besteuerungsf. sow. Nachst. '
+                     'a. verst. Anzahlungen u.a. wg. Steuersatzänd. (65)'),
+             'tax', 'tax', ''),
+            ('63', _('In Rechnungen unrichtig oder unberechtigt '
+                     'ausgewiesene Steuerbeträge gem. § 14c UstG) sowie '
+                     'Steuerbetr. d. n. § 6a Abs. 4 S. 2, § 17 Abs. 1 S. 6, '
+                     '§ 25 b Abs. 2 UStG o. v. e. Auslagerer o. Lagerh. n. '
+                     '§ 13a Abs. 1 Nr. 6 UStG geschuldet werden (69)'),
+             'tax', 'tax', ''),
+            ('64', _('Umsatzsteuer-Vorauszahlung'),
+             'tax', 'tax', 'editable'),
+            ('65', _('Abzug der festges. Sondervorauszahl. f. '
+                     'Dauerfristverlängerung, nur auszuf. i. d. letzten '
+                     'Voranmeldung d. Besteuerungszeitr., i.d.R. Dez. (39)'),
+             'tax', 'tax', 'editable'),
+        ],
+        'tags': [
+            ('tag_41_base', '20', 'base'),
+            ('tag_44_base', '21', 'base'),
+            ('tag_49_base', '22', 'base'),
+            ('tag_43_base', '23', 'base'),
+            ('tag_48_base', '24', 'base'),
+            ('tag_81_base', '26', 'base'),
+            ('tag_81_tax', '26', 'tax'),
+            ('tag_86_base', '27', 'base'),
+            ('tag_86_tax', '27', 'tax'),
+            ('tag_35_base', '28', 'base'),
+            ('tag_36_tax', '28', 'tax'),
+            ('tag_77_base', '29', 'base'),
+            ('tag_76_base', '30', 'base'),
+            ('tag_80_tax', '30', 'tax'),
+            ('tag_91_base', '32', 'base'),
+            ('tag_89_base', '33', 'base'),
+            ('tag_93_base', '34', 'base'),
+            ('tag_95_base', '35', 'base'),
+            ('tag_98_tax', '35', 'tax'),
+            ('tag_94_base', '36', 'base'),
+            ('tag_96_tax', '36', 'tax'),
+            ('tag_42_base', '38', 'base'),
+            ('tag_68_base', '39', 'base'),
+            ('tag_60_base', '39', 'base'),
+            ('tag_21_base', '40', 'base'),
+            ('tag_45_base', '41', 'base'),
+            ('tag_46_base', '48', 'base'),
+            ('tag_47_tax', '48', 'tax'),
+            ('tag_73_base', '49', 'base'),
+            ('tag_74_tax', '49', 'tax'),
+            ('tag_52_base', '50', 'base'),
+            ('tag_53_tax', '50', 'tax'),
+            ('tag_78_base', '50', 'base'),
+            ('tag_79_tax', '50', 'tax'),
+            ('tag_84_base', '50', 'base'),
+            ('tag_85_tax', '50', 'tax'),
+            ('tag_66_tax', '53', 'tax'),
+            ('tag_61_tax', '54', 'tax'),
+            ('tag_62_tax', '55', 'tax'),
+            ('tag_67_tax', '56', 'tax'),
+            ('tag_63_tax', '57', 'tax'),
+            ('tag_64_tax', '58', 'tax'),
+            ('tag_59_tax', '59', 'tax'),
+            ('tag_65_tax', '62', 'tax'),
+            ('tag_69_tax', '63', 'tax'),
+        ],
+        'formulas': [
+            ('26', 'tax', 0, [(0.19, '26', 'base')]),
+            ('27', 'tax', 0, [(0.07, '27', 'base')]),
+            ('30', 'tax', 0, [(0.19, '30', 'base')]),
+            ('33', 'tax', 0, [(0.19, '33', 'base')]),
+            ('34', 'tax', 0, [(0.07, '34', 'base')]),
+            ('32', 'base', -1, []),
+            ('33', 'base', -1, []),
+            ('34', 'base', -1, []),
+            ('35', 'base', -1, []),
+            ('36', 'base', -1, []),
+            ('48', 'base', -1, []),
+            ('49', 'base', -1, []),
+            ('50', 'base', -1, []),
+            ('53', 'tax', -1, []),
+            ('54', 'tax', -1, []),
+            ('55', 'tax', -1, []),
+            ('56', 'tax', -1, []),
+            ('57', 'tax', -1, []),
+            ('58', 'tax', -1, []),
+            ('59', 'tax', -1, []),
+            ('51', 'tax', 1, [
+                (1, '26', 'tax'),
+                (1, '27', 'tax'),
+                (1, '28', 'tax'),
+                (1, '30', 'tax'),
+                (1, '33', 'tax'),
+                (1, '34', 'tax'),
+                (1, '35', 'tax'),
+                (1, '36', 'tax'),
+                (1, '48', 'tax'),
+                (1, '49', 'tax'),
+                (1, '50', 'tax'),
+            ]),
+            ('60', 'tax', 1, [
+                (1, '51', 'tax'),
+                (-1, '53', 'tax'),
+                (-1, '54', 'tax'),
+                (-1, '55', 'tax'),
+                (-1, '56', 'tax'),
+                (-1, '57', 'tax'),
+                (-1, '58', 'tax'),
+                (-1, '59', 'tax'),
+            ]),
+            ('64', 'tax', 1, [
+                (1, '60', 'tax'),
+                (1, '62', 'tax'),
+                (1, '63', 'tax'),
+            ]),
+        ],
+        'totals': ('64', '65'),
+        'elster': [
+            ('41', [(1, '20', 'base')]),
+            ('44', [(1, '21', 'base')]),
+            ('49', [(1, '22', 'base')]),
+            ('43', [(1, '23', 'base')]),
+            ('48', [(1, '24', 'base')]),
+            ('81', [(1, '26', 'base')]),
+            ('86', [(1, '27', 'base')]),
+            ('35', [(1, '28', 'base')]),
+            ('36', [(1, '28', 'tax')]),
+            ('77', [(1, '29', 'base')]),
+            ('76', [(1, '30', 'base')]),
+            ('80', [(1, '30', 'tax')]),
+            ('91', [(1, '32', 'base')]),
+            ('89', [(1, '33', 'base')]),
+            ('93', [(1, '34', 'base')]),
+            ('95', [(1, '35', 'base')]),
+            ('98', [(1, '35', 'tax')]),
+            ('94', [(1, '36', 'base')]),
+            ('96', [(1, '36', 'tax')]),
+            ('42', [(1, '38', 'base')]),
+            ('60', [(1, '39', 'base')]),
+            ('21', [(1, '40', 'base')]),
+            ('45', [(1, '41', 'base')]),
+            ('46', [(1, '48', 'base')]),
+            ('47', [(1, '48', 'tax')]),
+            ('73', [(1, '49', 'base')]),
+            ('74', [(1, '49', 'tax')]),
+            ('84', [(1, '50', 'base')]),
+            ('85', [(1, '50', 'tax')]),
+            ('66', [(1, '53', 'tax')]),
+            ('61', [(1, '54', 'tax')]),
+            ('62', [(1, '55', 'tax')]),
+            ('67', [(1, '56', 'tax')]),
+            ('63', [(1, '57', 'tax')]),
+            ('64', [(1, '58', 'tax')]),
+            ('59', [(1, '59', 'tax')]),
+            ('65', [(1, '62', 'tax')]),
+            ('69', [(1, '63', 'tax')]),
+            ('39', [(-1, '65', 'tax')]),
+            ('83', [(1, '64', 'tax'), (1, '65', 'tax')]),
+        ],
+    },
+}
+
+Layout = namedtuple('Layout', [
+    'version', 'lines', 'line_flags', 'tags', 'plan', 'totals', 'elster'])
+
+LineLayout = namedtuple('LineLayout', [
+    'display_base', 'display_tax', 'is_group', 'is_total', 'is_editable'])
+
+EMPTY_LINE_LAYOUT = LineLayout(False, False, False, False, False)
+
+
+def get_versions():
+    return sorted(LAYOUTS)
+
+
+@lru_cache()
+def get_layout(version):
+    """ Returns the compiled layout of the version, computed once per
+    process: its lines as (code, name, amount columns) tuples, the display
+    flags of its codes, its tags mapping, the plan of its formulas in the
+    order they are to be evaluated, its totals and its ELSTER Kennzahlen."""
+    spec = LAYOUTS[version]
+    lines = []
+    line_flags = {}
+    for code, name, columns, displayed, flags in spec['lines']:
+        lines.append((code, name, tuple(columns.split())))
+        displayed = displayed.split()
+        flags = flags.split()
+        line_flags[code] = LineLayout(
+            'base' in displayed,
+            'tax' in displayed,
+            'group' in flags,
+            'total' in flags,
+            'editable' in flags,
+        )
+    return Layout(
+        version=version,
+        lines=tuple(lines),
+        line_flags=MappingProxyType(line_flags),
+        tags=tuple(spec['tags']),
+        plan=_compile_formulas(spec['formulas']),
+        totals=tuple(spec['totals']),
+        elster=tuple(
+            (kennzahl, tuple(terms)) for kennzahl, terms in spec['elster']),
+    )
+
+
+def _compile_formulas(formulas):
+    """ Sorts the formulas topologically: each formula comes after those
+    computing its terms. The declaration order is kept otherwise."""
+    formulas = [
+        (code, column, coefficient, tuple(
+            (term_coefficient, term_code, term_column)
+            for term_coefficient, term_code, term_column in terms))
+        for code, column, coefficient, terms in formulas
+    ]
+    targets = {(code, column) for code, column, __, __ in formulas}
+    plan = []
+    done = set()
+    pending = formulas
+    while pending:
+        remaining = []
+        for formula in pending:
+            code, column, __, terms = formula
+            dependencies = {
+                (term_code, term_column)
+                for __, term_code, term_column in terms
+            } & targets
+            if (code, column) in dependencies:
+                raise ValueError(
+                    'The formula of %s %s depends on itself.' % (
+                        code, column))
+            if dependencies <= done:
+                plan.append(formula)
+                done.add((code, column))
+            else:
+                remaining.append(formula)
+        if len(remaining) == len(pending):
+            raise ValueError('Circular formulas: %s.' % ', '.join(
+                '%s %s' % (code, column)
+                for code, column, __, __ in remaining))
+        pending = remaining
+    return tuple(plan)
+
+
+def finalize_lines(layout, lines):
+    """ Evaluates the formulas of the layout on the lines, given as
+    {code: {column: amount}}, in place."""
+    for code, column, coefficient, terms in layout.plan:
+        line = lines[code]
+        amount = coefficient * line.get(column, 0.0) if coefficient else 0.0
+        for term_coefficient, term_code, term_column in terms:
+            amount += term_coefficient * lines[term_code].get(
+                term_column, 0.0)
+        line[column] = amount
+    return lines
@@ -2,17 +2,20 @@
 # Copyright 2019 Onestein (<https://www.onestein.eu>)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+from collections import OrderedDict
+
 from odoo import _, api, fields, models
 from odoo.osv import expression
 from odoo.exceptions import UserError
 from odoo.tools.misc import formatLang
 
-from .l10n_de_tax_statement_2018 import \
-    _base_display_2018, _tax_display_2018, \
-    _group_display_2018, _total_display_2018, _editable_display_2018
-from .l10n_de_tax_statement_2019 import \
-    _base_display_2019, _tax_display_2019, \
-    _group_display_2019, _total_display_2019, _editable_display_2019
+from .l10n_de_tax_statement_layout import EMPTY_LINE_LAYOUT, get_layout
+
+
+def _get_line_layout(version):
+    """ Returns the display flags of the lines of the version, as a
+    read-only mapping of the codes to LineLayout tuples."""
+    return get_layout(version).line_flags
 
 
 class VatStatementLine(models.Model):
@@ -38,57 +41,81 @@ class VatStatementLine(models.Model):
     format_base = fields.Char(compute='_compute_amount_format')
     format_tax = fields.Char(compute='_compute_amount_format')
 
-    is_group = fields.Boolean(compute='_compute_is_group')
-    is_total = fields.Boolean(compute='_compute_is_group')
+    display_base = fields.Boolean(readonly=True)
+    display_tax = fields.Boolean(readonly=True)
+    is_group = fields.Boolean(readonly=True)
+    is_total = fields.Boolean(readonly=True)
+    is_editable = fields.Boolean(readonly=True)
     is_readonly = fields.Boolean(compute='_compute_is_readonly')
 
     state = fields.Selection(related='statement_id.state')
 
     @api.multi
-    @api.depends('base', 'tax', 'code')
+    @api.depends('base', 'tax', 'display_base', 'display_tax')
     def _compute_amount_format(self):
         for line in self:
-            if line.statement_id.version == '2019':
-                base_display = _base_display_2019()
-                tax_display = _tax_display_2019()
-            else:
-                base_display = _base_display_2018()
-                tax_display = _tax_display_2018()
-
-            base = formatLang(self.env, line.base, monetary=True)
-            tax = formatLang(self.env, line.tax, monetary=True)
-            if line.code in base_display:
-                line.format_base = base
-            if line.code in tax_display:
-                line.format_tax = tax
+            if line.display_base:
+                line.format_base = formatLang(
+                    self.env, line.base, monetary=True)
+            if line.display_tax:
+                line.format_tax = formatLang(
+                    self.env, line.tax, monetary=True)
 
     @api.multi
-    @api.depends('code')
-    def _compute_is_group(self):
+    @api.depends('is_editable', 'statement_id.state')
+    def _compute_is_readonly(self):
         for line in self:
-            if line.statement_id.version == '2019':
-                group_display = _group_display_2019()
-                total_display = _total_display_2019()
-            else:
-                group_display = _group_display_2018()
-                total_display = _total_display_2018()
-
-            line.is_group = line.code in group_display
-            line.is_total = line.code in total_display
+            line.is_readonly = \
+                line.statement_id.state != 'draft' or not line.is_editable
+
+    @api.model
+    def _create_lines(self, statement, lines):
+        """ Creates the lines of the statement from their values, with the
+        display flags of their code, in a single query: the create() method
+        of the lines, and its overrides, are not called."""
+        layout = _get_line_layout(statement.version)
+        columns = [
+            'code', 'name', 'base', 'tax', 'display_base', 'display_tax',
+            'is_group', 'is_total', 'is_editable']
+        arrays = {column: [] for column in columns}
+        for line in lines:
+            flags = layout.get(line['code'], EMPTY_LINE_LAYOUT)._asdict()
+            for column in columns:
+                arrays[column].append(
+                    flags[column] if column in flags else line.get(column))
+        self.env.cr.execute("""
+            INSERT INTO l10n_de_tax_statement_line (
+              statement_id, {columns},
+              create_uid, create_date, write_uid, write_date)
+            SELECT
+              %s, {columns},
+              %s, (now() at time zone 'UTC'),
+              %s, (now() at time zone 'UTC')
+            FROM unnest(
+              %s::varchar[], %s::varchar[], %s::numeric[], %s::numeric[],
+              %s::boolean[], %s::boolean[], %s::boolean[], %s::boolean[],
+              %s::boolean[]
+            ) AS line({columns})
+            RETURNING id
+        """.format(columns=', '.join(columns)), [
+            statement.id, self.env.uid, self.env.uid,
+        ] + [arrays[column] for column in columns])
+        line_ids = [row[0] for row in self.env.cr.fetchall()]
+        statement.invalidate_cache(['line_ids'], statement.ids)
+        return self.browse(line_ids)
 
     @api.multi
-    @api.depends('code')
-    def _compute_is_readonly(self):
+    def _set_layout_flags(self):
+        """ Sets the display flags of the lines from the layout of the
+        version of their statement, e.g. when the version changes, with one
+        write per distinct set of flags."""
+        line_ids_by_flags = OrderedDict()
         for line in self:
-            if line.statement_id.version == '2019':
-                editable_display = _editable_display_2019()
-            else:
-                editable_display = _editable_display_2018()
-
-            if line.statement_id.state == 'draft':
-                line.is_readonly = line.code not in editable_display
-            else:
-                line.is_readonly = True
+            layout = _get_line_layout(line.statement_id.version)
+            flags = layout.get(line.code, EMPTY_LINE_LAYOUT)
+            line_ids_by_flags.setdefault(flags, []).append(line.id)
+        for flags, line_ids in line_ids_by_flags.items():
+            self.browse(line_ids).write(flags._asdict())
 
     @api.multi
     def unlink(self):
@@ -121,47 +148,70 @@ class VatStatementLine(models.Model):
         return vals
 
     def _get_move_lines_domain(self, tax_or_base):
-        statement = self.statement_id
-        taxes = self._filter_taxes_by_code(statement._compute_taxes())
-        past_taxes = statement._compute_past_invoices_taxes()
-        past_taxes = self._filter_taxes_by_code(past_taxes)
-        if statement.state == 'draft':
-            domain = self._get_domain_draft(taxes, tax_or_base)
-            past_domain = self._get_domain_draft(past_taxes, tax_or_base)
+        """ Returns a domain selecting the move lines of the line, expressed
+        on the statement, the dates and the tax tags of the code, so that the
+        list view can page through them without computing them first."""
+        self.ensure_one()
+        if self.statement_id.state == 'draft':
+            domain = self._get_domain_draft(tax_or_base)
+        elif self._has_provenance():
+            return self._get_domain_provenance(tax_or_base)
         else:
-            domain = self._get_domain_posted(taxes, tax_or_base)
-            past_domain = self._get_domain_posted(past_taxes, tax_or_base)
-        curr_amls = self.env['account.move.line'].search(domain)
-        past_amls = self.env['account.move.line'].search(past_domain)
-        res = [('id', 'in', past_amls.ids + curr_amls.ids)]
-        return res
+            domain = self._get_domain_posted(tax_or_base)
+        return expression.AND([domain, self._get_tags_domain(tax_or_base)])
+
+    def _has_provenance(self):
+        self.ensure_one()
+        Provenance = self.env['l10n.de.tax.statement.provenance']
+        return bool(Provenance._get_latest_posting(self.statement_id))
+
+    def _get_domain_provenance(self, tax_or_base):
+        """ Selects the move lines recorded as contributing to the line when
+        the statement was last posted. The criteria apply to the same
+        provenance record, as the auto_join of the field makes them share
+        one join."""
+        self.ensure_one()
+        statement = self.statement_id
+        Provenance = self.env['l10n.de.tax.statement.provenance']
+        posting = Provenance._get_latest_posting(statement)
+        return [
+            ('l10n_de_tax_statement_provenance_ids.statement_id', '=',
+             statement.id),
+            ('l10n_de_tax_statement_provenance_ids.posting', '=', posting),
+            ('l10n_de_tax_statement_provenance_ids.code', '=', self.code),
+            ('l10n_de_tax_statement_provenance_ids.amount_type', '=',
+             tax_or_base),
+        ]
+
+    def _get_tags_domain(self, tax_or_base):
+        self.ensure_one()
+        tag_ids = self.statement_id._get_code_tag_ids(self.code)
+        if tax_or_base == 'tax':
+            return [('tax_line_id.tag_ids', 'in', tag_ids)]
+        return [('tax_ids.tag_ids', 'in', tag_ids)]
 
     def _filter_taxes_by_code(self, taxes):
         self.ensure_one()
-        tags_map = self.statement_id._get_tags_map()
-        filtered_taxes = self.env['account.tax']
-        for tax in taxes:
-            for tag in tax.tag_ids:
-                tag_map = tags_map.get(tag.id)
-                if tag_map and tag_map[0] == self.code:
-                    filtered_taxes |= tax
+        tag_ids = self.statement_id._get_code_tag_ids(self.code)
+        if not taxes or not tag_ids:
+            return taxes.browse()
+        filtered_taxes = taxes.with_context(active_test=False).search([
+            ('id', 'in', taxes.ids),
+            ('tag_ids', 'in', tag_ids),
+        ])
         return filtered_taxes.with_context(taxes.env.context)
 
-    def _get_domain_draft(self, taxes, tax_or_base):
-        self.ensure_one()
-        ctx = taxes.env.context.copy()
-        ctx.update({
-            'l10n_de_statement_tax_ids': taxes.ids
-        })
-        AccountTax = self.env['account.tax'].with_context(ctx)
-        return AccountTax.get_move_lines_domain(tax_or_base=tax_or_base)
-
-    def _get_domain_posted(self, taxes, tax_or_base):
+    def _get_domain_draft(self, tax_or_base):
         self.ensure_one()
         statement = self.statement_id
-        domain = [('move_id.l10n_de_tax_statement_id', '=', statement.id)]
-        if tax_or_base == 'tax':
-            tax_domain = [('tax_line_id', 'in', taxes.ids)]
-        else:
-            tax_domain = [('tax_ids', 'in', taxes.ids)]
-        return expression.AND([domain, tax_domain])
+        AccountTax = self.env['account.tax']
+        ctx = statement._get_taxes_context()
+        past_ctx = statement._get_past_invoices_taxes_context()
+        return expression.OR([
+            AccountTax.with_context(ctx)._get_tag_balances_domain(),
+            AccountTax.with_context(past_ctx)._get_tag_balances_domain(),
+        ])
+
+    def _get_domain_posted(self, tax_or_base):
+        self.ensure_one()
+        return [('l10n_de_tax_statement_id', '=', self.statement_id.id)]
@@ -0,0 +1,103 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+
+class VatStatementProvenance(models.Model):
+    """ Amounts the move lines contributed to the lines of a statement, as
+    recorded when posting it. Records are only appended: posting the
+    statement again after a reset adds a new set, with the next posting
+    number."""
+    _name = 'l10n.de.tax.statement.provenance'
+    _description = 'German Vat Statement Move Line Provenance'
+    _order = 'statement_id, posting, code, amount_type, move_line_id'
+
+    statement_id = fields.Many2one(
+        'l10n.de.tax.statement',
+        'Statement',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+    posting = fields.Integer(required=True, readonly=True)
+    date_posted = fields.Datetime(readonly=True)
+    code = fields.Char(required=True, readonly=True)
+    amount_type = fields.Selection([
+        ('base', 'Base'),
+        ('tax', 'Tax')],
+        required=True,
+        readonly=True,
+    )
+    move_line_id = fields.Many2one(
+        'account.move.line',
+        'Journal Item',
+        readonly=True,
+        index=True,
+        ondelete='set null',
+    )
+    amount = fields.Float(readonly=True)
+
+    @api.model
+    def _record_provenance(self, statement, tags_map, tax_sets):
+        """ Appends the amounts the move lines related to the taxes
+        contribute to the statement, as a new posting. Returns the number of
+        records created."""
+        count = 0
+        if not any(tags_map):
+            return count
+        posting = self._get_latest_posting(statement) + 1
+        with statement._profile_phase('_record_provenance') as phase:
+            for taxes in tax_sets:
+                if not taxes:
+                    continue
+                query, params = statement._get_code_amounts_query(
+                    tags_map, taxes)
+                req = """
+                    INSERT INTO l10n_de_tax_statement_provenance (
+                      statement_id, posting, date_posted, code, amount_type,
+                      move_line_id, amount,
+                      create_uid, create_date, write_uid, write_date)
+                    SELECT
+                      %s, %s, %s, code, amount_type,
+                      move_line_id, amount,
+                      %s, (now() at time zone 'UTC'),
+                      %s, (now() at time zone 'UTC')
+                    FROM ({query}) AS code_amounts
+                """.format(query=query)
+                self.env.cr.execute(req, [
+                    statement.id, posting, statement.date_posted,
+                    self.env.uid, self.env.uid,
+                ] + params)
+                count += self.env.cr.rowcount
+            phase['rows'] = count
+        return count
+
+    @api.model
+    def _get_latest_posting(self, statement):
+        """ Returns the number of the latest posting recorded for the
+        statement, 0 if none."""
+        self.env.cr.execute("""
+            SELECT MAX(posting)
+            FROM l10n_de_tax_statement_provenance
+            WHERE statement_id = %s
+        """, (statement.id, ))
+        return self.env.cr.fetchone()[0] or 0
+
+    @api.model
+    def _get_provenance_totals(self, statement):
+        """ Returns the recorded amounts of the latest posting of the
+        statement, as {code: {amount_type: amount}}, e.g. to validate the
+        lines of a posted statement."""
+        self.env.cr.execute("""
+            SELECT code, amount_type, SUM(amount)
+            FROM l10n_de_tax_statement_provenance
+            WHERE statement_id = %s AND posting = %s
+            GROUP BY code, amount_type
+        """, (statement.id, self._get_latest_posting(statement)))
+        totals = {}
+        for code, amount_type, amount in self.env.cr.fetchall():
+            totals.setdefault(code, {})[amount_type] = amount or 0.0
+        return totals
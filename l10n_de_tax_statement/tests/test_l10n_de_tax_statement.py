@@ -2,14 +2,29 @@
 # Copyright 2019 Onestein (<https://www.onestein.eu>)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
 from dateutil.relativedelta import relativedelta
+from lxml import etree
 
 from odoo import fields
+from odoo.sql_db import TestCursor
 from odoo.tools import convert_file
 from odoo.modules.module import get_resource_path
 from odoo.exceptions import UserError
 from odoo.tests.common import TransactionCase
 
+from ..models.l10n_de_tax_statement_layout import \
+    _compile_formulas, get_layout, get_versions
+from ..models.l10n_de_tax_statement_line import _get_line_layout
+
 
 class TestVatStatement(TransactionCase):
 
@@ -367,3 +382,592 @@ class TestVatStatement(TransactionCase):
 
         self.assertEqual(len(self.statement_1.line_ids.ids), 44)
         self.assertEqual(self.statement_1.tax_total, 22.5)
+
+    def test_15_statement_lines_parity(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        self.invoice_1.move_id.add_move_in_statement()
+
+        for version in ['2018', '2019']:
+            self.statement_1.version = version
+            totals, __ = self.statement_1._compute_statement_totals(
+                force=True)
+            # reference: the balance fields of each tax
+            tags_map = self.statement_1._get_tags_map()
+            ref_totals = {}
+            for taxes in [self.statement_1._compute_taxes(),
+                          self.statement_1._compute_past_invoices_taxes()]:
+                for tax in taxes:
+                    for tag in tax.tag_ids:
+                        if tag.id not in tags_map:
+                            continue
+                        code, column = tags_map[tag.id]
+                        amounts = ref_totals.setdefault(code, {})
+                        amounts[column] = amounts.get(column, 0.0) + (
+                            tax.base_balance if column == 'base'
+                            else tax.balance)
+            for code in set(totals) | set(ref_totals):
+                for column in ['base', 'tax']:
+                    self.assertAlmostEqual(
+                        totals.get(code, {}).get(column, 0.0),
+                        ref_totals.get(code, {}).get(column, 0.0))
+
+        self.assertAlmostEqual(totals['26']['base'], 100.0)
+        self.assertAlmostEqual(totals['27']['base'], 50.0)
+
+    def test_16_incremental_update(self):
+        self.journal_1.update_posted = True
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        self.statement_1.statement_update()
+        self.assertTrue(self.statement_1.update_high_water_mark)
+        self.assertTrue(self.statement_1.update_fingerprint)
+        self.assertEqual(self.statement_1.tax_total, 22.5)
+        fingerprint = self.statement_1.update_fingerprint
+
+        invoice2 = self.invoice_1.copy()
+        invoice2._onchange_invoice_line_ids()
+        invoice2.action_invoice_open()
+        self.statement_1.statement_update()
+        self.assertEqual(self.statement_1.update_fingerprint, fingerprint)
+        self.assertEqual(self.statement_1.tax_total, 45.)
+
+        invoice2.action_invoice_cancel()
+        self.statement_1.statement_update()
+        self.assertEqual(self.statement_1.tax_total, 22.5)
+        incremental = {
+            line.code: (line.base, line.tax)
+            for line in self.statement_1.line_ids
+        }
+
+        self.statement_1.statement_full_update()
+        full = {
+            line.code: (line.base, line.tax)
+            for line in self.statement_1.line_ids
+        }
+        self.assertEqual(set(incremental), set(full))
+        for code, (base, tax) in full.items():
+            self.assertAlmostEqual(incremental[code][0], base)
+            self.assertAlmostEqual(incremental[code][1], tax)
+
+        self.statement_1.post()
+        self.assertFalse(self.statement_1.update_totals)
+        contributions = self.env['l10n.de.tax.statement.contribution'].search(
+            [('statement_id', '=', self.statement_1.id)])
+        self.assertFalse(contributions)
+
+    def test_17_post_reset_move_lines(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        move = self.invoice_1.move_id
+        self.statement_1.statement_update()
+
+        move_ids = self.statement_1._get_move_ids_to_post()
+        self.assertIn(move.id, move_ids)
+        self.statement_1.post()
+        self.assertEqual(move.l10n_de_tax_statement_id, self.statement_1)
+        for line in move.line_ids:
+            self.assertEqual(
+                line.l10n_de_tax_statement_id, self.statement_1)
+        self.assertTrue(move.line_ids <= self.statement_1.move_line_ids)
+        self.assertNotIn(move.id, self.statement_1._get_move_ids_to_post())
+
+        self.statement_1.reset()
+        self.assertFalse(move.l10n_de_tax_statement_id)
+        for line in move.line_ids:
+            self.assertFalse(line.l10n_de_tax_statement_id)
+        self.assertFalse(self.statement_1.move_line_ids)
+
+        move_count, line_count = self.statement_1._set_moves_statement(
+            [move.id], self.statement_1.id, chunk_size=1)
+        self.assertEqual(move_count, 1)
+        self.assertEqual(line_count, len(move.line_ids))
+
+    def test_18_unreported_moves_taxes(self):
+        d_from = fields.Date.from_string(self.statement_1.from_date)
+        self.invoice_1.date_invoice = fields.Date.to_string(
+            d_from + relativedelta(months=-1))
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+
+        self.assertEqual(
+            self.statement_1.unreported_move_ids, self.invoice_1.move_id)
+        taxes = self.statement_1._compute_past_invoices_taxes()
+        self.assertEqual(taxes, self.tax_1 | self.tax_2)
+        self.assertTrue(taxes.env.context.get('unreported_move'))
+
+        self.statement_1.unreported_move_from_date = \
+            self.statement_1.from_date
+        self.assertFalse(self.statement_1._get_unreported_move_ids())
+        self.assertFalse(self.statement_1._compute_past_invoices_taxes())
+
+    def test_19_tags_map_cache(self):
+        tags_map = self.statement_1._get_tags_map()
+        self.assertEqual(tags_map[self.tag_1.id], ('26', 'base'))
+        self.assertEqual(tags_map, self.statement_1._get_tags_map())
+        self.assertEqual(
+            self.statement_1._get_code_tag_ids('26'), [self.tag_1.id])
+        self.assertEqual(
+            self.statement_1._get_code_tag_ids('26', 'tax'), [])
+
+        self.statement_1.statement_update()
+        line_26 = self.statement_1.line_ids.filtered(lambda l: l.code == '26')
+        taxes = self.tax_1 | self.tax_2
+        self.assertEqual(line_26._filter_taxes_by_code(taxes), self.tax_1)
+
+        # the cache is cleared when the configuration changes
+        self.config.tag_81_base = self.tag_2
+        self.assertEqual(
+            self.statement_1._get_code_tag_ids('26'), [self.tag_2.id])
+        self.assertEqual(line_26._filter_taxes_by_code(taxes), self.tax_2)
+
+    def test_20_move_lines_domain(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        move_lines = self.invoice_1.move_id.line_ids
+        base_lines = move_lines.filtered(lambda l: self.tax_1 in l.tax_ids)
+        tax_lines = move_lines.filtered(lambda l: l.tax_line_id == self.tax_1)
+        AccountMoveLine = self.env['account.move.line']
+
+        self.statement_1.statement_update()
+        line_26 = self.statement_1.line_ids.filtered(lambda l: l.code == '26')
+        domain = line_26._get_move_lines_domain('base')
+        self.assertNotIn('id', [leaf[0] for leaf in domain if len(leaf) == 3])
+        self.assertEqual(AccountMoveLine.search(domain), base_lines)
+        domain = line_26._get_move_lines_domain('tax')
+        self.assertEqual(AccountMoveLine.search(domain), tax_lines)
+
+        self.statement_1.post()
+        domain = line_26._get_move_lines_domain('base')
+        self.assertEqual(AccountMoveLine.search(domain), base_lines)
+        action = line_26.view_tax_lines()
+        self.assertEqual(AccountMoveLine.search(action['domain']), tax_lines)
+
+    def test_21_provenance(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        base_lines = self.invoice_1.move_id.line_ids.filtered(
+            lambda l: self.tax_1 in l.tax_ids)
+        Provenance = self.env['l10n.de.tax.statement.provenance']
+        AccountMoveLine = self.env['account.move.line']
+
+        self.statement_1.statement_update()
+        self.statement_1.post()
+        totals = Provenance._get_provenance_totals(self.statement_1)
+        self.assertAlmostEqual(totals['26']['base'], 100.)
+        self.assertAlmostEqual(totals['27']['base'], 50.)
+
+        line_26 = self.statement_1.line_ids.filtered(lambda l: l.code == '26')
+        self.assertTrue(line_26._has_provenance())
+        domain = line_26._get_move_lines_domain('base')
+        self.assertEqual(AccountMoveLine.search(domain), base_lines)
+
+        # a new posting appends a new set of records
+        self.statement_1.reset()
+        self.statement_1.post()
+        self.assertEqual(Provenance._get_latest_posting(self.statement_1), 2)
+        records = Provenance.search([
+            ('statement_id', '=', self.statement_1.id),
+            ('move_line_id', 'in', base_lines.ids),
+            ('code', '=', '26'),
+        ])
+        self.assertEqual(len(records), 2)
+        domain = line_26._get_move_lines_domain('base')
+        self.assertEqual(AccountMoveLine.search(domain).ids, base_lines.ids)
+
+    def test_22_last_run_profile(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        self.assertFalse(self.statement_1.last_run_profile)
+
+        self.statement_1.statement_update()
+        profile = self.statement_1.last_run_profile
+        self.assertTrue(profile)
+        for phase in ['statement_update', '_compute_taxes',
+                      '_compute_past_invoices_taxes', '_insert_contributions',
+                      '_finalize_lines', 'create_lines']:
+            self.assertIn(phase, profile)
+
+        self.config.profile_statements = True
+        self.statement_1.post()
+        profile = self.statement_1.last_run_profile
+        self.assertIn('_record_provenance', profile)
+        self.assertIn('_set_moves_statement', profile)
+
+        self.statement_1.reset()
+        self.assertIn('reset', self.statement_1.last_run_profile)
+        self.assertNotIn(
+            'l10n_de_tax_statement_profile', self.statement_1.env.context)
+
+    def test_23_background_jobs(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+
+        self.statement_1.statement_update_job()
+        job = self.statement_1.job_id
+        self.assertEqual(job.operation, 'update')
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.user_id, self.env.user)
+        Job = self.env['l10n.de.tax.statement.job']
+        self.assertTrue(Job._has_active_jobs())
+
+        # the statement is locked while the job is active
+        with self.assertRaises(UserError):
+            self.statement_1.statement_update()
+        with self.assertRaises(UserError):
+            self.statement_1.write({'name': 'Locked'})
+        with self.assertRaises(UserError):
+            self.statement_1.post_job()
+
+        phases = []
+        job._execute(progress=phases.append)
+        self.assertIn('_compute_taxes', phases)
+        line_26 = self.statement_1.line_ids.filtered(lambda l: l.code == '26')
+        self.assertAlmostEqual(line_26.base, 100.)
+
+        job.cancel()
+        self.assertFalse(self.statement_1.job_id)
+        self.assertFalse(Job._has_active_jobs())
+        self.statement_1.write({'name': 'Unlocked'})
+        self.statement_1.post_job()
+        job = self.statement_1.job_id
+        job._execute()
+        self.assertEqual(self.statement_1.state, 'posted')
+
+        # the user is notified on the statement, posted or not
+        with patch.object(self.cr, 'commit', lambda: None):
+            job._notify()
+        message = self.statement_1.message_ids[0]
+        self.assertIn(self.statement_1.display_name, message.body)
+        self.assertIn(self.env.user.partner_id, message.needaction_partner_ids)
+
+        # running the job again does not post the statement again
+        job._execute()
+        self.assertEqual(self.statement_1.state, 'posted')
+
+    def test_24_batch_update(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        Statement = self.env['l10n.de.tax.statement']
+        company = self.env.user.company_id
+        from_date = self.invoice_1.date_invoice[:8] + '01'
+        to_date = self.invoice_1.date_invoice
+
+        results = Statement._batch_update(
+            company.ids, from_date, to_date, version='2018')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['status'], 'created')
+        statement = Statement.browse(results[0]['statement_id'])
+        self.assertEqual(statement.company_id, company)
+        self.assertEqual(statement.from_date, from_date)
+        line_26 = statement.line_ids.filtered(lambda l: l.code == '26')
+        self.assertAlmostEqual(line_26.base, 100.)
+
+        results = Statement._batch_update(
+            company.ids, from_date, to_date, version='2018')
+        self.assertEqual(results[0]['status'], 'updated')
+        self.assertEqual(results[0]['statement_id'], statement.id)
+
+        # a statement of another version is not updated
+        results = Statement._batch_update(
+            company.ids, from_date, to_date, version='2019')
+        self.assertEqual(results[0]['status'], 'mismatch')
+        self.assertEqual(statement.version, '2018')
+
+        self.statement_1.unlink()
+        statement.post()
+        results = Statement._batch_update(
+            company.ids, from_date, to_date, version='2018')
+        self.assertEqual(results[0]['status'], 'skipped')
+
+        # a company without configuration fails alone
+        other_company = self.env['res.company'].create({'name': 'Other'})
+        results = Statement._batch_update(
+            [other_company.id, company.id], from_date, to_date,
+            version='2018')
+        self.assertEqual(results[0]['status'], 'failed')
+        self.assertTrue(results[0]['error'])
+        self.assertEqual(results[1]['status'], 'skipped')
+
+    def test_25_line_layout(self):
+        layout = _get_line_layout('2019')
+        self.assertIs(layout, _get_line_layout('2019'))
+        with self.assertRaises(TypeError):
+            layout['26'] = layout['25']
+        self.assertTrue(layout['25'].is_group)
+        self.assertTrue(layout['26'].display_base)
+        self.assertTrue(layout['51'].is_total)
+        self.assertFalse(layout['51'].is_editable)
+
+        self.statement_1.version = '2019'
+        self.statement_1.statement_update()
+        lines = self.statement_1.line_ids
+        self.assertEqual(len(lines), 44)
+        _26 = lines.filtered(lambda l: l.code == '26')
+        self.assertTrue(_26.display_base)
+        self.assertTrue(_26.display_tax)
+        self.assertTrue(_26.is_editable)
+        self.assertFalse(_26.is_readonly)
+        self.assertEqual(_26.format_base, '0.00')
+        _51 = lines.filtered(lambda l: l.code == '51')
+        self.assertTrue(_51.is_total)
+        self.assertTrue(_51.is_readonly)
+        self.assertFalse(_51.format_base)
+
+        # the flags follow the version, before the statement is updated
+        self.statement_1.version = '2018'
+        self.assertFalse(_51.is_total)
+        self.assertTrue(_51.is_editable)
+        self.assertTrue(_51.display_base)
+
+    def test_26_layout_registry(self):
+        self.assertEqual(get_versions(), ['2018', '2019'])
+        for version in get_versions():
+            layout = get_layout(version)
+            codes = {code for code, __, __ in layout.lines}
+            self.assertTrue(set(layout.totals) <= codes)
+            for code, __, __, __ in layout.plan:
+                self.assertIn(code, codes)
+            for index, (__, __, __, terms) in enumerate(layout.plan):
+                later = {
+                    (code, column)
+                    for code, column, __, __ in layout.plan[index + 1:]
+                }
+                for __, code, column in terms:
+                    self.assertIn(code, codes)
+                    self.assertNotIn((code, column), later)
+
+        plan = _compile_formulas([
+            ('3', 'tax', 1, [(1, '2', 'tax')]),
+            ('2', 'tax', 1, [(-1, '1', 'tax')]),
+            ('1', 'tax', -1, []),
+        ])
+        self.assertEqual([code for code, __, __, __ in plan], ['1', '2', '3'])
+        with self.assertRaises(ValueError):
+            _compile_formulas([
+                ('1', 'tax', 1, [(1, '2', 'tax')]),
+                ('2', 'tax', 1, [(1, '1', 'tax')]),
+            ])
+
+        self.statement_1.version = '2019'
+        lines = self.statement_1._prepare_lines()
+        lines['26']['base'] = 100.0
+        lines['53']['tax'] = -5.0
+        self.statement_1._finalize_lines(lines)
+        self.assertAlmostEqual(lines['26']['tax'], 19.0)
+        self.assertAlmostEqual(lines['51']['tax'], 19.0)
+        self.assertAlmostEqual(lines['53']['tax'], 5.0)
+        self.assertAlmostEqual(lines['64']['tax'], 14.0)
+
+    def test_27_elster_export(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        self.statement_1.write({
+            'from_date': self.invoice_1.date_invoice[:8] + '01',
+            'to_date': fields.Date.to_string(
+                fields.Date.from_string(self.invoice_1.date_invoice) +
+                relativedelta(day=31)),
+        })
+        self.statement_1.statement_update()
+        with self.assertRaises(UserError):
+            self.statement_1.export_elster()
+
+        self.statement_1.post()
+        snapshot = json.loads(self.statement_1.elster_snapshot)
+        self.assertEqual(snapshot['kennzahlen'], [
+            ['81', '100'], ['83', '22.50'], ['86', '50'],
+        ])
+
+        # the export does not depend on the lines anymore
+        self.statement_1.line_ids.filtered(
+            lambda l: l.code == '26').write({'base': 1.0})
+        with self.assertRaises(UserError):
+            self.statement_1._render_elster_xml()
+        self.config.write({
+            'elster_tax_number': '9198011310010',
+            'elster_vendor_id': '74931',
+        })
+        root = etree.fromstring(self.statement_1._render_elster_xml())
+        namespaces = {'e': 'http://www.elster.de/elsterxml/schema/v11'}
+        declaration = root.find('.//e:Umsatzsteuervoranmeldung', namespaces)
+        self.assertEqual(
+            declaration.find('e:Zeitraum', namespaces).text,
+            self.invoice_1.date_invoice[5:7])
+        self.assertEqual(
+            declaration.find('e:Steuernummer', namespaces).text,
+            '9198011310010')
+        self.assertEqual(declaration.find('e:Kz81', namespaces).text, '100')
+        self.assertEqual(declaration.find('e:Kz83', namespaces).text, '22.50')
+        self.assertEqual(
+            root.find('.//e:Empfaenger', namespaces).text, '9198')
+        self.assertEqual(
+            root.find('.//e:Anmeldungssteuern', namespaces).get('version'),
+            '%s01' % self.statement_1.from_date[:4])
+        self.assertEqual(self.statement_1.export_elster()['type'],
+                         'ir.actions.act_url')
+
+        # the statements which cannot be exported are skipped
+        statement_2 = self.env['l10n.de.tax.statement'].create({
+            'name': 'Statement 2',
+            'version': '2018',
+        })
+        statement_2.write({
+            'from_date': '2015-01-01',
+            'to_date': '2015-12-31',
+        })
+        statement_2.statement_update()
+        statement_2.post()
+        directory = tempfile.mkdtemp()
+        try:
+            paths = self.env['l10n.de.tax.statement']._export_elster_files(
+                directory, company_ids=self.statement_1.company_id.ids)
+            self.assertEqual(paths, [os.path.join(
+                directory, self.statement_1._get_elster_filename())])
+        finally:
+            shutil.rmtree(directory)
+
+        self.statement_1.reset()
+        self.assertFalse(self.statement_1.elster_snapshot)
+
+        self.statement_1.write({
+            'from_date': '2019-04-01',
+            'to_date': '2019-06-30',
+        })
+        self.assertEqual(
+            self.statement_1._get_elster_period(), (2019, '42'))
+        self.statement_1.to_date = '2019-12-31'
+        with self.assertRaises(UserError):
+            self.statement_1._get_elster_period()
+
+    def test_28_report_attachment(self):
+        report = self.env.ref(
+            'l10n_de_tax_statement.action_report_tax_statement')
+        self.assertTrue(report.attachment_use)
+        self.assertFalse(report.retrieve_attachment(self.statement_1))
+
+        self.statement_1.statement_update()
+        self.statement_1.post()
+        name = self.statement_1._get_report_attachment_name()
+        self.assertFalse(self.statement_1.report_checksum)
+
+        # stored as the report would store it when first printed
+        attachment = self.env['ir.attachment'].create({
+            'name': name,
+            'datas_fname': name,
+            'datas': base64.b64encode(b'%PDF-1.4 statement'),
+            'res_model': 'l10n.de.tax.statement',
+            'res_id': self.statement_1.id,
+        })
+        self.assertEqual(
+            report.retrieve_attachment(self.statement_1), attachment)
+        self.statement_1.invalidate_cache()
+        self.assertEqual(
+            self.statement_1.report_checksum, attachment.checksum)
+        self.assertTrue(attachment.checksum)
+
+        self.statement_1.reset()
+        self.assertFalse(attachment.exists())
+        self.assertFalse(report.retrieve_attachment(self.statement_1))
+
+    def test_29_incremental_updates(self):
+        self.journal_1.update_posted = True
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        self.statement_1.statement_update()
+        high_water_mark = self.statement_1.update_high_water_mark
+        self.assertEqual(
+            fields.Datetime.to_string(
+                fields.Datetime.from_string(high_water_mark)),
+            high_water_mark)
+
+        # the move lines of the transaction are changed since the update,
+        # except those out of the range of the statement
+        invoice2 = self.invoice_1.copy({
+            'date_invoice': fields.Date.to_string(
+                fields.Date.from_string(self.statement_1.to_date) +
+                relativedelta(months=1)),
+        })
+        invoice2._onchange_invoice_line_ids()
+        invoice2.action_invoice_open()
+        Contribution = self.env['l10n.de.tax.statement.contribution']
+        changed_ids = Contribution._get_changed_move_line_ids(
+            self.statement_1, high_water_mark)
+        self.assertTrue(
+            set(self.invoice_1.move_id.line_ids.ids) <= set(changed_ids))
+        self.assertFalse(
+            set(invoice2.move_id.line_ids.ids) & set(changed_ids))
+
+        invoice3 = self.invoice_1.copy()
+        invoice3._onchange_invoice_line_ids()
+        invoice3.action_invoice_open()
+        self.statement_1.statement_update()
+        self.assertEqual(self.statement_1.tax_total, 45.)
+        invoice3.action_invoice_cancel()
+        self.statement_1.statement_update()
+        self.assertEqual(self.statement_1.tax_total, 22.5)
+        self.assertTrue(self.statement_1.update_high_water_mark)
+
+    def test_30_batch_update_workers(self):
+        self.invoice_1._onchange_invoice_line_ids()
+        self.invoice_1.action_invoice_open()
+        company = self.env.user.company_id
+        other_company = self.env['res.company'].create({'name': 'Other'})
+        from_date = self.invoice_1.date_invoice[:8] + '01'
+        to_date = self.invoice_1.date_invoice
+
+        # the threads share the cursor of the test, as in the test mode of
+        # the registry
+        lock = threading.RLock()
+        with patch.object(
+                self.registry, 'cursor', lambda: TestCursor(self.cr, lock)):
+            results = self.env['l10n.de.tax.statement']._batch_update(
+                [company.id, other_company.id], from_date, to_date,
+                version='2018', workers=2)
+        self.assertEqual(
+            [result['status'] for result in results], ['created', 'failed'])
+        statement = self.env['l10n.de.tax.statement'].browse(
+            results[0]['statement_id'])
+        self.assertEqual(statement.company_id, company)
+        self.assertAlmostEqual(results[0]['tax_total'], 22.5)
+
+        # the wizard only updates the statements of the companies visible
+        # from the current one of the user
+        self.env.user.company_ids |= other_company
+        wizard = self.env['l10n.de.tax.statement.batch.wizard'].create({
+            'from_date': from_date,
+            'to_date': to_date,
+            'version': '2018',
+        })
+        # one worker per core, at most one per company
+        self.assertGreaterEqual(wizard.workers, 1)
+        self.assertLessEqual(wizard.workers, len(wizard.company_ids))
+        self.assertIn(company, wizard.company_ids)
+        self.assertNotIn(other_company, wizard.company_ids)
+        wizard.company_ids |= other_company
+        with self.assertRaises(UserError):
+            wizard.execute()
+
+
+class TestVatStatementHighWaterMark(TransactionCase):
+
+    def setUp(self):
+        # a concurrent transaction, opened before the one of the test and
+        # left idle, without writing
+        self.idle_cr = self.registry.cursor()
+        self.idle_cr.execute('SELECT 1')
+        time.sleep(1.1)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.idle_cr.rollback()
+        self.idle_cr.close()
+
+    def test_01_idle_transaction(self):
+        Statement = self.env['l10n.de.tax.statement']
+        self.cr.execute("""
+            SELECT to_char(
+              now() at time zone 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+        """)
+        self.assertEqual(
+            Statement._get_update_high_water_mark(), self.cr.fetchone()[0])
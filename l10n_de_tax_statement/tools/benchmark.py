@@ -0,0 +1,434 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""Benchmarks the German VAT statement on synthetic data.
+
+For each number of move lines requested, a company is created with its
+accounts, taxes, tax tags, statement configuration and partners, and the
+move lines are generated in SQL by replicating a few template entries over
+the dates of the statement. The statement is then updated, drilled down,
+posted, rendered and reset, and for each of these phases the wall time, the
+number of SQL queries and the peak of the Python memory allocations are
+written to a JSON file.
+
+Usage:
+    python3 benchmark.py -c odoo.conf -d dbname \\
+        [--lines 10000 100000 1000000 5000000] [--taxes 10] [--tags 10] \\
+        [--partners 100] [--output benchmark.json] [--compare previous.json]
+        [--commit]
+
+The database must have l10n_de_tax_statement installed, and optionally
+l10n_de_tax_statement_zm. Unless --commit is given, everything is rolled
+back at the end of the run. With --compare, the results are logged next to
+those of a previous run, e.g. of the previous version of the module.
+"""
+
+import argparse
+import json
+import logging
+import math
+import platform
+import resource
+import time
+import tracemalloc
+
+import odoo
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_LINES = [10000, 100000, 1000000, 5000000]
+DATE_FROM = '2019-01-01'
+DATE_TO = '2019-03-31'
+REPLICATION_CHUNK = 100000
+
+# the tags mapped first, so that the 2019 statement and the ZM get amounts
+# even with only a few tags
+PREFERRED_CONFIG_FIELDS = [
+    'tag_81_base', 'tag_86_base', 'tag_41_base', 'tag_21_base',
+    'tag_66_tax', 'tag_61_tax', 'tag_35_base', 'tag_36_tax',
+]
+TAX_RATES = [19.0, 7.0, 0.0]
+
+MOVE_REPLICATION = """
+    INSERT INTO account_move (id, date, partner_id, {columns})
+    SELECT
+      %(move_offset)s + g * %(templates)s + t.rank,
+      %(date_from)s::date + (g %% %(days)s),
+      (%(partner_ids)s::integer[])[
+        1 + (g * %(templates)s + t.rank) %% %(partners)s],
+      {t_columns}
+    FROM (
+      SELECT row_number() OVER (ORDER BY id) AS rank, *
+      FROM account_move
+      WHERE id IN %(template_ids)s
+    ) AS t, generate_series(%(start)s, %(stop)s) AS g
+"""
+
+LINE_REPLICATION = """
+    INSERT INTO account_move_line (id, move_id, date, partner_id, {columns})
+    SELECT
+      %(line_offset)s + g * %(template_lines)s + l.rank,
+      %(move_offset)s + g * %(templates)s + l.move_rank,
+      %(date_from)s::date + (g %% %(days)s),
+      (%(partner_ids)s::integer[])[
+        1 + (g * %(templates)s + l.move_rank) %% %(partners)s],
+      {l_columns}
+    FROM (
+      SELECT
+        row_number() OVER (ORDER BY aml.id) AS rank,
+        m.rank AS move_rank,
+        aml.*
+      FROM account_move_line aml
+      JOIN (
+        SELECT row_number() OVER (ORDER BY id) AS rank, id
+        FROM account_move
+        WHERE id IN %(template_ids)s
+      ) AS m ON m.id = aml.move_id
+    ) AS l, generate_series(%(start)s, %(stop)s) AS g
+"""
+
+TAX_REL_REPLICATION = """
+    INSERT INTO account_move_line_account_tax_rel
+      (account_move_line_id, account_tax_id)
+    SELECT
+      %(line_offset)s + g * %(template_lines)s + l.rank,
+      rel.account_tax_id
+    FROM (
+      SELECT row_number() OVER (ORDER BY id) AS rank, id
+      FROM account_move_line
+      WHERE move_id IN %(template_ids)s
+    ) AS l
+    JOIN account_move_line_account_tax_rel rel
+      ON rel.account_move_line_id = l.id,
+    generate_series(%(start)s, %(stop)s) AS g
+"""
+
+
+def get_columns(cr, table, exclude):
+    cr.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = %s AND table_schema = current_schema()
+        ORDER BY ordinal_position
+    """, (table, ))
+    return [column for column, in cr.fetchall() if column not in exclude]
+
+
+def create_company(env, label, params):
+    company = env['res.company'].create({
+        'name': 'Benchmark %s' % label,
+        'currency_id': env.ref('base.EUR').id,
+        'country_id': env.ref('base.de').id,
+    })
+    env.user.write({
+        'company_ids': [(4, company.id)],
+        'company_id': company.id,
+    })
+
+    def account(code, name, xmlid, reconcile=False):
+        return env['account.account'].create({
+            'code': code,
+            'name': name,
+            'user_type_id': env.ref(xmlid).id,
+            'reconcile': reconcile,
+            'company_id': company.id,
+        })
+
+    receivable = account(
+        'B1400', 'Receivable', 'account.data_account_type_receivable', True)
+    revenue = account(
+        'B8400', 'Revenue', 'account.data_account_type_revenue')
+    tax_account = account(
+        'B1776', 'Tax', 'account.data_account_type_current_liabilities')
+    journal = env['account.journal'].create({
+        'name': 'Benchmark %s' % label,
+        'code': 'BNCH',
+        'type': 'sale',
+        'company_id': company.id,
+    })
+
+    tags = env['account.account.tag']
+    for index in range(params.tags):
+        tags += tags.create({
+            'name': 'Benchmark %s tag %s' % (label, index),
+            'applicability': 'taxes',
+        })
+    config_model = env['l10n.de.tax.statement.config']
+    config_fields = PREFERRED_CONFIG_FIELDS + sorted(
+        name for name in config_model._fields
+        if name.startswith('tag_') and name not in PREFERRED_CONFIG_FIELDS)
+    config_model.create(dict(
+        {'company_id': company.id},
+        **{name: tag.id for name, tag in zip(config_fields, tags)}))
+
+    taxes = env['account.tax']
+    for index in range(params.taxes):
+        taxes += taxes.create({
+            'name': 'Benchmark %s tax %s' % (label, index),
+            'amount': TAX_RATES[index % len(TAX_RATES)],
+            'type_tax_use': 'sale',
+            'account_id': tax_account.id,
+            'refund_account_id': tax_account.id,
+            'company_id': company.id,
+            'tag_ids': [(6, 0, [tags[index % len(tags)].id])] if tags else [],
+        })
+
+    # partners in other EU countries, so that the ZM has lines; the VAT
+    # numbers are made up, hence written without validation
+    countries = env.ref('base.europe').country_ids - env.ref('base.de')
+    countries = countries.sorted('code')
+    partners = env['res.partner']
+    for index in range(params.partners):
+        partners += partners.create({
+            'name': 'Benchmark %s partner %s' % (label, index),
+            'country_id': countries[index % len(countries)].id,
+            'company_id': company.id,
+        })
+    for partner in partners:
+        env.cr.execute(
+            'UPDATE res_partner SET vat = %s WHERE id = %s',
+            ('%s%09d' % (partner.country_id.code, partner.id), partner.id))
+
+    moves = env['account.move']
+    for index, tax in enumerate(taxes):
+        partner = partners[index % len(partners)]
+        amount = round(100.0 * tax.amount / 100.0, 2)
+        moves += moves.create({
+            'journal_id': journal.id,
+            'date': DATE_FROM,
+            'line_ids': [(0, 0, {
+                'name': 'Base',
+                'account_id': revenue.id,
+                'partner_id': partner.id,
+                'credit': 100.0,
+                'tax_ids': [(6, 0, tax.ids)],
+            }), (0, 0, {
+                'name': 'Tax',
+                'account_id': tax_account.id,
+                'partner_id': partner.id,
+                'credit': amount,
+                'tax_line_id': tax.id,
+            }), (0, 0, {
+                'name': 'Receivable',
+                'account_id': receivable.id,
+                'partner_id': partner.id,
+                'debit': 100.0 + amount,
+            })],
+        })
+    moves.post()
+    return company, moves, partners
+
+
+def replicate_moves(env, templates, partners, lines):
+    """ Copies the template moves, with their lines and taxes, over the
+    dates of the statement until the number of lines is reached."""
+    cr = env.cr
+    template_lines = len(templates.mapped('line_ids'))
+    copies = int(math.ceil(float(lines) / template_lines)) - 1
+    if copies <= 0:
+        return
+    cr.execute('SELECT COALESCE(MAX(id), 0) FROM account_move')
+    move_offset = cr.fetchone()[0]
+    cr.execute('SELECT COALESCE(MAX(id), 0) FROM account_move_line')
+    line_offset = cr.fetchone()[0]
+    days = (odoo.fields.Date.from_string(DATE_TO) -
+            odoo.fields.Date.from_string(DATE_FROM)).days + 1
+
+    move_columns = get_columns(
+        cr, 'account_move', ['id', 'date', 'partner_id'])
+    line_columns = get_columns(
+        cr, 'account_move_line', ['id', 'move_id', 'date', 'partner_id'])
+    move_query = MOVE_REPLICATION.format(
+        columns=', '.join(move_columns),
+        t_columns=', '.join('t.%s' % column for column in move_columns))
+    line_query = LINE_REPLICATION.format(
+        columns=', '.join(line_columns),
+        l_columns=', '.join('l.%s' % column for column in line_columns))
+
+    # one copy of the templates per step, offset by one so that the
+    # templates themselves are step 0
+    chunk = max(1, REPLICATION_CHUNK // template_lines)
+    for start in range(1, copies + 1, chunk):
+        values = {
+            'move_offset': move_offset - len(templates),
+            'line_offset': line_offset - template_lines,
+            'templates': len(templates),
+            'template_lines': template_lines,
+            'template_ids': tuple(templates.ids),
+            'partner_ids': partners.ids,
+            'partners': len(partners),
+            'date_from': DATE_FROM,
+            'days': days,
+            'start': start,
+            'stop': min(start + chunk - 1, copies),
+        }
+        cr.execute(move_query, values)
+        cr.execute(line_query, values)
+        cr.execute(TAX_REL_REPLICATION, values)
+    cr.execute("""
+        SELECT setval('account_move_id_seq', MAX(id)) FROM account_move
+    """)
+    cr.execute("""
+        SELECT setval('account_move_line_id_seq', MAX(id))
+        FROM account_move_line
+    """)
+    cr.execute('ANALYZE account_move')
+    cr.execute('ANALYZE account_move_line')
+    cr.execute('ANALYZE account_move_line_account_tax_rel')
+
+
+def measure(env, name, function):
+    """ Runs the function on empty caches, returns its measures."""
+    env.invalidate_all()
+    cr = env.cr
+    queries = cr.sql_log_count
+    tracemalloc.start()
+    start = time.time()
+    result = {'phase': name}
+    try:
+        function()
+    except UserError as error:
+        # e.g. wkhtmltopdf not available for the rendering
+        result['error'] = '%s' % (error.name, )
+    result['seconds'] = round(time.time() - start, 3)
+    result['queries'] = cr.sql_log_count - queries
+    result['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+    tracemalloc.stop()
+    _logger.info(
+        '  %-28s %10.3fs %10d queries %10d kB%s',
+        name, result['seconds'], result['queries'],
+        result['peak_memory_kb'],
+        ' (%s)' % result['error'] if 'error' in result else '')
+    return result
+
+
+def drill_down(statement):
+    """ Opens the base and tax move lines of each line of the statement
+    with an amount, reading the first page of each as the list view does."""
+    move_lines = statement.env['account.move.line']
+    for line in statement.line_ids:
+        for tax_or_base in ('base', 'tax'):
+            if not line[tax_or_base]:
+                continue
+            action = line.get_lines_action(tax_or_base=tax_or_base)
+            move_lines.search_count(action['domain'])
+            move_lines.search(action['domain'], limit=80).read(
+                ['date', 'move_id', 'name', 'partner_id', 'balance'])
+
+
+def render_pdf(statement):
+    report = statement.env.ref(
+        'l10n_de_tax_statement.action_report_tax_statement')
+    with statement.env.cr.savepoint():
+        report.render_qweb_pdf(statement.ids)
+
+
+def run(env, lines, params):
+    label = '%s lines' % lines
+    _logger.info('%s:', label)
+    start = time.time()
+    company, templates, partners = create_company(env, label, params)
+    replicate_moves(env, templates, partners, lines)
+    env.cr.execute("""
+        SELECT COUNT(*) FROM account_move_line WHERE company_id = %s
+    """, (company.id, ))
+    generated = env.cr.fetchone()[0]
+    _logger.info(
+        '  %s move lines generated in %.1fs',
+        generated, time.time() - start)
+
+    statement = env['l10n.de.tax.statement'].create({
+        'name': 'Benchmark %s' % label,
+        'company_id': company.id,
+        'version': '2019',
+        'from_date': DATE_FROM,
+        'to_date': DATE_TO,
+    })
+    phases = [
+        ('statement_full_update', statement.statement_full_update),
+        ('statement_update', statement.statement_update),
+        ('drill_down', lambda: drill_down(statement)),
+        ('post', statement.post),
+    ]
+    if hasattr(statement, '_compute_zm_lines'):
+        phases.append(('compute_zm_lines', statement._compute_zm_lines))
+    phases += [
+        ('render_pdf', lambda: render_pdf(statement)),
+        ('reset', statement.reset),
+    ]
+    return {
+        'lines': generated,
+        'taxes': params.taxes,
+        'tags': params.tags,
+        'partners': params.partners,
+        'phases': [
+            measure(env, name, function) for name, function in phases],
+    }
+
+
+def compare(previous, current):
+    """ Logs the measures of the current run next to the previous ones,
+    for the same number of lines and phase."""
+    previous_phases = {
+        (run['lines'], phase['phase']): phase
+        for run in previous['runs'] for phase in run['phases']
+    }
+    _logger.info('Compared to %s:', previous.get('module_version'))
+    for run_ in current['runs']:
+        for phase in run_['phases']:
+            old = previous_phases.get((run_['lines'], phase['phase']))
+            if not old:
+                continue
+            _logger.info(
+                '  %10d %-28s %8.2fx time %8.2fx queries',
+                run_['lines'], phase['phase'],
+                phase['seconds'] / (old['seconds'] or 0.001),
+                float(phase['queries']) / (old['queries'] or 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--lines', type=int, nargs='+', default=DEFAULT_LINES)
+    parser.add_argument('--taxes', type=int, default=10)
+    parser.add_argument('--tags', type=int, default=10)
+    parser.add_argument('--partners', type=int, default=100)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare')
+    parser.add_argument('--commit', action='store_true')
+    params, odoo_args = parser.parse_known_args()
+    odoo.tools.config.parse_config(odoo_args)
+
+    registry = odoo.registry(params.database)
+    with odoo.api.Environment.manage(), registry.cursor() as cr:
+        env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+        module = env['ir.module.module'].search([
+            ('name', '=', 'l10n_de_tax_statement')])
+        cr.execute('SHOW server_version')
+        results = {
+            'module_version': module.installed_version,
+            'odoo_version': odoo.release.version,
+            'postgresql_version': cr.fetchone()[0],
+            'python_version': platform.python_version(),
+            'date': odoo.fields.Datetime.now(),
+            'runs': [run(env, lines, params) for lines in params.lines],
+        }
+        results['max_rss_kb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+        if params.commit:
+            cr.commit()
+        else:
+            cr.rollback()
+
+    with open(params.output, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+    _logger.info('Results written to %s', params.output)
+    if params.compare:
+        with open(params.compare) as previous:
+            compare(json.load(previous), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""Compares the query plans of the statement domains before and after the
+creation of the indexes of the module, on a synthetic table shaped like
+account_move_line.
+
+Usage:
+    python3 benchmark_indexes.py -c odoo.conf -d dbname [--lines 5000000]
+
+The database must have l10n_de_tax_statement installed: the indexes are the
+ones declared by its move lines. The synthetic data is created in the
+schema l10n_de_bench of the database, dropped at the end of the run, and
+the plans are logged.
+"""
+
+import argparse
+import logging
+import time
+
+import odoo
+
+_logger = logging.getLogger(__name__)
+
+SCHEMA = 'l10n_de_bench'
+DEFAULT_LINES = 5000000
+
+QUERIES = [
+    ('unreported moves', """
+        SELECT DISTINCT move_id
+        FROM {schema}.account_move_line
+        WHERE
+          company_id = 1 AND
+          l10n_de_tax_statement_id IS NULL AND
+          date < '2019-04-01' AND
+          date >= '2019-01-01'
+    """),
+    ('unreported taxes partial domain', """
+        SELECT tax_line_id, SUM(balance)
+        FROM {schema}.account_move_line
+        WHERE
+          company_id = 1 AND
+          l10n_de_tax_statement_id IS NULL AND
+          l10n_de_tax_statement_include AND
+          date < '2019-04-01' AND
+          date >= '2019-01-01'
+        GROUP BY tax_line_id
+    """),
+    ('moves to post', """
+        SELECT DISTINCT move_id
+        FROM {schema}.account_move_line
+        WHERE
+          company_id = 1 AND
+          l10n_de_tax_statement_id IS NULL AND
+          date <= '2019-06-30' AND
+          date >= '2019-04-01'
+    """),
+    ('posted move lines', """
+        SELECT id
+        FROM {schema}.account_move_line
+        WHERE l10n_de_tax_statement_id = 24229
+    """),
+    ('changed move lines', """
+        SELECT id
+        FROM {schema}.account_move_line
+        WHERE
+          company_id = 1 AND
+          write_date > '2019-06-30 12:00:00' AND
+          date <= '2019-06-30'
+    """),
+]
+
+# the index of the l10n_de_tax_statement_id field, created by the ORM
+FIELD_INDEXES = [
+    '(l10n_de_tax_statement_id)',
+]
+
+
+def get_indexes(statement_indexes):
+    indexes = []
+    for __, columns, where in statement_indexes:
+        indexes.append(
+            'CREATE INDEX ON {schema}.account_move_line {columns} '
+            '{where}'.format(
+                schema=SCHEMA,
+                columns=columns,
+                where='WHERE %s' % where if where else ''))
+    for columns in FIELD_INDEXES:
+        indexes.append(
+            'CREATE INDEX ON {schema}.account_move_line {columns}'.format(
+                schema=SCHEMA, columns=columns))
+    return indexes
+
+
+def generate_data(cr, rows):
+    # 10 companies, 6 years of entries of 4 lines each, with the
+    # entries older than 2019-04-01 declared in monthly statements,
+    # e.g. 24229 for January 2019, except 2% of them; 10% of the
+    # undeclared ones are included. The entries are written on their date,
+    # 1% of them being modified again since the previous update.
+    cr.execute('DROP SCHEMA IF EXISTS {schema} CASCADE'.format(schema=SCHEMA))
+    cr.execute('CREATE SCHEMA {schema}'.format(schema=SCHEMA))
+    cr.execute("""
+        CREATE TABLE {schema}.account_move_line AS
+        SELECT
+          n AS id,
+          n / 4 AS move_id,
+          1 + (n / 4) %% 10 AS company_id,
+          date '2014-01-01' + ((n / 4) %% 2190) AS date,
+          date '2014-01-01' + ((n / 4) %% 2190) + time '12:00' AS write_date,
+          (n %% 7) + 1 AS tax_line_id,
+          round((random() * 1000)::numeric, 2) AS balance,
+          NULL::integer AS l10n_de_tax_statement_id,
+          FALSE AS l10n_de_tax_statement_include
+        FROM generate_series(1, %s) AS n
+    """.format(schema=SCHEMA), (rows, ))
+    cr.execute("""
+        UPDATE {schema}.account_move_line
+        SET l10n_de_tax_statement_id =
+          (extract(year FROM date) * 12 + extract(month FROM date))::integer
+        WHERE date < '2019-04-01' AND (move_id % 50) != 0
+    """.format(schema=SCHEMA))
+    cr.execute("""
+        UPDATE {schema}.account_move_line
+        SET l10n_de_tax_statement_include = TRUE
+        WHERE l10n_de_tax_statement_id IS NULL AND (move_id % 10) = 0
+    """.format(schema=SCHEMA))
+    cr.execute("""
+        UPDATE {schema}.account_move_line
+        SET write_date = timestamp '2019-07-01 12:00'
+        WHERE (move_id % 100) = 0
+    """.format(schema=SCHEMA))
+    cr.execute("""
+        ALTER TABLE {schema}.account_move_line ADD PRIMARY KEY (id)
+    """.format(schema=SCHEMA))
+    cr.execute('ANALYZE {schema}.account_move_line'.format(schema=SCHEMA))
+
+
+def explain(cr, title):
+    for name, query in QUERIES:
+        cr.execute(
+            'EXPLAIN (ANALYZE, BUFFERS) ' + query.format(schema=SCHEMA))
+        _logger.info('%s, %s:\n%s', title, name, '\n'.join(
+            row[0] for row in cr.fetchall()))
+
+
+def run(cr, lines, statement_indexes):
+    try:
+        _logger.info('Generating %s move lines...', lines)
+        start = time.time()
+        generate_data(cr, lines)
+        _logger.info('Generated in %.1fs', time.time() - start)
+
+        explain(cr, 'Without indexes')
+
+        start = time.time()
+        for index in get_indexes(statement_indexes):
+            cr.execute(index)
+        cr.execute('ANALYZE {schema}.account_move_line'.format(schema=SCHEMA))
+        _logger.info('Indexes created in %.1fs', time.time() - start)
+
+        explain(cr, 'With indexes')
+    finally:
+        cr.execute('DROP SCHEMA IF EXISTS {schema} CASCADE'.format(
+            schema=SCHEMA))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--lines', type=int, default=DEFAULT_LINES)
+    params, odoo_args = parser.parse_known_args()
+    odoo.tools.config.parse_config(odoo_args)
+
+    registry = odoo.registry(params.database)
+    from odoo.addons.l10n_de_tax_statement.models.account_move_line import \
+        STATEMENT_INDEXES
+    with registry.cursor() as cr:
+        cr.autocommit(True)
+        run(cr, params.lines, STATEMENT_INDEXES)
+
+
+if __name__ == "__main__":
+    main()
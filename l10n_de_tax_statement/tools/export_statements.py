@@ -0,0 +1,68 @@
+# Copyright 2019 BIG-Consulting GmbH(<http://www.openbig.org>)
+# Copyright 2019 Onestein (<https://www.onestein.eu>)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+"""Exports the posted and final VAT statements as files.
+
+Usage:
+    python3 export_statements.py -c odoo.conf -d dbname \\
+        --directory /tmp/elster [--format elster] \\
+        [--companies 1 2 3] [--statements 10 11]
+
+One file is written per statement, named after the VAT number of its
+company, its period and its id. The format is one of:
+
+- elster: the ELSTER XML files, rendered from the snapshots taken when
+  posting the statements, so that no tax is computed;
+- zm_csv: the BZSt CSV files of the ZM, read in batches, with
+  l10n_de_tax_statement_zm installed.
+
+No web worker is involved, so the statements of many companies can be
+exported in one run. A module can add a format by defining the methods
+_export_<format>(directory) and _export_<format>_files(directory,
+company_ids) of the statements.
+"""
+
+import argparse
+import logging
+import os
+
+import odoo
+
+_logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--directory', required=True)
+    parser.add_argument('--format', default='elster')
+    parser.add_argument('--companies', type=int, nargs='+')
+    parser.add_argument('--statements', type=int, nargs='+')
+    params, odoo_args = parser.parse_known_args()
+    odoo.tools.config.parse_config(odoo_args)
+
+    registry = odoo.registry(params.database)
+    with odoo.api.Environment.manage(), registry.cursor() as cr:
+        env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+        Statement = env['l10n.de.tax.statement']
+        export = '_export_%s' % params.format
+        if not hasattr(Statement, export + '_files'):
+            parser.error(
+                'unknown format %s, or its module is not installed' %
+                params.format)
+        os.makedirs(params.directory, exist_ok=True)
+        if params.statements:
+            paths = getattr(Statement.browse(params.statements), export)(
+                params.directory)
+        else:
+            paths = getattr(Statement, export + '_files')(
+                params.directory, company_ids=params.companies)
+        cr.rollback()
+    for path in paths:
+        _logger.info('Written %s', path)
+    _logger.info('%s files written.', len(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,4 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
 from . import l10n_de_tax_statement_config_wizard
+from . import l10n_de_tax_statement_batch_wizard
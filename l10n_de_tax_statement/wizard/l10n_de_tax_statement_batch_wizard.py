@@ -0,0 +1,152 @@
+# Copyright 2019 BIG-Consulting GmbH (<http://www.openbig.org>)
+# Copyright 2019 Onestein (<http://www.onestein.eu>)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import os
+
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import UserError
+
+# database connections of the pool of the process left to the request
+# running the batch and to the other requests of the worker
+BATCH_CONNECTION_MARGIN = 2
+
+
+class VatStatementBatchWizard(models.TransientModel):
+    _name = 'l10n.de.tax.statement.batch.wizard'
+    _description = 'German Vat Statement Batch Update Wizard'
+
+    company_ids = fields.Many2many(
+        'res.company',
+        string='Companies',
+        required=True,
+        default=lambda self: self._get_allowed_companies(),
+    )
+    date_range_id = fields.Many2one(
+        'date.range',
+        'Date range',
+    )
+    from_date = fields.Date(required=True)
+    to_date = fields.Date(required=True)
+    version = fields.Selection(
+        '_get_version_selection',
+        required=True,
+        default='2019',
+    )
+    workers = fields.Integer(
+        default=lambda self: self._get_default_workers(),
+        help='Number of companies processed in parallel, each in its own '
+             'transaction, by default one per processor core, within the '
+             'database connections available to the server process and the '
+             'number of companies. With 0, the companies are processed one '
+             'by one, in a single transaction.'
+    )
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('done', 'Done')],
+        default='draft',
+    )
+    line_ids = fields.One2many(
+        'l10n.de.tax.statement.batch.wizard.line',
+        'wizard_id',
+        'Results',
+        readonly=True,
+    )
+
+    @api.model
+    def _get_allowed_companies(self):
+        # the statements and move lines of a company are only visible from
+        # this company or its parents, see the multi-company rules
+        user = self.env.user
+        return user.company_ids & self.env['res.company'].search([
+            ('id', 'child_of', user.company_id.id)])
+
+    @api.model
+    def _get_max_workers(self):
+        # each thread uses a database connection of its own, from the pool
+        # of the process limited by db_maxconn
+        return max(min(
+            os.cpu_count() or 1,
+            tools.config['db_maxconn'] - BATCH_CONNECTION_MARGIN,
+        ), 1)
+
+    @api.model
+    def _get_default_workers(self):
+        return min(
+            self._get_max_workers(), len(self._get_allowed_companies()))
+
+    @api.model
+    def _get_version_selection(self):
+        return self.env['l10n.de.tax.statement']._get_version_selection()
+
+    @api.onchange('date_range_id')
+    def onchange_date_range_id(self):
+        if self.date_range_id:
+            self.update({
+                'from_date': self.date_range_id.date_start,
+                'to_date': self.date_range_id.date_end,
+            })
+
+    @api.multi
+    def execute(self):
+        self.ensure_one()
+        forbidden = self.company_ids - self._get_allowed_companies()
+        if forbidden:
+            raise UserError(
+                _('You are not allowed to update the statements of the '
+                  'companies %s from your current company!') %
+                ', '.join(forbidden.mapped('name')))
+        workers = min(
+            self.workers, self._get_max_workers(), len(self.company_ids))
+        results = self.env['l10n.de.tax.statement']._batch_update(
+            self.company_ids.ids, self.from_date, self.to_date,
+            version=self.version, workers=workers)
+        self.write({
+            'state': 'done',
+            'line_ids': [(0, 0, result) for result in results],
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.multi
+    def open_statements(self):
+        self.ensure_one()
+        action = self.env.ref(
+            'l10n_de_tax_statement.action_account_tax_statement_de')
+        vals = action.read()[0]
+        vals['domain'] = [
+            ('id', 'in', self.line_ids.mapped('statement_id'))]
+        return vals
+
+
+class VatStatementBatchWizardLine(models.TransientModel):
+    _name = 'l10n.de.tax.statement.batch.wizard.line'
+    _description = 'German Vat Statement Batch Update Result'
+    _order = 'status, company_id'
+
+    wizard_id = fields.Many2one(
+        'l10n.de.tax.statement.batch.wizard',
+        required=True,
+        ondelete='cascade',
+    )
+    company_id = fields.Many2one('res.company', 'Company', readonly=True)
+    # the statements are created by other transactions, not visible to the
+    # one of the wizard: no foreign key
+    statement_id = fields.Integer(readonly=True)
+    statement_name = fields.Char('Statement', readonly=True)
+    status = fields.Selection([
+        ('failed', 'Failed'),
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('skipped', 'Skipped (posted)'),
+        ('mismatch', 'Skipped (other version)')],
+        readonly=True,
+    )
+    tax_total = fields.Float(readonly=True)
+    seconds = fields.Float(readonly=True, digits=(16, 1))
+    error = fields.Text(readonly=True)
@@ -54,6 +54,11 @@ class VatStatementConfigWizard(models.TransientModel):
     tag_69_tax = fields.Many2one('account.account.tag')
     tag_83_tax = fields.Many2one('account.account.tag')
 
+    elster_tax_number = fields.Char('ELSTER Tax Number')
+    elster_vendor_id = fields.Char('ELSTER Vendor ID')
+
+    profile_statements = fields.Boolean('Log Statement Profiles')
+
     @api.model
     def default_get(self, fields_list):
         defv = super(VatStatementConfigWizard, self).default_get(fields_list)
@@ -106,6 +111,9 @@ class VatStatementConfigWizard(models.TransientModel):
             defv.setdefault('tag_64_tax', config.tag_64_tax.id)
             defv.setdefault('tag_59_tax', config.tag_59_tax.id)
             defv.setdefault('tag_69_tax', config.tag_69_tax.id)
+            defv.setdefault('elster_tax_number', config.elster_tax_number)
+            defv.setdefault('elster_vendor_id', config.elster_vendor_id)
+            defv.setdefault('profile_statements', config.profile_statements)
             return defv
 
         if not (self.is_l10n_de_coa_skr03() or self.is_l10n_de_coa_skr04()):
@@ -225,6 +233,9 @@ class VatStatementConfigWizard(models.TransientModel):
             'tag_64_tax': self.tag_64_tax.id,
             'tag_59_tax': self.tag_59_tax.id,
             'tag_69_tax': self.tag_69_tax.id,
+            'elster_tax_number': self.elster_tax_number,
+            'elster_vendor_id': self.elster_vendor_id,
+            'profile_statements': self.profile_statements,
         })
 
         action_name = 'l10n_de_tax_statement.action_account_tax_statement_de'
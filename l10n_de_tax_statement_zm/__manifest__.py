@@ -5,7 +5,7 @@
 
 {
     'name': 'German VAT Statement Extension',
-    'version': '11.0.1.0.1',
+    'version': '11.0.1.4.0',
     'category': 'Localization',
     'license': 'AGPL-3',
     'author': 'OpenBIG.org, Onestein, sewisoft, Odoo Community Association (OCA)',
@@ -0,0 +1,36 @@
+# Copyright 2018 Onestein (<http://www.onestein.eu>)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import odoo
+from odoo import api, http
+from odoo.http import content_disposition, request
+
+
+class ZmExportController(http.Controller):
+
+    @http.route(
+        '/l10n_de_tax_statement_zm/zm_csv/<int:statement_id>',
+        type='http', auth='user')
+    def zm_csv(self, statement_id, **kwargs):
+        statement = request.env['l10n.de.tax.statement'].browse(statement_id)
+        statement.check_access_rights('read')
+        statement.check_access_rule('read')
+        statement._check_zm_export()
+        filename = statement._get_zm_csv_filename()
+        dbname = request.env.cr.dbname
+        uid = request.env.uid
+        context = dict(request.env.context)
+
+        def stream():
+            # the response is sent after the cursor of the request is closed
+            with api.Environment.manage(), \
+                    odoo.registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                statement = env['l10n.de.tax.statement'].browse(statement_id)
+                for chunk in statement._iter_zm_csv():
+                    yield chunk.encode('utf-8')
+
+        return request.make_response(stream(), headers=[
+            ('Content-Type', 'text/csv; charset=utf-8'),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
@@ -1,2 +1,4 @@
 from . import l10n_de_tax_statement
 from . import l10n_de_tax_statement_zm_line
+from . import res_country
+from . import res_country_group
@@ -1,8 +1,37 @@
 # Copyright 2018 Onestein (<http://www.onestein.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import csv
+import io
+import os
+
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools import float_round
+
+# ZM lines read per query by the exports
+ZM_EXPORT_BATCH_SIZE = 1000
+
+# first lines of the CSV files uploaded to the ZM form of the BZSt portal
+ZM_CSV_HEADER = [
+    '#v1.0',
+    '#ve0.1',
+    'Laenderkennzeichen,USt-IdNr.,Betrag(EUR),Art der Leistung',
+]
+
+# methods computing the ZM lines move line by move line: when a module
+# overrides any of them, the ZM lines are computed from the move lines one
+# by one, calling them, instead of from the amounts grouped by a query
+ZM_MOVE_LINE_HOOKS = (
+    '_is_41_line',
+    '_is_21_line',
+    '_prepare_zm_line_from_move_line',
+)
+
+# country codes differing from the prefixes of the VAT numbers
+ZM_COUNTRY_CODES = {
+    'GR': 'EL',
+}
 
 
 class VatStatement(models.Model):
@@ -44,16 +73,16 @@ class VatStatement(models.Model):
         zmline = self.env['l10n.de.tax.statement.zm.line']
         for statement in self:
             statement.zm_line_ids.unlink()
-            statement.zm_total = 0.0
             amounts_map = statement._get_partner_amounts_map()
+            values_list = []
             for partner_id in amounts_map:
                 zm_values = self._prepare_zm_line(amounts_map[partner_id])
                 zm_values['partner_id'] = partner_id
-                zm_values['statement_id'] = statement.id
-                newline = zmline.create(zm_values)
-                statement.zm_line_ids += newline
-                zm_total = newline.amount_products + newline.amount_services
-                statement.zm_total += zm_total
+                values_list.append(zm_values)
+            zmline._create_zm_lines(statement, values_list)
+            statement.zm_total = sum(
+                values['amount_products'] + values['amount_services']
+                for values in values_list)
 
     @api.model
     def _prepare_zm_line(self, partner_amounts):
@@ -88,11 +117,63 @@ class VatStatement(models.Model):
                 return True
         return False
 
+    @api.multi
+    def _prepare_zm_line_from_move_line(self, line):
+        ''' Gets move line details and prepares ZM report line data'''
+        self.ensure_one()
+
+        balance = line.balance
+        if line.company_currency_id != self.currency_id:
+            balance = line.company_currency_id.with_context(
+                date=line.date
+            ).compute(balance, self.currency_id, round=True)
+        amount_products = balance * -1
+        amount_services = 0.0
+        if self._is_21_line(line):
+            amount_products = 0.0
+            amount_services = balance * -1
+
+        return {
+            'partner_id': line.partner_id.id,
+            'country_code': line.partner_id.country_id.code,
+            'vat': line.partner_id.vat,
+            'amount_products': amount_products,
+            'amount_services': amount_services,
+            'currency_id': self.currency_id.id,
+        }
+
+    @api.model
+    def _has_zm_move_line_hooks(self):
+        ''' Whether a module overrides the methods computing the ZM lines
+        move line by move line, see ZM_MOVE_LINE_HOOKS'''
+        return any(
+            getattr(type(self), name) is not getattr(VatStatement, name)
+            for name in ZM_MOVE_LINE_HOOKS)
+
     @api.multi
     def _get_partner_amounts_map(self):
         ''' Generate an internal data structure representing the ICP line'''
         self.ensure_one()
 
+        if self._has_zm_move_line_hooks():
+            partner_amounts_map = \
+                self._get_partner_amounts_map_from_move_lines()
+        else:
+            partner_amounts_map = self._get_partner_amounts_map_from_query()
+        # the converted amounts are rounded once per partner
+        for partner_amounts in partner_amounts_map.values():
+            for key in ('amount_products', 'amount_services'):
+                partner_amounts[key] = self.currency_id.round(
+                    partner_amounts[key])
+        return partner_amounts_map
+
+    @api.multi
+    def _get_partner_amounts_map_from_move_lines(self):
+        ''' Computes the ICP lines from the move lines one by one, calling
+        the hooks _is_41_line, _is_21_line and
+        _prepare_zm_line_from_move_line'''
+        self.ensure_one()
+
         partner_amounts_map = {}
         for line in self.move_line_ids:
             is_41 = self._is_41_line(line)
@@ -104,6 +185,133 @@ class VatStatement(models.Model):
                 self._update_partner_amounts_map(partner_amounts_map, vals)
         return partner_amounts_map
 
+    @api.multi
+    def _get_partner_amounts_map_from_query(self):
+        ''' Computes the ICP lines from the amounts of the move lines
+        grouped by a single query'''
+        self.ensure_one()
+
+        rows = self._get_partner_amounts()
+        rates = self._get_currency_rates({
+            (currency_id, date)
+            for __, __, __, currency_id, date, __, __ in rows
+            if currency_id != self.currency_id.id
+        })
+        partner_amounts_map = {}
+        for (partner_id, country_code, vat, currency_id, date,
+             amount_products, amount_services) in rows:
+            if currency_id != self.currency_id.id:
+                rate = rates[(self.currency_id.id, date)] / rates[
+                    (currency_id, date)]
+                amount_products *= rate
+                amount_services *= rate
+            if partner_id not in partner_amounts_map:
+                self._init_partner_amounts_map(partner_amounts_map, {
+                    'partner_id': partner_id,
+                    'country_code': country_code,
+                    'vat': vat,
+                    'currency_id': self.currency_id.id,
+                })
+            self._update_partner_amounts_map(partner_amounts_map, {
+                'partner_id': partner_id,
+                'amount_products': amount_products,
+                'amount_services': amount_services,
+            })
+        return partner_amounts_map
+
+    @api.multi
+    def _get_currency_rates(self, currency_dates):
+        ''' Returns the rates of the (currency_id, date) pairs, and of the
+        currency of the statement at the same dates, as a dict mapping the
+        pairs to the rates. The rates are read in a single query, the same
+        way res.currency does for the company of the statement: a currency
+        without rate at a date has the rate 1.0.'''
+        self.ensure_one()
+        currency_dates = set(currency_dates)
+        currency_dates.update(
+            (self.currency_id.id, date) for __, date in list(currency_dates))
+        if not currency_dates:
+            return {}
+        currency_ids, dates = zip(*currency_dates)
+        self.env.cr.execute("""
+            SELECT
+              pair.currency_id,
+              pair.date,
+              (SELECT r.rate FROM res_currency_rate r
+               WHERE
+                 r.currency_id = pair.currency_id AND
+                 r.name <= pair.date AND
+                 (r.company_id IS NULL OR r.company_id = %s)
+               ORDER BY r.company_id, r.name DESC
+               LIMIT 1)
+            FROM unnest(%s::integer[], %s::date[]) AS pair(currency_id, date)
+        """, (self.company_id.id, list(currency_ids), list(dates)))
+        return {
+            (currency_id, date): rate or 1.0
+            for currency_id, date, rate in self.env.cr.fetchall()
+        }
+
+    @api.multi
+    def _get_partner_amounts(self):
+        ''' Sums the amounts of the move lines of the statement related to
+        a tax with the tag 41 (products) or 21 (services), in a single query.
+        Returns rows of partner_id, country_code, vat, currency_id, date,
+        amount_products and amount_services, the amounts being in the
+        currency of the company of the move lines; the rows in another
+        currency than the one of the statement are split by date, for their
+        conversion.'''
+        self.ensure_one()
+        tag_ids = (self.tag_41_base | self.tag_21_base).ids
+        if not tag_ids:
+            return []
+        AccountMoveLine = self.env['account.move.line']
+        query = AccountMoveLine._where_calc([
+            ('l10n_de_tax_statement_id', '=', self.id),
+        ])
+        AccountMoveLine._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        # a move line related to a tax with the tag 21 is a service, even
+        # if another of its taxes has the tag 41
+        req = """
+            WITH aml AS (
+                SELECT
+                  account_move_line.id,
+                  account_move_line.partner_id,
+                  account_move_line.company_id,
+                  account_move_line.date,
+                  account_move_line.balance,
+                  bool_or(tag_rel.account_account_tag_id = %s) AS is_21
+                FROM {from_clause}
+                JOIN account_move_line_account_tax_rel tax_rel
+                  ON tax_rel.account_move_line_id = account_move_line.id
+                JOIN account_tax_account_tag tag_rel
+                  ON tag_rel.account_tax_id = tax_rel.account_tax_id
+                WHERE
+                  ({where_clause}) AND
+                  tag_rel.account_account_tag_id IN %s
+                GROUP BY account_move_line.id
+            )
+            SELECT
+              aml.partner_id,
+              country.code,
+              partner.vat,
+              company.currency_id,
+              CASE WHEN company.currency_id != %s THEN aml.date END,
+              SUM(CASE WHEN aml.is_21 THEN 0.0 ELSE -aml.balance END),
+              SUM(CASE WHEN aml.is_21 THEN -aml.balance ELSE 0.0 END)
+            FROM aml
+            JOIN res_company company ON company.id = aml.company_id
+            LEFT JOIN res_partner partner ON partner.id = aml.partner_id
+            LEFT JOIN res_country country ON country.id = partner.country_id
+            GROUP BY 1, 2, 3, 4, 5
+            ORDER BY 1, 5
+        """.format(
+            from_clause=from_clause, where_clause=where_clause or 'TRUE')
+        params = [self.tag_21_base.id or None] + where_params + [
+            tuple(tag_ids), self.currency_id.id]
+        self.env.cr.execute(req, params)
+        return self.env.cr.fetchall()
+
     @api.multi
     def _check_config_tag_41(self):
         ''' Checks the tag 41, as configured for the tax statement'''
@@ -144,31 +352,6 @@ class VatStatement(models.Model):
             'amount_services': 0.0,
         }
 
-    @api.multi
-    def _prepare_zm_line_from_move_line(self, line):
-        ''' Gets move line details and prepares ZM report line data'''
-        self.ensure_one()
-
-        balance = line.balance
-        if line.company_currency_id != self.currency_id:
-            balance = line.company_currency_id.with_context(
-                date=line.date
-            ).compute(balance, self.currency_id, round=True)
-        amount_products = balance * -1
-        amount_services = 0.0
-        if self._is_21_line(line):
-            amount_products = 0.0
-            amount_services = balance * -1
-
-        return {
-            'partner_id': line.partner_id.id,
-            'country_code': line.partner_id.country_id.code,
-            'vat': line.partner_id.vat,
-            'amount_products': amount_products,
-            'amount_services': amount_services,
-            'currency_id': self.currency_id.id,
-        }
-
     @api.multi
     def reset(self):
         ''' Removes ZM lines if reset to draft'''
@@ -212,3 +395,117 @@ class VatStatement(models.Model):
 
         # create lines
         self._compute_zm_lines()
+
+    @api.multi
+    def export_zm_csv(self):
+        ''' Download button'''
+        self.ensure_one()
+        self._check_zm_export()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/l10n_de_tax_statement_zm/zm_csv/%s' % self.id,
+            'target': 'self',
+        }
+
+    @api.multi
+    def _check_zm_export(self):
+        for statement in self:
+            if statement.state == 'draft':
+                raise UserError(
+                    _('Post the statement before exporting its ZM!'))
+
+    @api.multi
+    def _get_zm_csv_filename(self):
+        self.ensure_one()
+        return 'ZM_%s_%s_%s_%s.csv' % (
+            self.company_id.vat or self.company_id.id,
+            self.from_date,
+            self.to_date,
+            self.id,
+        )
+
+    @api.multi
+    def _iter_zm_lines(self):
+        ''' Yields the country code, VAT number, products amount and
+        services amount of the ZM lines of the statement. The lines are read
+        in batches, by keyset pagination, so that the memory used does not
+        depend on the number of lines.'''
+        self.ensure_one()
+        last_id = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT
+                  id, country_code, vat, amount_products, amount_services
+                FROM l10n_de_tax_statement_zm_line
+                WHERE statement_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (self.id, last_id, ZM_EXPORT_BATCH_SIZE))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:]
+            last_id = rows[-1][0]
+
+    @api.model
+    def _prepare_zm_csv_rows(self, country_code, vat, amount_products,
+                             amount_services):
+        ''' Returns the rows of the BZSt CSV file for a ZM line: one for
+        the products (L) and one for the services (S), with the amounts in
+        whole euros, and the VAT number without its country prefix.'''
+        country_code = ZM_COUNTRY_CODES.get(country_code, country_code or '')
+        vat = (vat or '').replace(' ', '').upper()
+        if vat[:2].isalpha():
+            vat = vat[2:]
+        rows = []
+        for amount, kind in ((amount_products, 'L'), (amount_services, 'S')):
+            amount = int(float_round(amount or 0.0, precision_digits=0))
+            if amount:
+                rows.append([country_code, vat, amount, kind])
+        return rows
+
+    @api.multi
+    def _iter_zm_csv(self):
+        ''' Yields the content of the BZSt CSV file of the ZM of the
+        statement, in chunks. The ZM does not depend on the version of the
+        statement.'''
+        self.ensure_one()
+        self._check_zm_export()
+        yield '\r\n'.join(ZM_CSV_HEADER) + '\r\n'
+        chunk = io.StringIO()
+        writer = csv.writer(chunk, lineterminator='\r\n')
+        count = 0
+        for line in self._iter_zm_lines():
+            writer.writerows(self._prepare_zm_csv_rows(*line))
+            count += 1
+            if count % ZM_EXPORT_BATCH_SIZE == 0:
+                yield chunk.getvalue()
+                chunk.seek(0)
+                chunk.truncate()
+        if chunk.tell():
+            yield chunk.getvalue()
+
+    @api.multi
+    def _export_zm_csv(self, directory):
+        ''' Writes the BZSt CSV files of the ZM of the statements in the
+        directory, and returns their paths.'''
+        paths = []
+        for statement in self:
+            path = os.path.join(
+                directory, statement._get_zm_csv_filename())
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                for chunk in statement._iter_zm_csv():
+                    output.write(chunk)
+            paths.append(path)
+        return paths
+
+    @api.model
+    def _export_zm_csv_files(self, directory, company_ids=None):
+        ''' Writes the BZSt CSV files of the ZM of the posted and final
+        statements, optionally of the given companies, in the directory.
+        Meant to be called from a scheduled action or a shell.'''
+        domain = [('state', 'in', ['posted', 'final'])]
+        if company_ids:
+            domain.append(('company_id', 'in', company_ids))
+        return self.search(domain)._export_zm_csv(directory)
@@ -2,7 +2,7 @@
 # Copyright 2018 Onestein (<http://www.onestein.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.tools.misc import formatLang
 from odoo.exceptions import ValidationError
 
@@ -50,9 +50,52 @@ class VatStatementZmLine(models.Model):
             line.format_amount_products = amount_products
             line.format_amount_services = amount_services
 
+    @api.model
+    @tools.ormcache()
+    def _get_europe_country_codes(self):
+        ''' Returns the codes of the countries of the group Europe, computed
+        once per registry: the cache is cleared when the countries of a group
+        change.'''
+        return frozenset(
+            self.env.ref('base.europe').sudo().country_ids.mapped('code'))
+
+    @api.model
+    def _create_zm_lines(self, statement, values_list):
+        """ Creates the ZM lines of the statement from their values in a
+        single query, then checks their country codes at once."""
+        columns = [
+            'partner_id', 'vat', 'country_code', 'currency_id',
+            'amount_products', 'amount_services']
+        self.env.cr.execute("""
+            INSERT INTO l10n_de_tax_statement_zm_line (
+              statement_id, {columns},
+              create_uid, create_date, write_uid, write_date)
+            SELECT
+              %s, {columns},
+              %s, (now() at time zone 'UTC'),
+              %s, (now() at time zone 'UTC')
+            FROM unnest(
+              %s::integer[], %s::varchar[], %s::varchar[], %s::integer[],
+              %s::numeric[], %s::numeric[]
+            ) AS line({columns})
+            RETURNING id
+        """.format(columns=', '.join(columns)), [
+            statement.id, self.env.uid, self.env.uid,
+        ] + [
+            [
+                None if values.get(column) is False else values.get(column)
+                for values in values_list
+            ]
+            for column in columns
+        ])
+        lines = self.browse([row[0] for row in self.env.cr.fetchall()])
+        statement.invalidate_cache(['zm_line_ids'], statement.ids)
+        lines._check_country_code()
+        return lines
+
     @api.constrains('country_code')
     def _check_country_code(self):
-        europe_codes = self.env.ref('base.europe').country_ids.mapped('code')
+        europe_codes = self._get_europe_country_codes()
         de_code = self.env.ref('base.de').code
         for line in self:
             country_codes = line.mapped('country_code')
@@ -0,0 +1,16 @@
+# Copyright 2018 Onestein (<http://www.onestein.eu>)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class Country(models.Model):
+    _inherit = 'res.country'
+
+    @api.multi
+    def write(self, vals):
+        res = super(Country, self).write(vals)
+        if 'country_group_ids' in vals or 'code' in vals:
+            # the codes of the countries of Europe are cached by the ZM lines
+            self.env['l10n.de.tax.statement.zm.line'].clear_caches()
+        return res
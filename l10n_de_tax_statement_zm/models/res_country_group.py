@@ -0,0 +1,28 @@
+# Copyright 2018 Onestein (<http://www.onestein.eu>)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class CountryGroup(models.Model):
+    _inherit = 'res.country.group'
+
+    @api.model
+    def create(self, vals):
+        group = super(CountryGroup, self).create(vals)
+        # the codes of the countries of Europe are cached by the ZM lines
+        self.env['l10n.de.tax.statement.zm.line'].clear_caches()
+        return group
+
+    @api.multi
+    def write(self, vals):
+        res = super(CountryGroup, self).write(vals)
+        if 'country_ids' in vals:
+            self.env['l10n.de.tax.statement.zm.line'].clear_caches()
+        return res
+
+    @api.multi
+    def unlink(self):
+        res = super(CountryGroup, self).unlink()
+        self.env['l10n.de.tax.statement.zm.line'].clear_caches()
+        return res
@@ -1,6 +1,10 @@
 # Copyright 2018 Onestein (<http://www.onestein.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import os
+import shutil
+import tempfile
+
 from odoo.exceptions import UserError, ValidationError
 
 from odoo.addons.l10n_de_tax_statement.tests.test_l10n_de_tax_statement\
@@ -137,3 +141,153 @@ class TestTaxStatementZM(TestVatStatement):
 
         with self.assertRaises(ValidationError):
             self.statement_with_zm.post()
+
+    def test_08_partner_amounts_map(self):
+        self.statement_1.post()
+        self.statement_with_zm = self.env['l10n.de.tax.statement'].create({
+            'name': 'Statement 1',
+        })
+
+        self.invoice_1.partner_id.country_id = self.env.ref('base.be')
+        self._prepare_zm_invoice()
+        self.statement_with_zm.post()
+
+        partner = self.invoice_1.partner_id
+        lines = self.statement_with_zm.move_line_ids.filtered(
+            lambda l: self.tag_3 in l.tax_ids.mapped('tag_ids'))
+        self.assertTrue(lines)
+        amounts_map = self.statement_with_zm._get_partner_amounts_map()
+        self.assertEqual(list(amounts_map), [partner.id])
+        self.assertEqual(amounts_map[partner.id]['country_code'], 'BE')
+        self.assertEqual(amounts_map[partner.id]['vat'], partner.vat)
+        self.assertAlmostEqual(
+            amounts_map[partner.id]['amount_products'],
+            -sum(lines.mapped('balance')))
+        self.assertFalse(amounts_map[partner.id]['amount_services'])
+        self.assertAlmostEqual(
+            self.statement_with_zm.zm_total,
+            amounts_map[partner.id]['amount_products'])
+
+        # the move line hooks compute the same amounts
+        self.assertFalse(self.statement_with_zm._has_zm_move_line_hooks())
+        self.assertTrue(self.statement_with_zm._is_41_line(lines[0]))
+        hooks_map = \
+            self.statement_with_zm._get_partner_amounts_map_from_move_lines()
+        self.assertEqual(list(hooks_map), [partner.id])
+        self.assertAlmostEqual(
+            hooks_map[partner.id]['amount_products'],
+            amounts_map[partner.id]['amount_products'])
+
+        self.config.tag_21_base = False
+        self.statement_with_zm.invalidate_cache()
+        amounts_map = self.statement_with_zm._get_partner_amounts_map()
+        self.assertAlmostEqual(
+            amounts_map[partner.id]['amount_products'],
+            -sum(lines.mapped('balance')))
+
+    def test_09_currency_rates(self):
+        statement = self.env['l10n.de.tax.statement'].create({
+            'name': 'Statement 1',
+        })
+        chf = self.env.ref('base.CHF')
+        for date, rate in (('2019-01-01', 1.1), ('2019-02-01', 1.2)):
+            self.env['res.currency.rate'].create({
+                'currency_id': chf.id,
+                'company_id': statement.company_id.id,
+                'name': date,
+                'rate': rate,
+            })
+        rates = statement._get_currency_rates({
+            (chf.id, '2019-01-15'),
+            (chf.id, '2019-02-01'),
+        })
+        self.assertEqual(rates[(chf.id, '2019-01-15')], 1.1)
+        self.assertEqual(rates[(chf.id, '2019-02-01')], 1.2)
+        for date in ('2019-01-15', '2019-02-01'):
+            rate = rates[(statement.currency_id.id, date)] / rates[
+                (chf.id, date)]
+            self.assertAlmostEqual(rate, chf.with_context(date=date).compute(
+                1.0, statement.currency_id, round=False))
+        self.assertEqual(statement._get_currency_rates(set()), {})
+
+    def test_10_create_zm_lines(self):
+        statement = self.env['l10n.de.tax.statement'].create({
+            'name': 'Statement 1',
+        })
+        ZmLine = self.env['l10n.de.tax.statement.zm.line']
+        partner = self.invoice_1.partner_id
+        lines = ZmLine._create_zm_lines(statement, [{
+            'partner_id': partner.id,
+            'country_code': 'BE',
+            'vat': False,
+            'currency_id': statement.currency_id.id,
+            'amount_products': 100.0,
+            'amount_services': 0.0,
+        }])
+        self.assertEqual(statement.zm_line_ids, lines)
+        self.assertEqual(lines.partner_id, partner)
+        self.assertEqual(lines.amount_products, 100.0)
+        self.assertFalse(lines.vat)
+        self.assertEqual(ZmLine._create_zm_lines(statement, []), ZmLine)
+
+        with self.assertRaises(ValidationError):
+            ZmLine._create_zm_lines(statement, [{
+                'partner_id': partner.id,
+                'country_code': 'US',
+                'currency_id': statement.currency_id.id,
+                'amount_products': 100.0,
+                'amount_services': 0.0,
+            }])
+
+        europe = self.env.ref('base.europe')
+        self.assertNotIn('US', ZmLine._get_europe_country_codes())
+        europe.country_ids |= self.env.ref('base.us')
+        self.assertIn('US', ZmLine._get_europe_country_codes())
+        self.env.ref('base.us').country_group_ids -= europe
+        self.assertNotIn('US', ZmLine._get_europe_country_codes())
+
+    def test_11_export_zm_csv(self):
+        Statement = self.env['l10n.de.tax.statement']
+        self.assertEqual(
+            Statement._prepare_zm_csv_rows('GR', 'EL 123456789', 99.5, 10.4),
+            [['EL', '123456789', 100, 'L'], ['EL', '123456789', 10, 'S']])
+        self.assertEqual(
+            Statement._prepare_zm_csv_rows('AT', 'ATU12345678', 0.0, -20.0),
+            [['AT', 'U12345678', -20, 'S']])
+
+        self.statement_1.post()
+        self.statement_with_zm = Statement.create({
+            'name': 'Statement 1',
+        })
+        with self.assertRaises(UserError):
+            self.statement_with_zm.export_zm_csv()
+
+        self.invoice_1.partner_id.country_id = self.env.ref('base.be')
+        self.invoice_1.partner_id.vat = 'BE0477472701'
+        self._prepare_zm_invoice()
+        self.statement_with_zm.post()
+        zm_line = self.statement_with_zm.zm_line_ids
+        self.assertEqual(len(zm_line), 1)
+
+        action = self.statement_with_zm.export_zm_csv()
+        self.assertEqual(action['type'], 'ir.actions.act_url')
+        content = ''.join(self.statement_with_zm._iter_zm_csv())
+        self.assertEqual(content.split('\r\n'), [
+            '#v1.0',
+            '#ve0.1',
+            'Laenderkennzeichen,USt-IdNr.,Betrag(EUR),Art der Leistung',
+            'BE,0477472701,%s,L' % round(zm_line.amount_products),
+            '',
+        ])
+
+        directory = tempfile.mkdtemp()
+        try:
+            paths = Statement._export_zm_csv_files(
+                directory, company_ids=self.statement_with_zm.company_id.ids)
+            path = os.path.join(
+                directory, self.statement_with_zm._get_zm_csv_filename())
+            self.assertIn(path, paths)
+            with open(path, encoding='utf-8', newline='') as exported:
+                self.assertEqual(exported.read(), content)
+        finally:
+            shutil.rmtree(directory)